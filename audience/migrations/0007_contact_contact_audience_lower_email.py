@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:32
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audience', '0006_delete_contacttag'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(models.F('audience'), django.db.models.functions.text.Lower('email_address'), name='contact_audience_lower_email'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 05:17
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audience', '0007_contact_contact_audience_lower_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuppressionList',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('is_global', models.BooleanField(db_index=True, default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SuppressedAddress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email_address', models.EmailField(max_length=254)),
+                ('reason', models.CharField(choices=[('bounced', 'Bounced'), ('complained', 'Complained'), ('manual', 'Manual'), ('imported', 'Imported')], default='manual', max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('suppression_list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='addresses', to='audience.suppressionlist')),
+            ],
+            options={
+                'unique_together': {('suppression_list', 'email_address')},
+            },
+        ),
+    ]
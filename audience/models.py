@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 import uuid
 
@@ -69,6 +70,8 @@ class Contact(models.Model):
         indexes = [
             models.Index(fields=["audience", "created_at"]),
             models.Index(fields=["audience", "status", "created_at"]),
+            # keyset pagination over distinct recipient addresses at send time
+            models.Index("audience", Lower("email_address"), name="contact_audience_lower_email"),
         ]
 
         ordering = ["-created_at"]
@@ -127,3 +130,43 @@ class ContactNote(models.Model):
         return f"Note for {self.contact.email_address}"
 
 
+
+
+class SuppressionReason(models.TextChoices):
+    BOUNCED = "bounced", "Bounced"
+    COMPLAINED = "complained", "Complained"
+    MANUAL = "manual", "Manual"
+    IMPORTED = "imported", "Imported"
+
+
+class SuppressionList(models.Model):
+    """Addresses never to send to. Global lists apply to every campaign, the rest when a campaign names them."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=200, unique=True)
+    is_global = models.BooleanField(default=False, db_index=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return self.name
+
+
+class SuppressedAddress(models.Model):
+    suppression_list = models.ForeignKey(SuppressionList, on_delete=models.CASCADE, related_name="addresses")
+    email_address = models.EmailField()
+    reason = models.CharField(max_length=20, choices=SuppressionReason.choices, default=SuppressionReason.MANUAL)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = [("suppression_list", "email_address")]
+
+    def __str__(self):
+        return f"{self.email_address} [{self.suppression_list.name}]"
+
+    def save(self, *args, **kwargs):
+        # same normalization as Contact, so lookups match the send-time addresses
+        if self.email_address:
+            self.email_address = self.email_address.strip().lower()
+        super().save(*args, **kwargs)
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from audience.models import Audience, Contact, Tag
+from audience.models import Audience, Contact, SuppressionList, SuppressionReason, Tag
 import uuid
 
 
@@ -87,4 +87,22 @@ class ContactSerializer(serializers.HyperlinkedModelSerializer):
                 # لو مش UUID أو مش موجود → نعتبرها name
                 tag, _ = Tag.objects.get_or_create(name=tag_value)
             tags.append(tag)
-        return tags
\ No newline at end of file
+        return tags
+
+class SuppressionListSerializer(serializers.ModelSerializer):
+    addresses_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = SuppressionList
+        fields = ["id", "name", "is_global", "created_at", "addresses_count"]
+
+class SuppressionImportSerializer(serializers.Serializer):
+    """A JSON list of addresses, or a CSV upload with the address in the first column."""
+    emails = serializers.ListField(child=serializers.CharField(), required=False)
+    file = serializers.FileField(required=False)
+    reason = serializers.ChoiceField(choices=SuppressionReason.choices, default=SuppressionReason.IMPORTED)
+
+    def validate(self, attrs):
+        if not attrs.get("emails") and not attrs.get("file"):
+            raise serializers.ValidationError("Send either 'emails' or a CSV 'file'.")
+        return attrs
@@ -0,0 +1,164 @@
+from __future__ import annotations
+import csv
+import io
+import logging
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db.models import Q
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from audience.models import Contact, SuppressedAddress, SuppressionList, SuppressionReason
+
+logger = logging.getLogger(__name__)
+
+
+# Suppression lists are stored in the DB (SuppressedAddress) and mirrored into
+# one Redis set per list, suppression:<list_id>. Kickoff checks every batch it
+# materializes against the sets with one pipelined SMISMEMBER per list, so a
+# list of millions of addresses costs one round-trip per batch and O(1) per
+# recipient instead of a join against the audience.
+#
+# A set is trusted only while its :ready marker exists. A missing marker (fresh
+# or flushed Redis, a failed write) makes the next send rebuild the set from
+# the DB before using it, so an outage never lets a suppressed address through.
+BATCH = 5000
+BOUNCED_LIST = "Hard bounces"
+
+
+def members_key(list_id) -> str:
+    return f"suppression:{list_id}"
+
+def ready_key(list_id) -> str:
+    return f"suppression:{list_id}:ready"
+
+def conn():
+    return get_redis_connection("default")
+
+def normalize(email) -> str:
+    return (email or "").strip().lower()
+
+def _valid(email: str) -> bool:
+    try:
+        validate_email(email)
+    except ValidationError:
+        return False
+    return True
+
+
+# ------------ Writes ------------
+def _write(list_id, emails: List[str], reason: str) -> None:
+    SuppressedAddress.objects.bulk_create(
+        [SuppressedAddress(suppression_list_id=list_id, email_address=e, reason=reason) for e in emails],
+        batch_size=BATCH, ignore_conflicts=True,
+    )
+    try:
+        conn().sadd(members_key(list_id), *emails)
+    except RedisError as e:
+        # the DB has them; make the next send rebuild the set rather than trust it
+        logger.warning("suppression list %s not mirrored: %s", list_id, e)
+        _forget_ready(list_id)
+
+def add(suppression_list: SuppressionList, emails: Iterable[str],
+        reason: str = SuppressionReason.MANUAL) -> Dict[str, int]:
+    """Stream addresses into a list in BATCH-sized INSERTs and SADDs; already-listed ones are skipped."""
+    received = invalid = 0
+    batch: set = set()
+    for raw in emails:
+        received += 1
+        email = normalize(raw)
+        if not _valid(email):
+            invalid += 1
+            continue
+        batch.add(email)
+        if len(batch) >= BATCH:
+            _write(suppression_list.id, list(batch), reason)
+            batch = set()
+    if batch:
+        _write(suppression_list.id, list(batch), reason)
+    return {"received": received, "invalid": invalid}
+
+def remove(suppression_list: SuppressionList, emails: Iterable[str]) -> int:
+    emails = list({normalize(e) for e in emails})
+    if not emails:
+        return 0
+    deleted, _ = SuppressedAddress.objects.filter(suppression_list=suppression_list, email_address__in=emails).delete()
+    conn().srem(members_key(suppression_list.id), *emails)
+    return deleted
+
+def forget(list_id) -> None:
+    """Drop the mirror of a deleted list."""
+    conn().delete(members_key(list_id), ready_key(list_id))
+
+def _forget_ready(list_id) -> None:
+    try:
+        conn().delete(ready_key(list_id))
+    except RedisError:
+        pass
+
+def read_csv(file) -> Iterator[str]:
+    """First column of an uploaded CSV (or one address per line); a header row just counts as invalid."""
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", errors="replace")
+    for row in csv.reader(text):
+        if row:
+            yield row[0]
+
+def suppress_bounced(contact_ids: Sequence[str]) -> None:
+    """Hard bounces go on the global bounce list, so no other audience mails the address either."""
+    emails = list(Contact.objects.filter(id__in=contact_ids).values_list("email_address", flat=True))
+    if not emails:
+        return
+    bounces, _ = SuppressionList.objects.get_or_create(name=BOUNCED_LIST, defaults={"is_global": True})
+    add(bounces, emails, SuppressionReason.BOUNCED)
+
+
+# ------------ Send time ------------
+def lists_for(campaign) -> List[str]:
+    """The global lists plus the ones the campaign picked."""
+    ids = (SuppressionList.objects
+           .filter(Q(is_global=True) | Q(id__in=campaign.suppress_list_ids or []))
+           .values_list("id", flat=True))
+    return sorted(str(i) for i in ids)
+
+def rebuild(list_id) -> int:
+    """Refill a list's set from the DB, BATCH addresses per SADD, then mark it ready."""
+    r, key = conn(), members_key(list_id)
+    rows = (SuppressedAddress.objects.filter(suppression_list_id=list_id)
+            .values_list("email_address", flat=True).iterator(chunk_size=BATCH))
+    n, batch = 0, []
+    for email in rows:
+        batch.append(email)
+        if len(batch) >= BATCH:
+            r.sadd(key, *batch)
+            n, batch = n + len(batch), []
+    if batch:
+        r.sadd(key, *batch)
+        n += len(batch)
+    # adds are idempotent, so writes racing the rebuild are never lost
+    r.set(ready_key(list_id), 1)
+    return n
+
+def ensure_mirrored(list_ids: Sequence[str]) -> None:
+    if not list_ids:
+        return
+    p = conn().pipeline(transaction=False)
+    for list_id in list_ids:
+        p.exists(ready_key(list_id))
+    for list_id, ready in zip(list_ids, p.execute()):
+        if not ready:
+            rebuild(list_id)
+
+def drop_suppressed(list_ids: Sequence[str], recipients: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Filter (contact_id, email) pairs down to those on none of the lists: one pipelined round-trip."""
+    if not list_ids or not recipients:
+        return recipients
+    emails = [email.lower() for _, email in recipients]
+    p = conn().pipeline(transaction=False)
+    for list_id in list_ids:
+        p.smismember(members_key(list_id), emails)
+    hits = [any(flags) for flags in zip(*p.execute())]
+    if not any(hits):
+        return recipients
+    return [pair for pair, hit in zip(recipients, hits) if not hit]
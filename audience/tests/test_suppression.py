@@ -0,0 +1,157 @@
+import uuid
+from unittest import mock
+
+import fakeredis
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from redis.exceptions import RedisError
+
+from audience.models import Audience, Contact, SuppressedAddress, SuppressionList, SuppressionReason
+from audience.services import suppression
+
+
+class FakeRedisMixin:
+    """Points the suppression mirror at a fresh in-memory Redis."""
+
+    def setUp(self):
+        super().setUp()
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch.object(suppression, "get_redis_connection", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _members(self, lst):
+        return {m.decode() for m in self.redis.smembers(suppression.members_key(lst.id))}
+
+    def _ready(self, lst):
+        return bool(self.redis.exists(suppression.ready_key(lst.id)))
+
+
+class WriteTests(FakeRedisMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.list = SuppressionList.objects.create(name="blocked")
+
+    def test_add_normalizes_and_skips_invalid(self):
+        result = suppression.add(self.list, [" A@corp.io", "a@corp.io", "nope", "b@corp.io"])
+        self.assertEqual(result, {"received": 4, "invalid": 1})
+        self.assertEqual(set(self.list.addresses.values_list("email_address", flat=True)), {"a@corp.io", "b@corp.io"})
+        self.assertEqual(self._members(self.list), {"a@corp.io", "b@corp.io"})
+        # already listed: no duplicate rows
+        suppression.add(self.list, ["a@corp.io"])
+        self.assertEqual(self.list.addresses.count(), 2)
+
+    def test_remove(self):
+        suppression.add(self.list, ["a@corp.io", "b@corp.io"])
+        self.assertEqual(suppression.remove(self.list, ["A@corp.io ", "x@corp.io"]), 1)
+        self.assertEqual(self._members(self.list), {"b@corp.io"})
+        self.assertEqual(suppression.remove(self.list, []), 0)
+
+    def test_forget_drops_the_mirror(self):
+        suppression.add(self.list, ["a@corp.io"])
+        suppression.ensure_mirrored([str(self.list.id)])
+        suppression.forget(self.list.id)
+        self.assertEqual(self._members(self.list), set())
+        self.assertFalse(self._ready(self.list))
+
+    def test_redis_failure_keeps_the_rows_and_clears_ready(self):
+        suppression.rebuild(self.list.id)
+        self.assertTrue(self._ready(self.list))
+        with mock.patch.object(self.redis, "sadd", side_effect=RedisError("down")):
+            result = suppression.add(self.list, ["a@corp.io"])
+        self.assertEqual(result, {"received": 1, "invalid": 0})
+        self.assertTrue(self.list.addresses.filter(email_address="a@corp.io").exists())
+        self.assertFalse(self._ready(self.list))
+        # the next send rebuilds the set from the DB
+        suppression.ensure_mirrored([str(self.list.id)])
+        self.assertEqual(self._members(self.list), {"a@corp.io"})
+
+    def test_suppress_bounced(self):
+        audience = Audience.objects.create(name="list")
+        bounced = Contact.objects.create(audience=audience, email_address="gone@corp.io")
+        Contact.objects.create(audience=audience, email_address="fine@corp.io")
+        suppression.suppress_bounced([str(bounced.id)])
+        bounces = SuppressionList.objects.get(name=suppression.BOUNCED_LIST)
+        self.assertTrue(bounces.is_global)
+        self.assertEqual(list(bounces.addresses.values_list("email_address", "reason")),
+                         [("gone@corp.io", SuppressionReason.BOUNCED)])
+        self.assertEqual(self._members(bounces), {"gone@corp.io"})
+        suppression.suppress_bounced([str(uuid.uuid4())])
+        self.assertEqual(bounces.addresses.count(), 1)
+
+
+class SendTimeTests(FakeRedisMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.a = SuppressionList.objects.create(name="a")
+        self.b = SuppressionList.objects.create(name="b")
+
+    def test_ensure_mirrored_rebuilds_lists_without_ready(self):
+        SuppressedAddress.objects.create(suppression_list=self.a, email_address="a@corp.io")
+        SuppressedAddress.objects.create(suppression_list=self.b, email_address="b@corp.io")
+        suppression.ensure_mirrored([str(self.a.id), str(self.b.id)])
+        self.assertEqual(self._members(self.a), {"a@corp.io"})
+        self.assertTrue(self._ready(self.a) and self._ready(self.b))
+        # a ready set is trusted as is
+        SuppressedAddress.objects.create(suppression_list=self.a, email_address="late@corp.io")
+        suppression.ensure_mirrored([str(self.a.id)])
+        self.assertEqual(self._members(self.a), {"a@corp.io"})
+        self.redis.delete(suppression.ready_key(self.a.id))
+        suppression.ensure_mirrored([str(self.a.id)])
+        self.assertEqual(self._members(self.a), {"a@corp.io", "late@corp.io"})
+
+    def test_drop_suppressed(self):
+        suppression.add(self.a, ["a@corp.io"])
+        suppression.add(self.b, ["b@corp.io"])
+        recipients = [("1", "A@corp.io"), ("2", "b@corp.io"), ("3", "c@corp.io")]
+        lists = [str(self.a.id), str(self.b.id)]
+        self.assertEqual(suppression.drop_suppressed(lists, recipients), [("3", "c@corp.io")])
+        self.assertEqual(suppression.drop_suppressed([str(self.a.id)], recipients[1:]), recipients[1:])
+        self.assertEqual(suppression.drop_suppressed([], recipients), recipients)
+
+    def test_lists_for(self):
+        glob = SuppressionList.objects.create(name="global", is_global=True)
+        campaign = mock.Mock(suppress_list_ids=[str(self.a.id)])
+        self.assertEqual(suppression.lists_for(campaign), sorted([str(glob.id), str(self.a.id)]))
+
+
+class ImportEndpointTests(FakeRedisMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.list = SuppressionList.objects.create(name="blocked")
+        self.url = f"/api/suppression-lists/{self.list.id}/import/"
+
+    def test_json(self):
+        response = self.client.post(self.url, {"emails": ["a@corp.io", "B@corp.io", "bad"], "reason": "complained"},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"received": 3, "invalid": 1, "addresses_count": 2})
+        self.assertEqual(set(self.list.addresses.values_list("reason", flat=True)), {SuppressionReason.COMPLAINED})
+        self.assertEqual(self._members(self.list), {"a@corp.io", "b@corp.io"})
+
+    def test_csv(self):
+        upload = SimpleUploadedFile("list.csv", b"email,name\na@corp.io,A\n\nc@corp.io,C\n", content_type="text/csv")
+        response = self.client.post(self.url, {"file": upload})
+        self.assertEqual(response.status_code, 200)
+        # the header row counts as invalid
+        self.assertEqual(response.json(), {"received": 3, "invalid": 1, "addresses_count": 2})
+        self.assertEqual(set(self.list.addresses.values_list("reason", flat=True)), {SuppressionReason.IMPORTED})
+
+    def test_needs_emails_or_file(self):
+        response = self.client.post(self.url, {}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_redis_down_still_returns_counts(self):
+        with mock.patch.object(self.redis, "sadd", side_effect=RedisError("down")):
+            response = self.client.post(self.url, {"emails": ["a@corp.io"]}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["addresses_count"], 1)
+
+    def test_delete_forgets_the_mirror(self):
+        suppression.add(self.list, ["a@corp.io"])
+        response = self.client.delete(f"/api/suppression-lists/{self.list.id}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self._members(self.list), set())
@@ -1,5 +1,5 @@
 from rest_framework.routers import DefaultRouter
-from .views import ContactViewSet, TagViewSet, AudienceViewSet
+from .views import ContactViewSet, TagViewSet, AudienceViewSet, SuppressionListViewSet
 
 app_name = "audience"
 
@@ -7,6 +7,7 @@ router = DefaultRouter()
 router.register(r"audiences", AudienceViewSet, basename="audience")
 router.register(r"contacts", ContactViewSet, basename="contact")
 router.register(r"tags", TagViewSet, basename="tag")
+router.register(r"suppression-lists", SuppressionListViewSet, basename="suppression-list")
 
 
 urlpatterns = router.urls
@@ -1,13 +1,15 @@
-from rest_framework import viewsets , serializers
+from rest_framework import viewsets , serializers, status
+from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from django.db.models import Count, Q
 from django.db.models import Prefetch, QuerySet
 
 
-from .models import Audience, Contact, Tag
+from .models import Audience, Contact, SuppressionList, Tag
 from .serializers import AudienceSerialzer, ContactSerializer, TagSerialzer, TagDetailSerializer, AudienceDetailSerializer
-from audience.services import services
+from .serializers import SuppressionImportSerializer, SuppressionListSerializer
+from audience.services import services, suppression
 
 
 
@@ -83,4 +85,28 @@ class ContactViewSet(viewsets.ModelViewSet):
     search_fields = ["email_address"]  # add more if you need
     ordering_fields = ["created_at", "email_address", "status"]
     ordering = ["-created_at"]
-    
\ No newline at end of file
+    
+
+
+class SuppressionListViewSet(viewsets.ModelViewSet):
+    queryset = SuppressionList.objects.annotate(addresses_count=Count("addresses")).order_by("-created_at")
+    serializer_class = SuppressionListSerializer
+    permission_classes = [AllowAny]
+    pagination_class = None  # Disable pagination
+    search_fields = ["name"]
+
+    def perform_destroy(self, instance):
+        list_id = instance.id
+        super().perform_destroy(instance)
+        suppression.forget(list_id)
+
+    @action(detail=True, methods=["post"], url_path="import")
+    def import_addresses(self, request, pk=None):
+        suppression_list = self.get_object()
+        serializer = SuppressionImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        emails = suppression.read_csv(data["file"]) if data.get("file") else data["emails"]
+        result = suppression.add(suppression_list, emails, data["reason"])
+        total = suppression_list.addresses.count()
+        return Response({**result, "addresses_count": total}, status=status.HTTP_200_OK)
@@ -1,10 +1,12 @@
 # campaign/admin.py
 from django.contrib import admin
 from django.db.models.functions import Lower
+from django.utils.html import format_html, format_html_join
 
 from .models import Campaign, CampaignStatus
 from audience.models import Contact
 from .tasks import kickoff_campaign_send
+from .services import stage_timing
 
 
 def _estimate_for_campaign(campaign: Campaign) -> int:
@@ -40,7 +42,7 @@ class CampaignAdmin(admin.ModelAdmin):
         "id", "created_at", "updated_at",
         "started_sending_at", "completed_at",
         "send_job_id", 
-        "emails_sent", "estimated_recipients",
+        "emails_sent", "estimated_recipients", "chunk_stages",
     )
 
     fieldsets = (
@@ -57,7 +59,7 @@ class CampaignAdmin(admin.ModelAdmin):
         }),
         ("Runtime", {
             "fields": ("send_job_id",
-                       "emails_sent", "started_sending_at", "completed_at"),
+                       "emails_sent", "started_sending_at", "completed_at", "chunk_stages"),
         }),
         ("Meta", {
             "fields": ("id", "created_at", "updated_at"),
@@ -66,6 +68,23 @@ class CampaignAdmin(admin.ModelAdmin):
 
     actions = ["recalculate_estimated_recipients", "send_now"]
 
+    @admin.display(description="Chunk stage timing")
+    def chunk_stages(self, obj):
+        # filled while SEND_PROFILING is on, see campaign.services.stage_timing
+        summary = stage_timing.summary(str(obj.pk))
+        if not summary["chunks"]:
+            return "No timings recorded (SEND_PROFILING off or nothing sent yet)."
+        rows = format_html_join(
+            "", "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}%</td></tr>",
+            ((s["stage"], s["per_chunk_ms"], s["per_message_ms"], round(s["share"] * 100, 1))
+             for s in summary["stages"]),
+        )
+        return format_html(
+            "<p>{} chunks, {} messages, {} sampled profiles</p>"
+            "<table><tr><th>Stage</th><th>ms/chunk</th><th>ms/message</th><th>Share</th></tr>{}</table>",
+            summary["chunks"], summary["messages"], len(summary["profiles"]), rows,
+        )
+
     def recalculate_estimated_recipients(self, request, queryset):
         updated = 0
         for campaign in queryset:
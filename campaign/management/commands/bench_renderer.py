@@ -0,0 +1,41 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from campaign.services.renderer import CampaignTemplate, split_template
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark: per-recipient str.replace on compiled HTML vs the pre-split segment renderer."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size-kb", type=int, default=120, help="Approximate compiled HTML size")
+        parser.add_argument("--links", type=int, default=20, help="Tracking links in the body")
+        parser.add_argument("--recipients", type=int, default=5000)
+
+    def handle(self, *args, **opts):
+        link = '<a href="https://t.example.com/c/AbCdEfGhIjKlMnOpQrStUv?r={recipient_id}">link</a>'
+        filler = "<p>" + ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 8) + "</p>\n"
+        per_gap = max(1, (opts["size_kb"] * 1024) // (opts["links"] + 1) // len(filler))
+        html = (filler * per_gap).join([""] + [link] * opts["links"] + [""])
+        ids = [str(uuid.uuid4()) for _ in range(opts["recipients"])]
+
+        started = time.perf_counter()
+        for cid in ids:
+            html.replace("?r={recipient_id}", f"?r={cid}")
+        replace_s = time.perf_counter() - started
+
+        template = CampaignTemplate(split_template(html))
+        started = time.perf_counter()
+        for cid in ids:
+            template.html_for(cid)
+        render_s = time.perf_counter() - started
+
+        assert template.html_for(ids[0]) == html.replace("?r={recipient_id}", f"?r={ids[0]}")
+
+        n = len(ids)
+        self.stdout.write(f"html={len(html) / 1024:.0f}KB links={opts['links']} recipients={n}")
+        self.stdout.write(f"replace   {replace_s * 1e6 / n:8.1f} us/msg")
+        self.stdout.write(f"segments  {render_s * 1e6 / n:8.1f} us/msg")
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {replace_s / render_s:.2f}x"))
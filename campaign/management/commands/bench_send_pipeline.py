@@ -0,0 +1,254 @@
+import heapq
+import itertools
+import json
+import statistics
+import time
+from collections import Counter
+from contextlib import contextmanager
+from unittest import mock
+
+import redis
+from celery.app.task import Task
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from audience.models import Audience, Contact
+from campaign import tasks
+from campaign.models import Campaign, CampaignStatus
+from campaign.services import async_sender, campaigns, email_service, smtp_pool
+from campaign.smtp_sink import SMTPSink
+
+
+class InProcessQueue:
+    """
+    Stands in for the broker: apply_async/delay land here and drain() runs
+    them in this process, in order, honouring countdown/eta. Unlike
+    CELERY_TASK_ALWAYS_EAGER the dispatch -> chunk -> dispatch chain doesn't
+    recurse, and a chunk runs after the dispatch that scheduled it returns,
+    like it would on a worker.
+    """
+
+    def __init__(self) -> None:
+        self._heap = []
+        self._seq = itertools.count()
+        self.ran = Counter()
+
+    def apply_async(self, task, args=None, kwargs=None, countdown=None, eta=None, **_):
+        due = time.monotonic() + (countdown or 0)
+        if eta is not None:
+            due = time.monotonic() + max(0.0, eta.timestamp() - time.time())
+        heapq.heappush(self._heap, (due, next(self._seq), task, tuple(args or ()), kwargs or {}))
+        return mock.Mock(id=f"bench-{len(self._heap)}")
+
+    @contextmanager
+    def installed(self):
+        queue = self
+
+        def apply_async(task, args=None, kwargs=None, **opts):
+            return queue.apply_async(task, args, kwargs, **opts)
+
+        with mock.patch.object(Task, "apply_async", apply_async):
+            yield self
+
+    def drain(self, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        while self._heap:
+            due, _, task, args, kwargs = heapq.heappop(self._heap)
+            wait = due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            if time.monotonic() > deadline:
+                raise CommandError(f"Campaign didn't finish within {timeout:.0f}s; {len(self._heap)} tasks still queued")
+            task.run(*args, **kwargs)
+            self.ran[task.name.rpartition(".")[2]] += 1
+
+
+class Probe:
+    """Counts SQL queries and Redis round-trips, and times every SMTP transaction."""
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.redis_calls = 0
+        self.latencies = []
+
+    def _sql(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def installed(self):
+        probe = self
+        execute_command = redis.Redis.execute_command
+        pipeline_execute = redis.client.Pipeline.execute
+        safe_send = email_service.safe_send
+        sendmail = async_sender.AsyncSMTPSession.sendmail
+
+        # a pipeline is one round-trip however many commands it buffers
+        def counted_command(self, *args, **kwargs):
+            probe.redis_calls += 1
+            return execute_command(self, *args, **kwargs)
+
+        def counted_pipeline(self, *args, **kwargs):
+            probe.redis_calls += 1
+            return pipeline_execute(self, *args, **kwargs)
+
+        def timed_send(msg, email):
+            started = time.perf_counter()
+            try:
+                return safe_send(msg, email)
+            finally:
+                probe.latencies.append(time.perf_counter() - started)
+
+        async def timed_sendmail(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await sendmail(self, *args, **kwargs)
+            finally:
+                probe.latencies.append(time.perf_counter() - started)
+
+        with mock.patch.object(redis.Redis, "execute_command", counted_command), \
+                mock.patch.object(redis.client.Pipeline, "execute", counted_pipeline), \
+                mock.patch.object(email_service, "safe_send", timed_send), \
+                mock.patch.object(async_sender.AsyncSMTPSession, "sendmail", timed_sendmail), \
+                connection.execute_wrapper(self._sql):
+            yield self
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(pct) - 1]
+
+
+def seed_campaign(n: int) -> Campaign:
+    """n contacts over a few domains and a compiled campaign with merge fields and tracked links."""
+    audience = Audience.objects.create(name="bench")
+    domains = ["gmail.com", "yahoo.com", "outlook.com", "example.com"]
+    Contact.objects.bulk_create(
+        [Contact(audience=audience, email_address=f"r{i}@{domains[i % len(domains)]}",
+                 merge_fields={"FNAME": f"R{i}"}) for i in range(n)],
+        batch_size=1000,
+    )
+    campaign = Campaign.objects.create(
+        title="bench", audience=audience, subject_line="Hello {{ FNAME }}",
+        from_name="Bench", from_email="bench@example.com", to_name_format="{{first_name}}",
+        content_html="<p>Hi {{ FNAME }}</p>" + "".join(
+            f'<p><a href="https://example.com/{i}">link {i}</a></p>' for i in range(5)),
+        estimated_recipients=n,
+    )
+    campaigns.compile_links(campaign)
+    return campaign
+
+
+def run_campaign(campaign: Campaign, *, engine: str = "sync", handshake_ms: float = 0.0,
+                 message_ms: float = 0.0, timeout: float = 600.0) -> dict:
+    """Send `campaign` end to end through InProcessQueue and a fresh SMTPSink; -> the JSON report."""
+    queue, probe = InProcessQueue(), Probe()
+
+    with SMTPSink(handshake_delay=handshake_ms / 1000.0,
+                  message_delay=message_ms / 1000.0) as sink, override_settings(
+        EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+        EMAIL_HOST="127.0.0.1", EMAIL_PORT=sink.port, EMAIL_USE_TLS=False,
+        EMAIL_HOST_USER="", EMAIL_HOST_PASSWORD="",
+        SEND_ENGINE=engine, SEND_RATE_GLOBAL=0, SEND_RATE_PER_CAMPAIGN=0,
+        SEND_RATE_PER_SENDER_DOMAIN=0,
+    ):
+        smtp_pool.reset_pool()
+        async_sender.reset_engine()
+        with queue.installed(), probe.installed():
+            started = time.perf_counter()
+            tasks.kickoff_campaign_send.delay(str(campaign.id))
+            queue.drain(timeout)
+            elapsed = time.perf_counter() - started
+        smtp_pool.reset_pool()
+        async_sender.reset_engine()
+        delivered = sink.stats.as_dict()
+
+    campaign.refresh_from_db()
+    if campaign.status != CampaignStatus.Completed:
+        raise CommandError(f"Campaign ended {campaign.status}, not completed")
+    sent = campaign.emails_sent
+    per_msg = max(sent, 1)
+    latencies_ms = [s * 1000 for s in probe.latencies]
+    return {
+        "engine": engine,
+        "contacts": campaign.estimated_recipients,
+        "sink": {"handshake_ms": handshake_ms, "message_ms": message_ms, **delivered},
+        "sent": sent,
+        "seconds": round(elapsed, 3),
+        "msgs_per_sec": round(sent / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(_percentile(latencies_ms, 50), 3),
+            "p99": round(_percentile(latencies_ms, 99), 3),
+            "max": round(max(latencies_ms, default=0.0), 3),
+        },
+        "sql_queries_per_msg": round(probe.queries / per_msg, 3),
+        "redis_roundtrips_per_msg": round(probe.redis_calls / per_msg, 3),
+        "tasks": dict(queue.ran),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a whole campaign (kickoff -> dispatch -> chunks) in-process against a local SMTP sink "
+        "and report msgs/sec, per-message latency, SQL queries and Redis round-trips per message as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--contacts", type=int, default=2000, help="Contacts to seed and send to")
+        parser.add_argument("--engine", choices=["sync", "async"], default="sync", help="SEND_ENGINE to measure")
+        parser.add_argument("--handshake-ms", type=float, default=0.0,
+                            help="Simulated TCP+TLS+AUTH cost the sink adds per connection")
+        parser.add_argument("--message-ms", type=float, default=0.0,
+                            help="Simulated time the sink takes to accept each message")
+        parser.add_argument("--timeout", type=float, default=600.0, help="Give up after this many seconds")
+        parser.add_argument("--output", help="Write the JSON result here instead of stdout")
+        parser.add_argument("--baseline", help="Earlier JSON result to compare against")
+        parser.add_argument("--tolerance", type=float, default=0.10,
+                            help="Allowed relative regression against --baseline before the command fails")
+
+    def handle(self, *args, **opts):
+        # seed into a throwaway test database, never the configured one
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            campaign = seed_campaign(opts["contacts"])
+            result = run_campaign(campaign, engine=opts["engine"], handshake_ms=opts["handshake_ms"],
+                                  message_ms=opts["message_ms"], timeout=opts["timeout"])
+        finally:
+            runner.teardown_databases(old_config)
+
+        body = json.dumps(result, indent=2)
+        if opts["output"]:
+            with open(opts["output"], "w") as fh:
+                fh.write(body + "\n")
+            self.stdout.write(f"wrote {opts['output']}")
+        else:
+            self.stdout.write(body)
+        if opts["baseline"]:
+            self._compare(result, opts["baseline"], opts["tolerance"])
+
+    def _compare(self, result: dict, path: str, tolerance: float) -> None:
+        with open(path) as fh:
+            base = json.load(fh)
+        # (metric, higher is better)
+        checks = [
+            ("msgs_per_sec", True),
+            ("sql_queries_per_msg", False),
+            ("redis_roundtrips_per_msg", False),
+        ]
+        regressions = []
+        for key, higher_better in checks:
+            old, new = base.get(key), result.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_better else change) > tolerance:
+                regressions.append(f"{key}: {old} -> {new} ({change:+.1%})")
+        if regressions:
+            raise CommandError("Regressed against baseline:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"Within {tolerance:.0%} of {path}"))
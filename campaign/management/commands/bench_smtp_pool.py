@@ -0,0 +1,51 @@
+import time
+
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from campaign.services import smtp_pool
+from campaign.smtp_sink import SMTPSink
+
+
+class Command(BaseCommand):
+    help = "Compare connection-per-chunk sending with the pooled SMTP connections against a local sink."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=600, help="Total messages to send per run")
+        parser.add_argument("--chunk-size", type=int, default=30, help="Messages per chunk (one connection each without the pool)")
+        parser.add_argument("--handshake-ms", type=float, default=50.0,
+                            help="Simulated TCP+TLS+AUTH cost the sink adds per connection")
+
+    def handle(self, *args, **opts):
+        total, chunk = opts["messages"], opts["chunk_size"]
+        chunks = [range(i, min(i + chunk, total)) for i in range(0, total, chunk)]
+
+        with SMTPSink(handshake_delay=opts["handshake_ms"] / 1000.0) as sink, override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1", EMAIL_PORT=sink.port, EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER="", EMAIL_HOST_PASSWORD="",
+        ):
+            def run(label, open_conn):
+                before = sink.stats.as_dict()["connections"]
+                started = time.perf_counter()
+                for rng in chunks:
+                    with open_conn() as conn:
+                        for i in rng:
+                            msg = EmailMessage("bench", "body", "from@example.com", [f"r{i}@example.com"], connection=conn)
+                            msg.send(fail_silently=False)
+                            smtp_pool.get_pool().note_sent(conn)
+                elapsed = time.perf_counter() - started
+                conns = sink.stats.as_dict()["connections"] - before
+                self.stdout.write(
+                    f"{label:<10} {total} msgs in {elapsed:.3f}s  "
+                    f"{total / elapsed:,.0f} msg/s  connections={conns}"
+                )
+                return elapsed
+
+            smtp_pool.reset_pool()
+            baseline = run("per-chunk", get_connection)
+            pooled = run("pooled", smtp_pool.connection)
+            smtp_pool.reset_pool()
+
+        self.stdout.write(self.style.SUCCESS(f"Pooled speedup: {baseline / pooled:.2f}x"))
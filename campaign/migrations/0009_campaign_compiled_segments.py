@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0008_alter_campaign_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='compiled_segments',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audience', '0007_contact_contact_audience_lower_email'),
+        ('campaign', '0009_campaign_compiled_segments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Delivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('sent', 'Sent'), ('deferred', 'Deferred'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('smtp_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='campaign.campaign')),
+                ('contact', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='audience.contact')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['campaign', 'status'], name='delivery_campaign_status')],
+                'constraints': [models.UniqueConstraint(fields=('campaign', 'contact'), name='delivery_campaign_contact')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0010_delivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Low'), (2, 'Normal'), (4, 'High'), (8, 'Urgent')], default=2),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 05:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0011_campaign_priority'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='per_recipient_local_time',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='timezone_str',
+            field=models.CharField(default='UTC', max_length=64),
+        ),
+    ]
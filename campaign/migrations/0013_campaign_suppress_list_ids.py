@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0012_campaign_local_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='suppress_list_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
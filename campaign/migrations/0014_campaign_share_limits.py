@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 05:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0013_campaign_suppress_list_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='share_ceiling',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='share_floor',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -23,6 +23,13 @@ class ScheduleType(models.TextChoices):
     Immediate = "immediate", "Immediate"
     Scheduled = "scheduled", "Scheduled"
 
+class Priority(models.IntegerChoices):
+    # the value is the campaign's weight in the fair-share scheduler
+    Low = 1, "Low"
+    Normal = 2, "Normal"
+    High = 4, "High"
+    Urgent = 8, "Urgent"
+
 class ProviderStatus(models.TextChoices):
     NONE = "none", "None"
     QUEUED = "queued", "Queued"
@@ -45,7 +52,7 @@ class Campaign(models.Model):
     #exclude_tags = models.JSONField(default=list, blank=True)
     estimated_recipients = models.PositiveIntegerField(default=0)
     exclude_unsubscribed = models.BooleanField(default=True)
-    #suppress_list_ids = models.JSONField(default=list, blank=True)
+    suppress_list_ids = models.JSONField(default=list, blank=True)  # SuppressionList ids, on top of the global lists
 
 
     subject_line = models.CharField(max_length=255)
@@ -65,9 +72,14 @@ class Campaign(models.Model):
     #permalink_slug = models.SlugField(max_length=220, blank=True, default="", help_text="Public archive slug")
 
     schedule_type = models.CharField(max_length=20, choices=ScheduleType.choices, default="immediate")
+    priority = models.PositiveSmallIntegerField(choices=Priority.choices, default=Priority.Normal)
+    # chunks in flight the fair-share scheduler guarantees / allows; empty = SEND_SCHEDULER floor / ceiling
+    share_floor = models.PositiveSmallIntegerField(null=True, blank=True)
+    share_ceiling = models.PositiveSmallIntegerField(null=True, blank=True)
     scheduled_at = models.DateTimeField(null=True, blank=True, db_index=True)
-    #timezone_str = models.CharField(max_length=64, default="UTC")
-    #per_recipient_local_time = models.BooleanField(default=False)
+    timezone_str = models.CharField(max_length=64, default="UTC")
+    # scheduled_at's wall-clock time in timezone_str is sent at that time in each recipient's zone
+    per_recipient_local_time = models.BooleanField(default=False)
     #resend_to_non_openers_after_hours = models.PositiveIntegerField(null=True, blank=True)
 
     # Tracking & analytics
@@ -117,6 +129,8 @@ class Campaign(models.Model):
     # Content & compiled version
     content_html = models.TextField(blank=True, default="")
     compiled_html = models.TextField(blank=True, default="")
+    # compiled_html pre-split into [static, slot, static, ...] for per-recipient rendering
+    compiled_segments = models.JSONField(default=list, blank=True)
     compiled_at = models.DateTimeField(null=True, blank=True)
 
     # Fingerprint of the distinct URLs found in content_html (SHA-256 hex = 64 chars)
@@ -178,3 +192,35 @@ class Campaign(models.Model):
     def mark_paused(self):
         self.status = CampaignStatus.Paused
 
+    def mark_canceled(self):
+        self.status = CampaignStatus.Canceled
+        self.completed_at = timezone.now()
+
+
+
+class DeliveryStatus(models.TextChoices):
+    Queued = "queued", "Queued"
+    Sent = "sent", "Sent"
+    Deferred = "deferred", "Deferred"
+    Failed = "failed", "Failed"
+
+
+class Delivery(models.Model):
+    """Per-recipient send ledger: one row per (campaign, contact), written in bulk per chunk."""
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name="deliveries")
+    contact = models.ForeignKey("audience.Contact", on_delete=models.CASCADE, related_name="deliveries")
+    status = models.CharField(max_length=10, choices=DeliveryStatus.choices, default=DeliveryStatus.Queued)
+    smtp_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            # also the index behind "which of these contacts were already sent?"
+            models.UniqueConstraint(fields=["campaign", "contact"], name="delivery_campaign_contact"),
+        ]
+        indexes = [
+            models.Index(fields=["campaign", "status"], name="delivery_campaign_status"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.campaign_id} -> {self.contact_id} ({self.status})"
@@ -1,24 +1,53 @@
+import uuid
 from django.db.models.functions import Lower
 from rest_framework import serializers
 from .models import Campaign, CampaignStatus, ScheduleType
-from audience.models import Contact
-from campaign.services import campaigns
+from audience.models import Contact, SuppressionList
+from campaign.services import campaigns, local_time, send_window
 
 
 class CampaignSerializer(serializers.ModelSerializer):
     audience_name = serializers.CharField(source="audience.name", read_only=True)
     test_email = serializers.EmailField(write_only=True, required=False)
+    send_window = serializers.SerializerMethodField()
 
     class Meta:
         model = Campaign
-        fields = "__all__"
+        # compiled_segments is the send-time split of compiled_html: internal, and bulky in list output
+        exclude = ["compiled_segments"]
         read_only_fields = ["created_at","updated_at","emails_sent",
                             "started_sending_at","completed_at",
                             "send_job_id","estimated_recipients","status"]
 
-   
+    def get_send_window(self, obj):
+        # only active sends have a window worth a Redis read
+        if obj.status not in {CampaignStatus.Sending, CampaignStatus.Paused}:
+            return None
+        return send_window.current(str(obj.id))
+
+    def validate_timezone_str(self, value):
+        if not local_time.is_valid_zone(value):
+            raise serializers.ValidationError("Unknown time zone; use an IANA name such as Europe/Berlin.")
+        return value
+
+    def validate_suppress_list_ids(self, value):
+        if not isinstance(value, list):
+            raise serializers.ValidationError("Expected a list of suppression list ids.")
+        try:
+            ids = {str(uuid.UUID(str(v))) for v in value}
+        except ValueError:
+            raise serializers.ValidationError("Expected a list of suppression list ids.")
+        found = {str(i) for i in SuppressionList.objects.filter(id__in=ids).values_list("id", flat=True)}
+        if ids - found:
+            raise serializers.ValidationError(f"Unknown suppression lists: {', '.join(sorted(ids - found))}")
+        return sorted(ids)
+
     def validate(self, attrs):
         inst = getattr(self, "instance", None)
+        lo = attrs.get("share_floor", getattr(inst, "share_floor", None))
+        hi = attrs.get("share_ceiling", getattr(inst, "share_ceiling", None))
+        if lo is not None and hi is not None and lo > hi:
+            raise serializers.ValidationError({"share_floor": "Must not exceed share_ceiling."})
         if inst and inst.status in {CampaignStatus.Sending, CampaignStatus.Completed}:
             # choose which fields to lock after sending starts
             locked_fields = {"title", "audience", "content_html", "content_text", "from_name", "from_email"}
@@ -35,8 +64,6 @@ class CampaignSerializer(serializers.ModelSerializer):
         return campaign
 
     def update(self, instance, validated_data):
-        print("sent data test")
-
         old_audience = instance.audience
         old_excl = instance.exclude_unsubscribed
         if "schedule_type" in validated_data and validated_data["schedule_type"] == ScheduleType.Immediate:
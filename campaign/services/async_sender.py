@@ -0,0 +1,353 @@
+"""
+asyncio send engine (SEND_ENGINE = "async").
+
+One worker process drives many SMTP sessions concurrently instead of one
+blocking socket per chunk. Sessions live on a per-process event loop thread and
+are reused across chunks, like the sync pool in smtp_pool. When the relay
+advertises PIPELINING (RFC 2920) the MAIL/RCPT/DATA envelope goes out in one
+write, so a message costs two round-trips instead of four.
+"""
+from __future__ import annotations
+import asyncio
+import base64
+import os
+import ssl
+import threading
+import time
+from dataclasses import dataclass, field
+from smtplib import SMTPConnectError, SMTPException, SMTPResponseException, SMTPServerDisconnected
+from typing import Callable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.mail.utils import DNS_NAME
+
+from . import metrics
+from .email_service import is_throttling
+
+
+# ------------ Config ------------
+def send_engine() -> str:
+    return getattr(settings, "SEND_ENGINE", "sync")
+
+def _concurrency() -> int:
+    return int(getattr(settings, "ASYNC_SEND_CONCURRENCY", 20))
+
+def _max_messages() -> int:
+    return int(getattr(settings, "SMTP_POOL_MAX_MESSAGES_PER_CONNECTION", 500))
+
+def _max_idle() -> float:
+    return float(getattr(settings, "SMTP_POOL_MAX_IDLE_SECONDS", 60))
+
+def _poll_interval() -> float:
+    return float(getattr(settings, "CAMPAIGN_CONTROL_REFRESH_SECONDS", 0.5))
+
+def _flag(value) -> bool:
+    return str(value).lower() in {"true", "1", "yes"}
+
+
+# ------------ Session ------------
+class AsyncSMTPSession:
+    """Just enough ESMTP for a relay: EHLO, STARTTLS, AUTH PLAIN, MAIL/RCPT/DATA, RSET, QUIT."""
+
+    def __init__(self, host: str, port: int, *, username: str = "", password: str = "",
+                 use_tls: bool = False, use_ssl: bool = False, timeout: float = 30) -> None:
+        self.host, self.port = host, int(port)
+        self.username, self.password = username, password
+        self.use_tls, self.use_ssl = use_tls, use_ssl
+        self.timeout = timeout
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.pipelining = False
+        self.messages_sent = 0
+        self.last_used_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def _reply(self) -> Tuple[int, bytes]:
+        lines = []
+        while True:
+            line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+            if not line:
+                raise SMTPServerDisconnected("Connection unexpectedly closed")
+            lines.append(line[4:].rstrip(b"\r\n"))
+            if line[3:4] != b"-":
+                return int(line[:3]), b"\n".join(lines)
+
+    async def _command(self, cmd: str, expect: Tuple[int, ...] = (250,)) -> Tuple[int, bytes]:
+        self.writer.write(cmd.encode() + b"\r\n")
+        await self.writer.drain()
+        code, msg = await self._reply()
+        if code not in expect:
+            raise SMTPResponseException(code, msg)
+        return code, msg
+
+    async def _ehlo(self) -> None:
+        _, msg = await self._command(f"EHLO {DNS_NAME.get_fqdn()}")
+        self.pipelining = b"PIPELINING" in msg.upper()
+
+    async def connect(self) -> None:
+        ctx = ssl.create_default_context() if (self.use_ssl or self.use_tls) else None
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ctx if self.use_ssl else None),
+            self.timeout,
+        )
+        code, msg = await self._reply()
+        if code != 220:
+            raise SMTPConnectError(code, msg)
+        await self._ehlo()
+        if self.use_tls and not self.use_ssl:
+            await self._command("STARTTLS", expect=(220,))
+            await self.writer.start_tls(ctx)
+            await self._ehlo()
+        if self.username and self.password:
+            token = base64.b64encode(f"\0{self.username}\0{self.password}".encode()).decode()
+            await self._command(f"AUTH PLAIN {token}", expect=(235,))
+        self.messages_sent = 0
+        self.last_used_at = time.monotonic()
+
+    async def sendmail(self, from_addr: str, to_addr: str, data: bytes) -> None:
+        """Raises SMTPResponseException with the first non-success reply, like smtplib."""
+        envelope = [(f"MAIL FROM:<{from_addr}>", (250,)), (f"RCPT TO:<{to_addr}>", (250, 251)), ("DATA", (354,))]
+        if self.pipelining:
+            self.writer.write(b"".join(cmd.encode() + b"\r\n" for cmd, _ in envelope))
+            await self.writer.drain()
+            replies = [await self._reply() for _ in envelope]
+        else:
+            replies = []
+            for cmd, ok in envelope:
+                self.writer.write(cmd.encode() + b"\r\n")
+                await self.writer.drain()
+                replies.append(await self._reply())
+                if replies[-1][0] not in ok:
+                    break
+        for (code, msg), (_, ok) in zip(replies, envelope):
+            if code not in ok:
+                if replies[-1][0] == 354:
+                    # DATA was accepted although the envelope failed: send an empty body
+                    self.writer.write(b".\r\n")
+                    await self._reply()
+                await self._command("RSET")
+                raise SMTPResponseException(code, msg)
+
+        # dot-stuffing, as smtplib.SMTP.data does
+        body = data.replace(b"\r\n.", b"\r\n..")
+        if body.startswith(b"."):
+            body = b"." + body
+        if not body.endswith(b"\r\n"):
+            body += b"\r\n"
+        self.writer.write(body + b".\r\n")
+        await self.writer.drain()
+        code, msg = await self._reply()
+        if code != 250:
+            raise SMTPResponseException(code, msg)
+        self.messages_sent += 1
+        self.last_used_at = time.monotonic()
+
+    async def close(self) -> None:
+        if self.writer is None:
+            return
+        try:
+            if not self.writer.is_closing():
+                self.writer.write(b"QUIT\r\n")
+                await self.writer.drain()
+            self.writer.close()
+        except Exception:
+            pass
+        self.reader = self.writer = None
+
+
+def _new_session() -> AsyncSMTPSession:
+    return AsyncSMTPSession(
+        settings.EMAIL_HOST, settings.EMAIL_PORT,
+        username=settings.EMAIL_HOST_USER or "",
+        password=settings.EMAIL_HOST_PASSWORD or "",
+        use_tls=_flag(settings.EMAIL_USE_TLS),
+        use_ssl=_flag(getattr(settings, "EMAIL_USE_SSL", False)),
+        timeout=float(getattr(settings, "EMAIL_TIMEOUT", None) or 30),
+    )
+
+
+def _is_deferral(exc: Exception) -> bool:
+    return isinstance(exc, SMTPResponseException) and 400 <= exc.smtp_code < 500
+
+
+def _is_throttled(exc: Exception) -> bool:
+    return isinstance(exc, SMTPResponseException) and is_throttling(exc.smtp_code, str(exc))
+
+
+# ------------ Engine ------------
+@dataclass
+class Job:
+    record: str          # packed recipient, see redis_service.pack_recipient
+    from_addr: str
+    to_addr: str
+    data: bytes
+    error: Optional[Exception] = None
+
+
+@dataclass
+class ChunkOutcome:
+    sent: List[Job] = field(default_factory=list)
+    failed: List[Job] = field(default_factory=list)
+    deferred: List[Job] = field(default_factory=list)   # 4xx; a throttling one stops the chunk
+    not_attempted: List[str] = field(default_factory=list)
+    stopped: bool = False     # should_stop() fired (pause/cancel)
+    smtp_seconds: float = 0.0  # summed per-message transaction time
+
+    @property
+    def attempted(self) -> int:
+        return len(self.sent) + len(self.failed) + len(self.deferred)
+
+
+class AsyncEngine:
+    """
+    Owns an event loop thread and the idle sessions on it. run_chunk() is
+    called from the Celery worker thread and blocks until the jobs are done.
+    """
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self._idle: List[AsyncSMTPSession] = []
+        self._thread = threading.Thread(target=self.loop.run_forever, name="async-smtp", daemon=True)
+        self._thread.start()
+
+    async def _checkout(self) -> AsyncSMTPSession:
+        while self._idle:
+            session = self._idle.pop()
+            fresh = time.monotonic() - session.last_used_at <= _max_idle()
+            if session.is_open and fresh and session.messages_sent < _max_messages():
+                return session
+            await session.close()
+        session = _new_session()
+        await session.connect()
+        return session
+
+    async def _checkin(self, session: AsyncSMTPSession, broken: bool = False) -> None:
+        if broken or not session.is_open or session.messages_sent >= _max_messages():
+            await session.close()
+        else:
+            self._idle.append(session)
+
+    async def _run(self, jobs: List[Job], should_stop: Callable[[], bool], outcome: ChunkOutcome) -> None:
+        queue: asyncio.Queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+        stop = asyncio.Event()
+        done = asyncio.Event()
+
+        async def watch() -> None:
+            # pause/cancel is a (cached) Redis read: keep it off the loop
+            while not done.is_set():
+                if await asyncio.to_thread(should_stop):
+                    outcome.stopped = True
+                    stop.set()
+                    return
+                try:
+                    await asyncio.wait_for(done.wait(), _poll_interval())
+                except asyncio.TimeoutError:
+                    pass
+
+        async def worker() -> None:
+            session = None
+            try:
+                while not stop.is_set() and not queue.empty():
+                    job = queue.get_nowait()
+                    if session is None:
+                        try:
+                            session = await self._checkout()
+                        except (OSError, SMTPException, asyncio.TimeoutError) as e:
+                            job.error = e
+                            if _is_throttled(e):
+                                # the relay turned the session away: back off like any throttling reply
+                                outcome.deferred.append(job)
+                                stop.set()
+                                return
+                            # unreachable: the message fails (and is retried), the next one tries again
+                            outcome.failed.append(job)
+                            continue
+                    started = time.perf_counter()
+                    try:
+                        await session.sendmail(job.from_addr, job.to_addr, job.data)
+                        outcome.sent.append(job)
+                    except SMTPResponseException as e:
+                        # a reply, not a dead socket (SMTPException is an OSError, so this goes first)
+                        job.error = e
+                        if _is_deferral(e):
+                            outcome.deferred.append(job)
+                            if _is_throttled(e):
+                                stop.set()
+                        else:
+                            outcome.failed.append(job)
+                        if e.smtp_code == 421:
+                            # the relay is closing the session
+                            await self._checkin(session, broken=True)
+                            session = None
+                    except (SMTPServerDisconnected, OSError, asyncio.TimeoutError) as e:
+                        job.error = e
+                        outcome.failed.append(job)
+                        await self._checkin(session, broken=True)
+                        session = None
+                    except Exception as e:
+                        job.error = e
+                        outcome.failed.append(job)
+                    finally:
+                        elapsed = time.perf_counter() - started
+                        outcome.smtp_seconds += elapsed
+                        metrics.smtp_seconds.labels("async").observe(elapsed)
+            finally:
+                if session is not None:
+                    await self._checkin(session)
+
+        watcher = asyncio.ensure_future(watch())
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(1, min(_concurrency(), len(jobs))))))
+        finally:
+            done.set()
+            await watcher
+        while not queue.empty():
+            outcome.not_attempted.append(queue.get_nowait().record)
+
+    def run_chunk(self, jobs: List[Job], should_stop: Callable[[], bool]) -> ChunkOutcome:
+        outcome = ChunkOutcome()
+        if should_stop():
+            outcome.stopped = True
+            outcome.not_attempted = [job.record for job in jobs]
+            return outcome
+        asyncio.run_coroutine_threadsafe(self._run(jobs, should_stop, outcome), self.loop).result()
+        return outcome
+
+    def close(self) -> None:
+        async def close_idle() -> None:
+            idle, self._idle = self._idle, []
+            for session in idle:
+                await session.close()
+        try:
+            asyncio.run_coroutine_threadsafe(close_idle(), self.loop).result(timeout=5)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+# ------------ Per-process singleton ------------
+_engine: Optional[AsyncEngine] = None
+_engine_pid: Optional[int] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> AsyncEngine:
+    """The calling process's engine; a forked child gets its own loop thread."""
+    global _engine, _engine_pid
+    with _engine_lock:
+        if _engine is None or _engine_pid != os.getpid():
+            _engine, _engine_pid = AsyncEngine(), os.getpid()
+        return _engine
+
+
+def reset_engine() -> None:
+    global _engine, _engine_pid
+    with _engine_lock:
+        engine, owner = _engine, _engine_pid
+        _engine, _engine_pid = None, None
+    if engine is not None and owner == os.getpid():
+        engine.close()
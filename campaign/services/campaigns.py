@@ -1,25 +1,26 @@
 from typing import Mapping, Any, Dict, TypedDict, Optional, Type
+import uuid
 from django.conf import settings
 from django.db import transaction
-from django.core.mail import EmailMultiAlternatives
-from email.utils import formataddr
 
 from rest_framework.serializers import Serializer
 
 from campaign.models import Campaign, CampaignStatus
-from campaign.tasks import kickoff_campaign_send
+from campaign.tasks import kickoff_campaign_send, deliver_test_email
 from campaign.services import exceptions
 from tracking import link_compiler
 from campaign.models import Campaign
 from audience.models import Contact
 from django.db.models.functions import Lower
-from . import email_service
+from django.utils import timezone
+from . import email_service, control, local_time, progress, redis_service
 from campaign.tasks import dispatch_next_chunk
 
 
 
 class SendResult(TypedDict):
     task_id: str
+    scheduled_for: Optional[str]
 
 
 def estimate_recipients(campaign: Campaign) -> int:
@@ -91,31 +92,36 @@ def validate_send_or_raise(campaign: Campaign) -> None:
 
 
 def send_campaign(*, campaign_id: str | None) -> SendResult:
+    """
+    Start now, or arm a future schedule for the sweeper (tasks.start_due_campaigns).
+    No ETA task is queued: on the Redis broker those sit in worker memory and
+    come back after the visibility timeout. send_job_id is the kickoff task's
+    id either way; a scheduled campaign is only started once it has one.
+    """
+    task_id = str(uuid.uuid4())
+    with transaction.atomic():
         # Lock row to avoid double-send races under concurrent requests
         campaign = Campaign.objects.select_for_update().get(pk=campaign_id)
         validate_send_or_raise(campaign)
-        options = {}
-        if campaign.scheduled_at:
-            options["eta"] = campaign.scheduled_at
-        task = kickoff_campaign_send.apply_async(args=[str(campaign.id)], **options)
-        return {"task_id": str(task.id)}
+        campaign.send_job_id = task_id
+        start_at = local_time.kickoff_at(campaign)
+        if start_at and start_at > timezone.now():
+            campaign.status = CampaignStatus.Scheduled
+            campaign.save(update_fields=["status", "send_job_id"])
+            return {"task_id": task_id, "scheduled_for": campaign.scheduled_at.isoformat()}
+        # Sending under the lock, so the sweeper can't start it a second time
+        campaign.mark_sending()
+        campaign.save(update_fields=["status", "started_sending_at", "send_job_id"])
+    kickoff_campaign_send.apply_async(args=[str(campaign.id)], task_id=task_id)
+    return {"task_id": task_id, "scheduled_for": None}
 
 def send_test_email(*, campaign_id: str | None, test_email: Optional[str]) -> dict :
-    campaign = Campaign.objects.get(pk=campaign_id)
-    compiled, text_fallback = email_service.get_campaign_content(campaign)
-    html_for_recipient = compiled.replace("?r={recipient_id}", f"?r=")
+    """Queue the test on the transactional queue; the request returns before SMTP is touched."""
+    campaign = Campaign.objects.only("id").get(pk=campaign_id)
     if not test_email:
          test_email = "mahmoud.samy7729@gmail.com"
-    msg = EmailMultiAlternatives(
-        subject=campaign.subject_line,
-        body=text_fallback,
-        from_email=formataddr((campaign.from_name, campaign.from_email)),
-        to=[test_email],
-        reply_to = [campaign.reply_to] if getattr(campaign, "reply_to", None) else None
-    )
-    msg.attach_alternative(html_for_recipient, "text/html")
-    msg.send(fail_silently=False)
-    return {"sent_to": test_email}
+    task = deliver_test_email.delay(str(campaign.id), test_email)
+    return {"sent_to": test_email, "task_id": str(task.id)}
 
 def update_campaign(pk: str | None , validated_data: Dict[str, Any], viewset_get_queryset, serializer_class: Type[Serializer]) -> None:
     campaign = (
@@ -139,21 +145,37 @@ def update_campaign(pk: str | None , validated_data: Dict[str, Any], viewset_get
 def pause_campaign(campaign_id: str | None) -> dict:
     with transaction.atomic():
         c = Campaign.objects.select_for_update().get(pk=campaign_id)
-        if c.status == CampaignStatus.Completed:
-            return {"detail": "Already completed"}
+        if c.status != CampaignStatus.Sending:
+            raise exceptions.InvalidState(f"Only a sending campaign can be paused (status is {c.status}).")
         c.mark_paused()
         c.save(update_fields=["status"])
+    # in-flight chunks pick this up within CAMPAIGN_CONTROL_REFRESH_SECONDS
+    control.publish(campaign_id, CampaignStatus.Paused)
     return {"detail": "Paused"}
 
 
 def resume_campaign(campaign_id: str | None) -> dict:
     with transaction.atomic():
         c = Campaign.objects.select_for_update().get(pk=campaign_id)
-        if c.status == CampaignStatus.Completed:
-            return {"detail": "Already completed"}
+        if c.status != CampaignStatus.Paused:
+            raise exceptions.InvalidState(f"Only a paused campaign can be resumed (status is {c.status}).")
         c.mark_sending()
         c.save(update_fields=["status", "started_sending_at"])
+    control.publish(campaign_id, CampaignStatus.Sending)
     # kick dispatcher to continue
     dispatch_next_chunk.delay(campaign_id)
     return {"detail": "Resumed"}
-    
\ No newline at end of file
+
+
+def cancel_campaign(campaign_id: str | None) -> dict:
+    with transaction.atomic():
+        c = Campaign.objects.select_for_update().get(pk=campaign_id)
+        if c.status in {CampaignStatus.Completed, CampaignStatus.Canceled}:
+            return {"detail": f"Already {c.status}"}
+        c.mark_canceled()
+        c.save(update_fields=["status", "completed_at"])
+    # stop in-flight chunks, then drop whatever is still queued
+    control.publish(campaign_id, CampaignStatus.Canceled)
+    progress.close(str(campaign_id))
+    redis_service.cleanup(str(campaign_id))
+    return {"detail": "Canceled"}
@@ -0,0 +1,43 @@
+from __future__ import annotations
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+from campaign.models import Campaign
+from . import events, redis_service
+
+
+# campaign_id -> (state, fetched_at); per process, so each worker reads Redis
+# at most once per refresh interval per campaign.
+_cache: Dict[str, Tuple[Optional[str], float]] = {}
+
+
+def _refresh_interval() -> float:
+    return float(getattr(settings, "CAMPAIGN_CONTROL_REFRESH_SECONDS", 0.5))
+
+
+def publish(campaign_id: str, state: str) -> None:
+    redis_service.set_control_state(str(campaign_id), state)
+    _cache[str(campaign_id)] = (state, time.monotonic())
+    events.state(str(campaign_id), state)
+
+
+def current_state(campaign_id: str) -> Optional[str]:
+    """Campaign status as seen by send workers, at most one refresh interval stale."""
+    campaign_id = str(campaign_id)
+    now = time.monotonic()
+    hit = _cache.get(campaign_id)
+    if hit and now - hit[1] < _refresh_interval():
+        return hit[0]
+
+    state = redis_service.get_control_state(campaign_id)
+    if state is None:
+        # no mirror yet (e.g. a send started before this existed): seed it from the DB once
+        state = (Campaign.objects.filter(pk=campaign_id)
+                 .values_list("status", flat=True).first())
+        if state is not None:
+            redis_service.set_control_state(campaign_id, state)
+    _cache[campaign_id] = (state, now)
+    return state
+
@@ -2,56 +2,52 @@ from __future__ import annotations
 from typing import Callable, Dict, List
 from django.db import transaction
 from campaign.models import Campaign, CampaignStatus
-from .redis_service import (
-    redis_lock, lock_key, get_inflight, incr_inflight, pop_chunk,
-    queue_len, cleanup
-)
+from . import control, progress, send_window
+from .redis_service import dispatch_chunks, get_inflight, queue_len, retry_len, local_pending, cleanup, is_loading
 
 def svc_dispatch(
     campaign_id: str,
     *,
-    chunk_size: int,
-    max_inflight: int,
-    schedule_chunk: Callable[[str, List[str]], None],
+    schedule_chunk: Callable[[str, List[str], str, str], None],
 ) -> Dict:
-    try:
-        c = Campaign.objects.only("status").get(pk=campaign_id)
-    except Campaign.DoesNotExist:
-        return {"detail": "Campaign not found"}
-    if c.status != CampaignStatus.Sending:
-        return {"detail": f"Not dispatching; status={c.status}"}
+    """
+    Pop and schedule chunks until the campaign's in-flight window is full.
+    Capacity, pause/cancel, lane parking, leasing and the counters are all
+    handled in one Redis script (redis_service.dispatch_chunks); no lock, no DB read.
+    """
+    cfg = send_window.window_config()
+    defaults = {"default_inflight": cfg["initial_inflight"], "default_chunk": cfg["initial_chunk"]}
+    res = dispatch_chunks(campaign_id, state=CampaignStatus.Sending, **defaults)
+    if res["status"] == "unknown":
+        # no control mirror yet: seed it from the DB and try once more
+        control.current_state(campaign_id)
+        res = dispatch_chunks(campaign_id, state=CampaignStatus.Sending, **defaults)
+    if res["status"] != "ok":
+        return {"detail": f"Not dispatching; status={res['status']}"}
 
-    dispatched = 0
-    with redis_lock(lock_key(campaign_id)) as ok:
-        if not ok:
-            return {"detail": "Dispatch lock busy"}
+    for lane, lease_id, emails_chunk in res["chunks"]:
+        schedule_chunk(campaign_id, emails_chunk, lane, lease_id)
 
-        current = get_inflight(campaign_id)
-        need = max(0, max_inflight - current)
-
-        for _ in range(need):
-            emails_chunk = pop_chunk(campaign_id, chunk_size)
-            if not emails_chunk:
-                break
-            incr_inflight(campaign_id)
-            schedule_chunk(campaign_id, emails_chunk)
-            dispatched += 1
-
-    if dispatched == 0:
+    if not res["chunks"]:
+        if res["retry_in"]:
+            # only parked lanes or backed-off retries are left; come back when the first is ready
+            return {"detail": "Lanes parked or retries pending", "retry_in": res["retry_in"]}
         return maybe_finalize(campaign_id)
-    return {"dispatched": dispatched, "inflight_now": get_inflight(campaign_id)}
+    return {"dispatched": len(res["chunks"]), "inflight_now": res["inflight"]}
 
 def maybe_finalize(campaign_id: str) -> Dict:
-    from .redis_service import get_inflight
-    remaining = queue_len(campaign_id)
+    # local-time buckets still waiting for their hour count as remaining
+    remaining = queue_len(campaign_id) + retry_len(campaign_id) + local_pending(campaign_id)
     inflight = get_inflight(campaign_id)
-    if remaining == 0 and inflight == 0:
+    if remaining == 0 and inflight == 0 and not is_loading(campaign_id):
         with transaction.atomic():
             c = Campaign.objects.select_for_update().get(pk=campaign_id)
             if c.status == CampaignStatus.Sending:
                 c.status = CampaignStatus.Completed
                 c.completed_at = c.completed_at or c._meta.get_field("completed_at").pre_save(c, add=True)
                 c.save(update_fields=["status", "completed_at"])
+        progress.close(campaign_id)
         cleanup(campaign_id)
+        control.publish(campaign_id, CampaignStatus.Completed)
         return {"status": "completed"}
     return {"status": "not-done", "remaining": remaining, "inflight": inflight}
\ No newline at end of file
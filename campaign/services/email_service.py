@@ -4,13 +4,20 @@ from django.db.models import F, QuerySet
 from django.utils import timezone
 from django.utils.html import strip_tags
 from email.utils import formataddr
-from typing import Iterable
+from typing import Iterable, Iterator
+import logging
+import re
 
 
 from campaign.models import Campaign, CampaignStatus, ProviderStatus
-from audience.models import Contact
+from audience.models import Contact, Status
+from audience.services import suppression
 from campaign.services import exceptions
+from campaign.services import smtp_pool
+from campaign.services.renderer import CampaignTemplate, split_template
+from smtplib import SMTPServerDisconnected, SMTPResponseException, SMTPRecipientsRefused
 
+logger = logging.getLogger(__name__)
 
 def recipient_qs_for(campaign: Campaign) -> QuerySet[Contact]:
     qs = (Contact.objects
@@ -22,13 +29,32 @@ def recipient_qs_for(campaign: Campaign) -> QuerySet[Contact]:
     return qs
 
 
-def distinct_emails(qs: QuerySet[Contact]) -> list[str]:
-    emails = list(qs.annotate(e=Lower("email_address"))
-             .values_list("e", flat=True)
-             .distinct())
-    if not emails:
-        raise exceptions.ZeroRecipients("No valid recipient emails found")
-    return emails
+def iter_recipients(qs: QuerySet[Contact], batch_size: int = 1000, extra: str | None = None) -> Iterator[list[tuple]]:
+    """
+    Yield (contact_id, lower-cased email) pairs, one per distinct address, in
+    batches of at most batch_size rows; with `extra` (an annotation on qs)
+    each pair gets that column as a third item.
+    Keyset-paginates on the lowered address, so each page is a bounded index
+    range scan and only one page is held in memory. Duplicate addresses sort
+    next to each other and are dropped on the fly; a page boundary inside a
+    run of duplicates is handled by resuming strictly after the last address.
+    """
+    columns = ("id", "e", extra) if extra else ("id", "e")
+    base = (qs.annotate(e=Lower("email_address"))
+              .order_by("e", "id")
+              .values_list(*columns))
+    last = None
+    while True:
+        page = base if last is None else base.filter(e__gt=last)
+        rows = list(page[:batch_size])
+        if not rows:
+            return
+        batch = []
+        for contact_id, email, *rest in rows:
+            if email != last:
+                batch.append((str(contact_id), email, *rest))
+                last = email
+        yield batch
 
 
 def get_campaign_content(campaign: Campaign) -> tuple[str, str]:
@@ -36,27 +62,127 @@ def get_campaign_content(campaign: Campaign) -> tuple[str, str]:
     text_fallback = getattr(campaign, "content_text", "") or strip_tags(compiled)
     return compiled, text_fallback
 
-def map_contacts_by_email(emails: list[str]) -> dict[str, str]:
-    contacts = Contact.objects.filter(email_address__in=emails).values("id", "email_address")
-    return {c["email_address"].lower(): str(c["id"]) for c in contacts}
+def get_campaign_template(campaign: Campaign) -> CampaignTemplate:
+    compiled, text_fallback = get_campaign_content(campaign)
+    # campaigns compiled before compiled_segments existed are split on the fly
+    segments = campaign.compiled_segments or split_template(compiled)
+    return CampaignTemplate(segments, campaign.to_name_format, text_fallback)
 
-def build_email_message(campaign: Campaign, email: str, contact_id: str, html: str, text_fallback: str, conn) -> EmailMultiAlternatives:
-    html_for_recipient = html.replace("?r={recipient_id}", f"?r={contact_id}")
+def merge_fields_for(contact_ids: Iterable[str]) -> dict[str, dict]:
+    """One query per chunk, and only for templates that use merge tags."""
+    rows = Contact.objects.filter(id__in=list(contact_ids)).values_list("id", "merge_fields")
+    return {str(cid): fields or {} for cid, fields in rows}
+
+def build_email_message(campaign: Campaign, email: str, contact_id: str, template: CampaignTemplate,
+                        conn, merge_fields: dict | None = None) -> EmailMultiAlternatives:
+    html_for_recipient = template.html_for(contact_id, merge_fields)
+    to_name = template.to_name_for(merge_fields)
     msg = EmailMultiAlternatives(
         subject=campaign.subject_line,
-        body=text_fallback,
+        body=template.text_for(contact_id, merge_fields),
         from_email=formataddr((campaign.from_name, campaign.from_email)),
-        to=[email],
+        to=[formataddr((to_name, email)) if to_name else email],
         connection=conn,
         headers=({"Reply-To": campaign.reply_to} if campaign.reply_to else None),
     )
     msg.attach_alternative(html_for_recipient, "text/html")
     return msg
 
+def build_test_message(campaign: Campaign, test_email: str) -> EmailMultiAlternatives:
+    """The campaign as a test recipient sees it: no merge fields, no tracking id."""
+    template = get_campaign_template(campaign)
+    msg = EmailMultiAlternatives(
+        subject=campaign.subject_line,
+        body=template.text_for(""),
+        from_email=formataddr((campaign.from_name, campaign.from_email)),
+        to=[test_email],
+        reply_to=[campaign.reply_to] if getattr(campaign, "reply_to", None) else None,
+    )
+    msg.attach_alternative(template.html_for(""), "text/html")
+    return msg
+
+def smtp_code(exc: Exception) -> int | None:
+    """The relay's reply code behind a send failure, if it gave one."""
+    if isinstance(exc, SMTPResponseException):
+        return exc.smtp_code
+    if isinstance(exc, SMTPRecipientsRefused) and exc.recipients:
+        return min(code for code, _ in exc.recipients.values())
+    return None
+
+# How a failed send is handled, see classify()
+TRANSIENT = "transient"   # 4xx or a dropped session: retry after a backoff
+BOUNCE = "bounce"         # the mailbox is bad: clean the contact
+PERMANENT = "permanent"   # any other 5xx (policy, content, relay): give up on this recipient
+
+_ENHANCED = re.compile(r"\b([245])\.(\d{1,3})\.(\d{1,3})\b")
+_BOUNCE_CODES = {550, 551, 553}
+
+def classify(code: int | None, message: str = "") -> str:
+    """
+    Sort a failed send into TRANSIENT, BOUNCE or PERMANENT. No reply code
+    (connection trouble) counts as transient. A 5xx is a bounce only when it is
+    about the mailbox (RFC 3463 5.1.x addressing / 5.2.1 disabled, or a bare
+    550/551/553); auth or policy rejections must not clean the whole audience.
+    """
+    if code is None or code < 500:
+        return TRANSIENT
+    m = _ENHANCED.search(message or "")
+    if m:
+        subject, detail = m.group(2), m.group(3)
+        return BOUNCE if subject == "1" or (subject, detail) == ("2", "1") else PERMANENT
+    return BOUNCE if code in _BOUNCE_CODES else PERMANENT
+
+def is_throttling(code: int | None, message: str = "") -> bool:
+    """
+    421 or an RFC 3463 4.7.x reply: the provider is throttling us, so its
+    lane (or domain) should back off. Other 4xx (452 4.2.2 mailbox full,
+    450 greylisting) are about one recipient and only retry that one.
+    """
+    if code == 421:
+        return True
+    if code is None or not 400 <= code < 500:
+        return False
+    m = _ENHANCED.search(message or "")
+    return bool(m) and m.group(1) == "4" and m.group(2) == "7"
+
+def mark_bounced(contact_ids: Iterable[str]) -> int:
+    """Hard-bounced recipients are cleaned in one UPDATE per chunk and globally suppressed."""
+    ids = list(contact_ids)
+    if not ids:
+        return 0
+    now = timezone.now()
+    cleaned = (Contact.objects.filter(id__in=ids).exclude(status=Status.CLEANED)
+               .update(status=Status.CLEANED, last_changed=now, updated_at=now))
+    suppression.suppress_bounced(ids)
+    return cleaned
+
+def _deferral_code(exc: Exception) -> int | None:
+    """The 4xx reply code if the relay deferred the message, else None."""
+    code = smtp_code(exc)
+    return code if code is not None and 400 <= code < 500 else None
+
 def safe_send(msg, email: str) -> bool:
+    """
+    Send through the pooled connection. Returns True once the relay accepted
+    the message; raises exceptions.Deferred when the remote side asks us to
+    slow down and exceptions.SendFailed on a hard failure.
+    """
+    pool = smtp_pool.get_pool()
     try:
+        # reopens a session the pool recycled after the previous message (no-op if open)
+        msg.connection.open()
         msg.send(fail_silently=False)
+        pool.note_sent(msg.connection)
         return True
+    except SMTPServerDisconnected as e:
+        # the relay dropped the pooled session; the next message reopens it
+        pool.discard_broken(msg.connection)
+        logger.info("send to %s failed: %s", email, e)
+        raise exceptions.SendFailed(None, str(e)) from e
     except Exception as e:
-        print(f"{email}: {e}")
-        return False
+        pool.note_sent(msg.connection, ok=False)
+        logger.info("send to %s failed: %s", email, e)
+        code = _deferral_code(e)
+        if code is not None:
+            raise exceptions.Deferred(code, str(e), throttled=is_throttling(code, str(e))) from e
+        raise exceptions.SendFailed(smtp_code(e), str(e)) from e
@@ -0,0 +1,88 @@
+from __future__ import annotations
+import json
+import logging
+from typing import Dict, List
+
+import redis.asyncio as aioredis
+from django.conf import settings
+
+from .redis_service import conn
+
+logger = logging.getLogger(__name__)
+
+
+# Dashboards follow sends over server-sent events instead of polling the
+# campaign list. Producers publish small deltas on campaign:<id>:events; each
+# SSE connection holds one pub/sub subscription for the campaigns it shows.
+#   progress  {"sent", "failed", "deferred"}   per finished chunk
+#   clicks    {"clicks", "unique"}             per recorded click
+#   state     {"state"}                        on start/pause/resume/cancel/complete
+def channel(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:events"
+
+
+def _publish(campaign_id: str, kind: str, data: Dict) -> None:
+    # fire-and-forget: a dashboard missing one delta must never fail a send
+    try:
+        conn().publish(channel(campaign_id), json.dumps({"type": kind, "campaign": str(campaign_id), **data}))
+    except Exception as e:
+        logger.warning("event publish failed: %s", e)
+
+
+def progress(campaign_id: str, *, sent: int, failed: int, deferred: int) -> None:
+    if sent or failed or deferred:
+        _publish(campaign_id, "progress", {"sent": sent, "failed": failed, "deferred": deferred})
+
+
+def clicks(campaign_id: str, *, unique: bool) -> None:
+    _publish(campaign_id, "clicks", {"clicks": 1, "unique": int(unique)})
+
+
+def state(campaign_id: str, value: str) -> None:
+    _publish(campaign_id, "state", {"state": value})
+
+
+# ------------ Consumer (ASGI) ------------
+def _redis_url() -> str:
+    return getattr(settings, "EVENTS_REDIS_URL", None) or settings.CACHES["default"]["LOCATION"]
+
+
+def heartbeat_seconds() -> float:
+    return float(getattr(settings, "SSE_HEARTBEAT_SECONDS", 15))
+
+
+def sse(kind: str, data: Dict) -> str:
+    return f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventFeed:
+    """
+    async with EventFeed(ids) as feed: ... await feed.next()
+    One Redis pub/sub connection per consumer; subscribed on enter, so a
+    snapshot read afterwards cannot miss a delta.
+    """
+
+    def __init__(self, campaign_ids: List[str]) -> None:
+        self.channels = [channel(cid) for cid in campaign_ids]
+        self.client = None
+        self.pubsub = None
+
+    async def __aenter__(self) -> "EventFeed":
+        self.client = aioredis.from_url(_redis_url())
+        self.pubsub = self.client.pubsub()
+        await self.pubsub.subscribe(*self.channels)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+    async def next(self) -> Dict | None:
+        """The next event, or None once a heartbeat interval passed without one."""
+        msg = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=heartbeat_seconds())
+        if msg is None:
+            return None
+        try:
+            return json.loads(msg["data"])
+        except (TypeError, ValueError):
+            return None
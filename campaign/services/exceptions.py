@@ -5,4 +5,19 @@ class InvalidState(DomainError):
     """Invalid state transition (409)."""
 
 class ZeroRecipients(DomainError):
-    """No recipients to send to (400)."""
\ No newline at end of file
+    """No recipients to send to (400)."""
+
+class Deferred(DomainError):
+    """Remote MTA answered with a transient 4xx; back off and retry later."""
+
+    def __init__(self, code: int, message: str = "", throttled: bool = False) -> None:
+        super().__init__(f"{code} {message}".strip())
+        self.code = code
+        self.throttled = throttled  # the provider wants us to slow down, not just this recipient to wait
+
+class SendFailed(DomainError):
+    """The message was rejected for good (5xx) or the session broke mid-send."""
+
+    def __init__(self, code: int | None = None, message: str = "") -> None:
+        super().__init__(f"{code or ''} {message}".strip())
+        self.code = code
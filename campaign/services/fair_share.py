@@ -0,0 +1,137 @@
+from __future__ import annotations
+import time
+from math import ceil, floor
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .lanes import all_lanes
+from .redis_service import conn, inflight_key, lane_key, retry_key, share_key, window_key
+
+
+# Every campaign pumps its own dispatch chain, so left alone ten concurrent
+# sends would take ten times the workers one does. rebalance() splits one
+# cluster-wide budget of chunks in flight across the sending campaigns by
+# weighted max-min fairness (water-filling): each campaign first gets its
+# floor, then the rest is poured out in proportion to priority, and whatever a
+# campaign cannot use (ceiling, AIMD window, no queued work) flows on to the
+# others. The result lands in campaign:<id>:share, which the dispatch script
+# applies on top of the AIMD window. A campaign may carry its own floor and
+# ceiling (Campaign.share_floor / share_ceiling); SEND_SCHEDULER's apply otherwise.
+_DEFAULTS = {"cluster_inflight": 48, "floor": 1, "ceiling": 16, "interval": 5}
+
+
+def scheduler_config() -> Dict[str, float]:
+    return {**_DEFAULTS, **getattr(settings, "SEND_SCHEDULER", {})}
+
+
+# campaign id -> (floor, ceiling); None for either means the default
+Limits = Dict[str, Tuple[Optional[int], Optional[int]]]
+
+
+def allocate(budget: int, demands: Dict[str, Tuple[float, int]], *,
+             floor_share: int, ceiling: int, limits: Limits | None = None) -> Dict[str, int]:
+    """
+    demands: campaign id -> (weight, chunks it could use). Returns whole
+    shares that never exceed min(demand, ceiling) and sum to at most budget.
+    limits overrides floor_share / ceiling per campaign.
+    """
+    limits = limits or {}
+    floors: Dict[str, int] = {}
+    caps: Dict[str, int] = {}
+    for cid, (_, demand) in demands.items():
+        lo, hi = limits.get(cid, (None, None))
+        floors[cid] = floor_share if lo is None else lo
+        caps[cid] = min(ceiling if hi is None else hi, demand)
+    weight = {cid: w for cid, (w, _) in demands.items()}
+    share: Dict[str, float] = {cid: 0 for cid in demands}
+
+    # floors first, heaviest campaigns first if even those don't fit
+    left = budget
+    for cid in sorted(demands, key=lambda c: -weight[c]):
+        give = min(floors[cid], caps[cid], left)
+        share[cid] = give
+        left -= give
+
+    # water-filling over whoever is still below its cap
+    open_ = [cid for cid in demands if share[cid] < caps[cid]]
+    while left > 1e-9 and open_:
+        total = sum(weight[cid] for cid in open_)
+        capped = [cid for cid in open_ if share[cid] + left * weight[cid] / total >= caps[cid]]
+        if not capped:
+            for cid in open_:
+                share[cid] += left * weight[cid] / total
+            left = 0
+            break
+        for cid in capped:
+            left -= caps[cid] - share[cid]
+            share[cid] = caps[cid]
+        open_ = [cid for cid in open_ if cid not in capped]
+
+    # whole chunks: round down, then hand out what's left by largest remainder
+    result = {cid: int(floor(s + 1e-9)) for cid, s in share.items()}
+    spare = int(budget - sum(result.values()))
+    by_remainder = sorted(demands, key=lambda c: (-(share[c] - result[c]), -weight[c]))
+    for cid in by_remainder:
+        if spare <= 0:
+            break
+        if share[cid] - result[cid] > 1e-9 and result[cid] < caps[cid]:
+            result[cid] += 1
+            spare -= 1
+    return result
+
+
+def _demands(campaigns: List[Tuple[str, int]], default_window: float) -> Tuple[Dict[str, Tuple[float, int]], Dict[str, int]]:
+    """One pipeline: each campaign's AIMD window, chunks in flight, due retries and queued records."""
+    lanes = all_lanes()
+    now_ms = int(time.time() * 1000)
+    p = conn().pipeline(transaction=False)
+    for cid, _ in campaigns:
+        p.hget(window_key(cid), "inflight")
+        p.get(inflight_key(cid))
+        # due retries are queued work too: the next dispatch moves them onto a lane
+        p.zcount(retry_key(cid), "-inf", now_ms)
+        for lane in lanes:
+            p.llen(lane_key(cid, lane))
+    raw = p.execute()
+
+    demands, inflight = {}, {}
+    step = 3 + len(lanes)
+    for n, (cid, weight) in enumerate(campaigns):
+        window, busy, *queued = raw[n * step:(n + 1) * step]
+        inflight[cid] = int(busy or 0)
+        if any(queued):
+            demand = int(ceil(float(window))) if window else int(default_window)
+        else:
+            # nothing queued: it can only use what it already has out
+            demand = inflight[cid]
+        demands[cid] = (weight, demand)
+    return demands, inflight
+
+
+def rebalance(campaigns: List[Tuple[str, int]], default_window: float,
+              limits: Limits | None = None) -> Dict[str, Dict[str, int]]:
+    """
+    campaigns: (campaign id, priority weight) for every sending campaign;
+    limits: their own (floor, ceiling) where set. Writes each campaign's share
+    and returns {id: {"share", "inflight"}} so the caller can wake the chains
+    that just got room.
+    """
+    cfg = scheduler_config()
+    if not campaigns:
+        return {}
+    demands, inflight = _demands(campaigns, default_window)
+    shares = allocate(int(cfg["cluster_inflight"]), demands,
+                      floor_share=int(cfg["floor"]), ceiling=int(cfg["ceiling"]), limits=limits)
+    # a share outlives a few missed rounds, then dispatch falls back to the AIMD window alone
+    ttl = max(1, int(cfg["interval"] * 3))
+    p = conn().pipeline(transaction=False)
+    for cid, share in shares.items():
+        p.set(share_key(cid), share, ex=ttl)
+    p.execute()
+    return {cid: {"share": shares[cid], "inflight": inflight[cid]} for cid in shares}
+
+
+def current_share(campaign_id: str) -> int | None:
+    raw = conn().get(share_key(campaign_id))
+    return int(raw) if raw is not None else None
@@ -0,0 +1,45 @@
+from __future__ import annotations
+from typing import Dict, List
+
+from django.conf import settings
+
+
+DEFAULT_LANE = "other"
+
+_LANE_DEFAULTS = {
+    "max_inflight": 3,     # chunks of this lane in flight per campaign
+    "rate": 0.0,           # msgs/sec across the cluster, 0 = unlimited
+    "backoff_base": 30,    # seconds parked after the first throttling reply
+    "backoff_max": 900,    # cap for the doubling backoff
+}
+
+
+def _lanes() -> Dict[str, dict]:
+    return getattr(settings, "SEND_LANES", {})
+
+
+def all_lanes() -> List[str]:
+    """Every lane name; the catch-all lane is always last."""
+    return [name for name in _lanes() if name != DEFAULT_LANE] + [DEFAULT_LANE]
+
+
+def lane_config(lane: str) -> dict:
+    cfg = {**_LANE_DEFAULTS, **getattr(settings, "SEND_LANE_DEFAULTS", {})}
+    cfg.update(_lanes().get(lane, {}))
+    return cfg
+
+
+_domain_index: Dict[str, str] = {}
+
+
+def domain_of(email: str) -> str:
+    return email.rpartition("@")[2].lower()
+
+
+def lane_for(email: str) -> str:
+    """Map a recipient address to its provider lane by domain."""
+    if not _domain_index:
+        for name, cfg in _lanes().items():
+            for domain in cfg.get("domains", []):
+                _domain_index[domain.lower()] = name
+    return _domain_index.get(domain_of(email), DEFAULT_LANE)
@@ -0,0 +1,66 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db.models import Count
+from django.utils import timezone
+
+from campaign.models import Delivery, DeliveryStatus
+
+
+# (contact_id, DeliveryStatus, smtp reply code or None)
+Outcome = Tuple[str, str, Optional[int]]
+
+_BATCH = 1000
+
+
+def mark_queued(campaign_id: str, contact_ids: Iterable[str]) -> None:
+    """One INSERT per kickoff batch; rows that already exist (a resumed send) are left alone."""
+    now = timezone.now()
+    rows = [Delivery(campaign_id=campaign_id, contact_id=cid, updated_at=now) for cid in contact_ids]
+    Delivery.objects.bulk_create(rows, batch_size=_BATCH, ignore_conflicts=True)
+
+
+def record(campaign_id: str, outcomes: List[Outcome]) -> None:
+    """Upsert a chunk's outcomes in a single statement."""
+    if not outcomes:
+        return
+    now = timezone.now()
+    rows = [
+        Delivery(campaign_id=campaign_id, contact_id=cid, status=status, smtp_code=code, updated_at=now)
+        for cid, status, code in outcomes
+    ]
+    Delivery.objects.bulk_create(
+        rows,
+        batch_size=_BATCH,
+        update_conflicts=True,
+        unique_fields=["campaign", "contact"],
+        update_fields=["status", "smtp_code", "updated_at"],
+    )
+
+
+def drop_sent(campaign_id: str, recipients: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Filter (contact_id, email) pairs down to those the ledger has not seen sent."""
+    if not recipients:
+        return recipients
+    sent = set(
+        str(cid) for cid in Delivery.objects
+        .filter(campaign_id=campaign_id, status=DeliveryStatus.Sent,
+                contact_id__in=[cid for cid, _ in recipients])
+        .values_list("contact_id", flat=True)
+    )
+    if not sent:
+        return recipients
+    return [(cid, email) for cid, email in recipients if cid not in sent]
+
+
+def status_counts(campaign_id: str) -> Dict[str, int]:
+    counts = {s.value: 0 for s in DeliveryStatus}
+    rows = (Delivery.objects.filter(campaign_id=campaign_id)
+            .values("status").annotate(n=Count("pk")).order_by())
+    for row in rows:
+        counts[row["status"]] = row["n"]
+    return counts
+
+
+def sent_count(campaign_id: str) -> int:
+    return Delivery.objects.filter(campaign_id=campaign_id, status=DeliveryStatus.Sent).count()
@@ -0,0 +1,117 @@
+from __future__ import annotations
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.db.models import Case, Count, IntegerField, QuerySet, Value, When
+from django.db.models.fields.json import KT
+from django.utils import timezone
+
+from campaign.models import Campaign
+
+
+# "9am local" sends (Campaign.per_recipient_local_time). The wall-clock time
+# of scheduled_at in the campaign's timezone_str is the send time in every
+# recipient's own zone (Contact.location["tz"]; missing or unknown zones use the
+# campaign's). Recipients are grouped by the UTC offset their zone has at that
+# time: one GROUP BY over the audience's zones builds the buckets, and the
+# database tags each row with its bucket while kickoff streams the audience.
+# Each bucket waits in its own Redis lists (redis_service.stage_recipients)
+# until the release sweep (tasks.release_local_time_buckets) moves it onto
+# the lane queues.
+#
+# Zones run from UTC-12 to UTC+14, so a local-time send is kicked off up to
+# KICKOFF_LEAD before scheduled_at to be loaded before its first bucket is due.
+KICKOFF_LEAD = timedelta(hours=26)
+
+
+@lru_cache(maxsize=1024)
+def _zone(name) -> ZoneInfo | None:
+    if not name or not isinstance(name, str):
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def is_valid_zone(name: str) -> bool:
+    return _zone(name) is not None
+
+
+def _offset_minutes(zone: ZoneInfo, wall: datetime) -> int:
+    return int(wall.replace(tzinfo=zone).utcoffset().total_seconds() // 60)
+
+
+def kickoff_at(campaign: Campaign) -> datetime | None:
+    """When the send has to start: scheduled_at, or KICKOFF_LEAD ahead of it for local-time sends."""
+    if campaign.scheduled_at is None:
+        return None
+    if campaign.per_recipient_local_time:
+        return campaign.scheduled_at - KICKOFF_LEAD
+    return campaign.scheduled_at
+
+
+@dataclass
+class Plan:
+    wall: datetime                    # naive local send time
+    default_offset: int               # minutes; the campaign's own zone
+    zones: Dict[int, List[str]] = field(default_factory=dict)   # offset -> zone names
+    sizes: Dict[int, int] = field(default_factory=dict)         # offset -> contacts
+
+    def release_ms(self, offset: int) -> int:
+        utc = (self.wall - timedelta(minutes=offset)).replace(tzinfo=dt_timezone.utc)
+        return int(utc.timestamp() * 1000)
+
+    def is_due(self, offset: int) -> bool:
+        return self.release_ms(offset) <= int(time.time() * 1000)
+
+    def bucket_expression(self) -> Case:
+        """Per-row offset; zones in the campaign's own offset fall through to the default."""
+        whens = [When(location__tz__in=names, then=Value(offset))
+                 for offset, names in self.zones.items() if offset != self.default_offset]
+        return Case(*whens, default=Value(self.default_offset), output_field=IntegerField())
+
+    def annotate(self, qs: QuerySet) -> QuerySet:
+        return qs.annotate(bucket=self.bucket_expression())
+
+    def summary(self) -> Dict[str, Dict]:
+        return {
+            f"{offset:+d}": {
+                "recipients": n,
+                "release_at": datetime.fromtimestamp(self.release_ms(offset) / 1000, dt_timezone.utc).isoformat(),
+            }
+            for offset, n in sorted(self.sizes.items(), reverse=True)
+        }
+
+
+def plan_for(campaign: Campaign, qs: QuerySet) -> Plan:
+    """One aggregated query over the recipients' zones -> buckets by UTC offset."""
+    home = _zone(campaign.timezone_str) or ZoneInfo("UTC")
+    wall = (campaign.scheduled_at or timezone.now()).astimezone(home).replace(tzinfo=None)
+    plan = Plan(wall=wall, default_offset=_offset_minutes(home, wall))
+
+    zones: Dict[int, List[str]] = defaultdict(list)
+    sizes: Dict[int, int] = defaultdict(int)
+    rows = (qs.annotate(recipient_tz=KT("location__tz"))
+              .values("recipient_tz").annotate(n=Count("id")).order_by())
+    for row in rows:
+        zone = _zone(row["recipient_tz"])
+        offset = _offset_minutes(zone, wall) if zone else plan.default_offset
+        if zone:
+            zones[offset].append(row["recipient_tz"])
+        sizes[offset] += row["n"]
+    plan.zones, plan.sizes = dict(zones), dict(sizes)
+    return plan
+
+
+def split(rows: Iterable[Tuple[str, str, int]]) -> Dict[int, List[Tuple[str, str]]]:
+    """(contact_id, email, bucket) rows -> {bucket: [(contact_id, email)]}"""
+    by_bucket: Dict[int, List[Tuple[str, str]]] = defaultdict(list)
+    for contact_id, email, bucket in rows:
+        by_bucket[bucket].append((contact_id, email))
+    return by_bucket
@@ -0,0 +1,107 @@
+from __future__ import annotations
+import os
+from typing import Iterable, Tuple
+
+from django.conf import settings
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+
+# Prometheus metrics for the send, dispatch and click pipelines.
+# Counters and histograms are updated in whichever process does the work. With
+# PROMETHEUS_MULTIPROC_DIR set (gunicorn/uvicorn workers, Celery prefork
+# children) every process writes its own files there and the exporter merges
+# them at scrape time; each container gets its own directory, so pids never
+# collide. Queue depth and in-flight chunks are read from Redis at scrape time
+# by the web process only, so every worker doesn't report the same series.
+#
+# "domain" is the recipient lane (SEND_LANES), which keeps the label bounded.
+# Counters carry no campaign label: every campaign would leave its series in
+# the registry (and the multiprocess files) for good. Per-campaign numbers are
+# the queue gauges below, which only cover campaigns that are still sending.
+SMTP_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+CHUNK_BUCKETS = (.1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+REDIRECT_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1)
+LAG_BUCKETS = (.1, .5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+
+messages = Counter(
+    "campaign_messages_total", "Recipients handled by send chunks, by outcome (sent/failed/deferred).",
+    ["domain", "outcome"],
+)
+smtp_seconds = Histogram(
+    "campaign_smtp_send_seconds", "One SMTP transaction (MAIL..DATA) per message.",
+    ["engine"], buckets=SMTP_BUCKETS,
+)
+chunk_seconds = Histogram(
+    "campaign_chunk_seconds", "Wall time of send_campaign_chunk.",
+    ["domain"], buckets=CHUNK_BUCKETS,
+)
+dispatched = Counter(
+    "campaign_dispatched_chunks_total", "Chunks handed to the bulk queue by dispatch_next_chunk.",
+    ["domain"],
+)
+click_redirect_seconds = Histogram(
+    "click_redirect_seconds", "Time to answer a tracked link with its 302.",
+    buckets=REDIRECT_BUCKETS,
+)
+click_ingest_lag = Histogram(
+    "click_ingest_lag_seconds", "From the redirect to record_click_event picking the click up.",
+    buckets=LAG_BUCKETS,
+)
+
+
+def record_chunk(lane: str, *, sent: int, failed: int, deferred: int) -> None:
+    for outcome, n in (("sent", sent), ("failed", failed), ("deferred", deferred)):
+        if n:
+            messages.labels(lane, outcome).inc(n)
+
+
+class SendQueueCollector:
+    """campaign_queue_depth / campaign_retrying / campaign_inflight_chunks for every sending campaign."""
+
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        from campaign.models import Campaign, CampaignStatus
+        from .redis_service import get_inflight, queue_len, retry_len
+
+        depth = GaugeMetricFamily("campaign_queue_depth", "Recipients waiting on the campaign's lanes.", labels=["campaign"])
+        retrying = GaugeMetricFamily("campaign_retrying", "Recipients waiting in the retry queue.", labels=["campaign"])
+        inflight = GaugeMetricFamily("campaign_inflight_chunks", "Chunks leased and not yet acked.", labels=["campaign"])
+        active = Campaign.objects.filter(status__in=[CampaignStatus.Sending, CampaignStatus.Paused])
+        for cid in active.values_list("id", flat=True):
+            cid = str(cid)
+            depth.add_metric([cid], queue_len(cid))
+            retrying.add_metric([cid], retry_len(cid))
+            inflight.add_metric([cid], get_inflight(cid))
+        yield from (depth, retrying, inflight)
+
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+class _ProcessMetrics:
+    # serves the process-global registry from a fresh one, next to the Redis gauges
+    def collect(self):
+        return REGISTRY.collect()
+
+
+def registry(*, with_queues: bool) -> CollectorRegistry:
+    """What an exporter serves: this process (or the merged multiprocess files), optionally plus the Redis gauges."""
+    reg = CollectorRegistry()
+    if multiprocess_enabled():
+        multiprocess.MultiProcessCollector(reg)
+    else:
+        reg.register(_ProcessMetrics())
+    if with_queues:
+        reg.register(SendQueueCollector())
+    return reg
+
+
+def render() -> Tuple[bytes, str]:
+    return generate_latest(registry(with_queues=True)), CONTENT_TYPE_LATEST
+
+
+def worker_port() -> int:
+    return int(getattr(settings, "WORKER_METRICS_PORT", 0))
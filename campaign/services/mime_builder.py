@@ -0,0 +1,307 @@
+"""
+Per-campaign pre-encoded MIME skeleton.
+
+Everything that is identical for every recipient (Subject, From, Reply-To,
+content headers, the static parts of the text and HTML bodies) is encoded once
+by the stdlib `email` package. A recipient's message is then the skeleton bytes
+joined with their freshly folded To/Date/Message-ID header lines and encoded
+slot values. The output is byte-identical to flattening the EmailMultiAlternatives
+built by email_service.build_email_message with the same Date, Message-ID and
+boundary. Anything that would change the encoding stdlib picks (long lines,
+non-ASCII in a 7bit part, ...) falls back to that regular message.
+"""
+from __future__ import annotations
+import random
+import sys
+from email import policy as email_policy
+from email.utils import formataddr, formatdate, make_msgid
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail.message import (
+    RFC5322_EMAIL_LINE_LENGTH_LIMIT, forbid_multi_line_headers, sanitize_address,
+)
+from django.core.mail.utils import DNS_NAME
+
+from campaign.models import Campaign
+from .renderer import CampaignTemplate, RECIPIENT_ID, merge_context
+
+_TO_SENTINEL = "to@skeleton.invalid"
+_DATE_SENTINEL = "\x1aDATE\x1a"
+_MID_SENTINEL = "\x1aMID\x1a"
+_HEADER_SLOTS = {"To": _TO_SENTINEL, "Date": _DATE_SENTINEL, "Message-ID": _MID_SENTINEL}
+
+_FOLD_POLICY = email_policy.compat32.clone(linesep="\r\n")
+
+
+def _slot_sentinel(part: str, name: str) -> str:
+    return f"\x1a{part}:{name}\x1a"
+
+
+def _make_boundary() -> str:
+    # same shape as email.generator's boundaries
+    width = len(repr(sys.maxsize - 1))
+    return "=" * 15 + ("%0*d" % (width, random.randrange(sys.maxsize))) + "=="
+
+
+def fold_header(name: str, value: str, encoding: str) -> bytes:
+    """The exact bytes BytesGenerator writes for `name: value` on a Django message."""
+    name, value = forbid_multi_line_headers(name, value, encoding)
+    return _FOLD_POLICY.fold_binary(name, value)
+
+
+class FastMessage:
+    """
+    Drop-in for the EmailMultiAlternatives that safe_send expects: has
+    `.connection` and `.send()`. Goes straight to smtplib with the pre-built bytes
+    when the backend is an open SMTP backend, otherwise sends the regular message.
+    """
+
+    def __init__(self, data: bytes, from_addr: str, to_addr: str, connection, fallback) -> None:
+        self.data = data
+        self.from_addr = from_addr
+        self.to_addr = to_addr
+        self.connection = connection
+        self._fallback = fallback
+
+    def message(self) -> EmailMultiAlternatives:
+        return self._fallback()
+
+    def send(self, fail_silently: bool = False) -> int:
+        backend = self.connection
+        smtp = getattr(backend, "connection", None)
+        lock = getattr(backend, "_lock", None)
+        if smtp is None or lock is None:
+            msg = self._fallback()
+            return msg.send(fail_silently=fail_silently)
+        with lock:
+            try:
+                smtp.sendmail(self.from_addr, [self.to_addr], self.data)
+            except Exception:
+                if not fail_silently:
+                    raise
+                return 0
+        return 1
+
+
+class PreparedCampaign:
+    def __init__(self, campaign: Campaign, template: CampaignTemplate) -> None:
+        self.campaign = campaign
+        self.template = template
+        self.encoding = settings.DEFAULT_CHARSET
+        self.boundary = _make_boundary()
+        self.from_addr = sanitize_address(formataddr((campaign.from_name, campaign.from_email)), self.encoding)
+        self.reply_to = campaign.reply_to or None
+        self.segments: List[object] = []
+        # per part: lines carrying slots -> (static byte length, slot names)
+        self.slot_lines: Dict[str, List[Tuple[int, List[str]]]] = {}
+        self.seven_bit: Dict[str, bool] = {}
+        self.enabled = self._build()
+
+    # ------------ Build once ------------
+    def _message(self, to: str, html: str, text: str, date: str, message_id: str) -> EmailMultiAlternatives:
+        headers = {"Date": date, "Message-ID": message_id}
+        if self.reply_to:
+            headers = {"Reply-To": self.reply_to, **headers}
+        msg = EmailMultiAlternatives(
+            subject=self.campaign.subject_line,
+            body=text,
+            from_email=formataddr((self.campaign.from_name, self.campaign.from_email)),
+            to=[to],
+            headers=headers,
+        )
+        msg.attach_alternative(html, "text/html")
+        return msg
+
+    def _flatten(self, msg: EmailMultiAlternatives) -> bytes:
+        mime = msg.message()
+        mime.set_boundary(self.boundary)
+        return mime.as_bytes(linesep="\r\n")
+
+    def _sentinel_bodies(self) -> Dict[str, str]:
+        bodies = {}
+        for part, segments in (("text", self.template.text_segments), ("html", self.template.html_segments)):
+            out = list(segments)
+            out[1::2] = [_slot_sentinel(part, n) for n in segments[1::2]]
+            bodies[part] = "".join(out)
+            lines = []
+            for line in bodies[part].splitlines():
+                if "\x1a" + part + ":" not in line:
+                    continue
+                names, static = [], line
+                for n in set(segments[1::2]):
+                    sentinel = _slot_sentinel(part, n)
+                    names += [n] * line.count(sentinel)
+                    static = static.replace(sentinel, "")
+                lines.append((len(static.encode(errors="surrogateescape")), names))
+            self.slot_lines[part] = lines
+        return bodies
+
+    def _build(self) -> bool:
+        if not any(self.template.text_segments[0::2]):
+            # an empty text body drops the text/plain part for some recipients
+            return False
+        bodies = self._sentinel_bodies()
+        skeleton = self._message(_TO_SENTINEL, bodies["html"], bodies["text"], _DATE_SENTINEL, _MID_SENTINEL)
+        mime = skeleton.message()
+        parts = {"text": None, "html": None}
+        for sub in mime.walk():
+            if sub.get_content_type() == "text/plain":
+                parts["text"] = sub
+            elif sub.get_content_type() == "text/html":
+                parts["html"] = sub
+        for name, sub in parts.items():
+            cte = sub.get("Content-Transfer-Encoding") if sub is not None else None
+            if cte not in {"7bit", "8bit"}:
+                return False
+            self.seven_bit[name] = cte == "7bit"
+
+        data = self._flatten(skeleton)
+        # An ASCII part is sent as 7bit; a recipient whose slot values are not
+        # ASCII flips it to 8bit, so that header line becomes a slot too.
+        seven_bit_parts = [name for name in ("text", "html") if self.seven_bit[name]]
+        cte_line = b"Content-Transfer-Encoding: 7bit\r\n"
+        if data.count(cte_line) != len(seven_bit_parts):
+            return False
+        pieces: List[object] = []
+        for i, chunk in enumerate(data.split(cte_line)):
+            if i:
+                pieces.append(("cte", seven_bit_parts[i - 1]))
+            pieces.append(chunk)
+
+        # cut the skeleton at every header line / body slot
+        markers: List[Tuple[bytes, object]] = []
+        for header, sentinel in _HEADER_SLOTS.items():
+            line = fold_header(header, sentinel, self.encoding)
+            if data.count(line) != 1:
+                return False
+            markers.append((line, ("header", header)))
+        for part, segments in (("text", self.template.text_segments), ("html", self.template.html_segments)):
+            for n in set(segments[1::2]):
+                markers.append((_slot_sentinel(part, n).encode(), ("slot", part, n)))
+
+        for token, slot in markers:
+            nxt: List[object] = []
+            for piece in pieces:
+                if not isinstance(piece, bytes):
+                    nxt.append(piece)
+                    continue
+                chunks = piece.split(token)
+                for i, chunk in enumerate(chunks):
+                    if i:
+                        nxt.append(slot)
+                    nxt.append(chunk)
+            pieces = nxt
+        self.segments = [p for p in pieces if p != b""]
+        return self._verify()
+
+    def _verify(self) -> bool:
+        """One stdlib round-trip per campaign guards against any encoding drift."""
+        probe = ("00000000-0000-0000-0000-000000000000", "probe@example.com")
+        date, mid = formatdate(), make_msgid(domain=DNS_NAME)
+        fast = self.render(probe[1], probe[0], None, date=date, message_id=mid)
+        return fast is not None and fast[0] == self.reference_bytes(probe[1], probe[0], None, date, mid)
+
+    # ------------ Per recipient ------------
+    def _to_value(self, email: str, merge_fields: Optional[dict]) -> str:
+        to_name = self.template.to_name_for(merge_fields)
+        return formataddr((to_name, email)) if to_name else email
+
+    def reference_bytes(self, email: str, contact_id: str, merge_fields: Optional[dict],
+                        date: str, message_id: str) -> bytes:
+        """What the plain stdlib path produces for this recipient."""
+        msg = self._message(
+            self._to_value(email, merge_fields),
+            self.template.html_for(contact_id, merge_fields),
+            self.template.text_for(contact_id, merge_fields),
+            date, message_id,
+        )
+        return self._flatten(msg)
+
+    def render(self, email: str, contact_id: str, merge_fields: Optional[dict], *,
+               date: Optional[str] = None, message_id: Optional[str] = None) -> Optional[Tuple[bytes, str]]:
+        """-> (message bytes, sanitized To address), or None when the stdlib would encode differently."""
+        ctx = {
+            "text": merge_context(merge_fields) if self.template.needs_merge_fields else {},
+            "html": merge_context(merge_fields, html=True) if self.template.needs_merge_fields else {},
+        }
+        encoded: Dict[str, Dict[str, bytes]] = {}
+        boundary = self.boundary.encode()
+        for part in ("text", "html"):
+            ctx[part][RECIPIENT_ID] = contact_id
+            values = {}
+            for static_len, names in self.slot_lines.get(part, []):
+                total = static_len
+                for n in names:
+                    value = ctx[part].get(n, "")
+                    if n not in values:
+                        if value and value.splitlines() != [value]:
+                            return None
+                        raw = value.encode(errors="surrogateescape")
+                        if boundary in raw:
+                            return None
+                        values[n] = raw
+                    total += len(values[n])
+                if total > RFC5322_EMAIL_LINE_LENGTH_LIMIT:
+                    return None
+            encoded[part] = values
+
+        to_value = self._to_value(email, merge_fields)
+        headers = {
+            "To": fold_header("To", to_value, self.encoding),
+            "Date": fold_header("Date", date or formatdate(localtime=settings.EMAIL_USE_LOCALTIME), self.encoding),
+            "Message-ID": fold_header("Message-ID", message_id or make_msgid(domain=DNS_NAME), self.encoding),
+        }
+        out = []
+        for seg in self.segments:
+            if isinstance(seg, bytes):
+                out.append(seg)
+            elif seg[0] == "header":
+                out.append(headers[seg[1]])
+            elif seg[0] == "cte":
+                ascii_only = all(v.isascii() for v in encoded[seg[1]].values())
+                out.append(b"Content-Transfer-Encoding: %s\r\n" % (b"7bit" if ascii_only else b"8bit"))
+            else:
+                out.append(encoded[seg[1]][seg[2]])
+        return b"".join(out), sanitize_address(to_value, self.encoding)
+
+    def message_for(self, email: str, contact_id: str, conn, merge_fields: Optional[dict] = None):
+        """A FastMessage when the skeleton applies, else the regular EmailMultiAlternatives."""
+        from . import email_service
+
+        def regular():
+            return email_service.build_email_message(
+                self.campaign, email, contact_id, self.template, conn, merge_fields
+            )
+
+        rendered = self.render(email, contact_id, merge_fields) if self.enabled else None
+        if rendered is None:
+            return regular()
+        data, to_addr = rendered
+        return FastMessage(data, self.from_addr, to_addr, conn, regular)
+
+    def envelope_for(self, email: str, contact_id: str, merge_fields: Optional[dict] = None) -> Tuple[bytes, str]:
+        """(message bytes, sanitized To) for engines that speak SMTP themselves (async_sender)."""
+        rendered = self.render(email, contact_id, merge_fields) if self.enabled else None
+        if rendered is not None:
+            return rendered
+        from . import email_service
+        msg = email_service.build_email_message(self.campaign, email, contact_id, self.template, None, merge_fields)
+        return msg.message().as_bytes(linesep="\r\n"), sanitize_address(msg.to[0], msg.encoding or self.encoding)
+
+
+# ------------ Per-process cache ------------
+_prepared: Dict[Tuple[str, str], PreparedCampaign] = {}
+_MAX_CACHED = 32
+
+
+def prepared_for(campaign: Campaign, template: CampaignTemplate) -> PreparedCampaign:
+    """Build the skeleton once per campaign version per worker process."""
+    key = (str(campaign.id), f"{campaign.compiled_at}|{campaign.updated_at}")
+    hit = _prepared.get(key)
+    if hit is None:
+        if len(_prepared) >= _MAX_CACHED:
+            _prepared.pop(next(iter(_prepared)))
+        hit = _prepared[key] = PreparedCampaign(campaign, template)
+    return hit
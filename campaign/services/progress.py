@@ -0,0 +1,144 @@
+from __future__ import annotations
+import time
+from typing import Dict
+
+from django.db.models import F
+
+from campaign.models import Campaign
+from .lanes import all_lanes
+from .redis_service import conn, control_key, inflight_key, lane_key, progress_key, rate_key, retry_key
+
+
+# Live send progress lives in Redis: chunks bump a per-campaign hash
+# (base, queued, sent, failed, deferred, flushed, started, closed) and a hash
+# of sent counts per RATE_BUCKET seconds. flush() copies the sent count to
+# Campaign.emails_sent as an absolute value, so the row is written once per
+# flush interval instead of once per chunk, and a repeated flush is harmless.
+RATE_BUCKET = 10     # seconds per rate bucket
+RATE_WINDOW = 60     # the rate is averaged over this many seconds
+PROGRESS_TTL = 7 * 24 * 3600
+CLOSED_TTL = 24 * 3600   # a finished send's numbers stay readable this long
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def start(campaign_id: str, already_sent: int) -> None:
+    """Called by kickoff right after init_state (which dropped the old hash)."""
+    p = conn().pipeline()
+    p.hset(progress_key(campaign_id), mapping={"base": already_sent, "started": _now_ms()})
+    p.expire(progress_key(campaign_id), PROGRESS_TTL)
+    p.execute()
+
+
+def add_queued(campaign_id: str, n: int) -> None:
+    conn().hincrby(progress_key(campaign_id), "queued", n)
+
+
+def record(campaign_id: str, *, sent: int, failed: int, deferred: int) -> bool:
+    """
+    One pipeline per chunk. False when the send was closed (canceled or
+    finished meanwhile) or its hash is gone: no flush will follow, so the
+    caller writes the count to the row itself.
+    """
+    key = progress_key(campaign_id)
+    p = conn().pipeline()
+    p.hmget(key, "base", "closed")
+    p.hincrby(key, "sent", sent)
+    p.hincrby(key, "failed", failed)
+    p.hincrby(key, "deferred", deferred)
+    if sent:
+        p.hincrby(rate_key(campaign_id), _now_ms() // 1000 // RATE_BUCKET, sent)
+        p.expire(rate_key(campaign_id), RATE_WINDOW * 2)
+    base, closed = p.execute()[0]
+    if base is None:
+        conn().delete(key)
+    return base is not None and closed is None
+
+
+def flush(campaign_id: str) -> int | None:
+    """Write base + sent to Campaign.emails_sent if it moved; returns the value written."""
+    c = conn()
+    _prune_rate(c, campaign_id)
+    base, sent, flushed = c.hmget(progress_key(campaign_id), "base", "sent", "flushed")
+    if base is None:
+        return None
+    sent = int(sent or 0)
+    if flushed is not None and int(flushed) == sent:
+        return None
+    total = int(base) + sent
+    Campaign.objects.filter(pk=campaign_id).update(emails_sent=total)
+    c.hset(progress_key(campaign_id), "flushed", sent)
+    return total
+
+
+def close(campaign_id: str) -> None:
+    """Final flush when a send completes or is canceled; the numbers stay for CLOSED_TTL."""
+    flush(campaign_id)
+    p = conn().pipeline()
+    p.hset(progress_key(campaign_id), "closed", 1)
+    p.expire(progress_key(campaign_id), CLOSED_TTL)
+    p.execute()
+
+
+def _prune_rate(c, campaign_id: str) -> None:
+    oldest = _now_ms() // 1000 // RATE_BUCKET - RATE_WINDOW // RATE_BUCKET
+    stale = [b for b in c.hkeys(rate_key(campaign_id)) if int(b) < oldest]
+    if stale:
+        c.hdel(rate_key(campaign_id), *stale)
+
+
+def add_sent_directly(campaign_id: str, sent: int) -> None:
+    if sent:
+        Campaign.objects.filter(pk=campaign_id).update(emails_sent=F("emails_sent") + sent)
+
+
+def snapshot(campaign_id: str) -> Dict | None:
+    """
+    Everything the progress endpoint shows, from one Redis pipeline and no DB
+    query; None when Redis has neither progress nor a control state for it.
+    """
+    lanes = all_lanes()
+    p = conn().pipeline(transaction=False)
+    p.hgetall(progress_key(campaign_id))
+    p.hgetall(rate_key(campaign_id))
+    p.get(inflight_key(campaign_id))
+    p.get(control_key(campaign_id))
+    p.zcard(retry_key(campaign_id))
+    for lane in lanes:
+        p.llen(lane_key(campaign_id, lane))
+    raw = p.execute()
+    if not raw[0] and raw[3] is None:
+        return None
+    stats = {k.decode(): int(v) for k, v in raw[0].items()}
+    buckets = {int(k): int(v) for k, v in raw[1].items()}
+    inflight, state, retrying = int(raw[2] or 0), raw[3], int(raw[4])
+    queued_by_lane = {lane: int(n) for lane, n in zip(lanes, raw[5:])}
+
+    now_ms = _now_ms()
+    now_bucket = now_ms // 1000 // RATE_BUCKET
+    oldest = now_bucket - RATE_WINDOW // RATE_BUCKET + 1
+    recent = sum(n for b, n in buckets.items() if b >= oldest)
+    span = now_ms / 1000 - max(oldest * RATE_BUCKET, stats.get("started", now_ms) / 1000)
+    rate = recent / span if span > 0 else 0.0
+
+    sent, failed = stats.get("sent", 0), stats.get("failed", 0)
+    remaining = max(0, stats.get("queued", 0) - sent - failed)
+    if not remaining:
+        eta = 0
+    else:
+        eta = int(remaining / rate) if rate > 0 else None
+    return {
+        "state": state.decode() if state else None,
+        "sent": stats.get("base", 0) + sent,
+        "failed": failed,
+        "deferred": stats.get("deferred", 0),
+        "remaining": remaining,
+        "queue_depth": sum(queued_by_lane.values()),
+        "queue_by_lane": queued_by_lane,
+        "retrying": retrying,
+        "inflight_chunks": inflight,
+        "rate_per_sec": round(rate, 2),
+        "eta_seconds": eta,
+    }
@@ -0,0 +1,109 @@
+from __future__ import annotations
+from typing import List, Sequence, Tuple
+
+from django.conf import settings
+
+from campaign.models import Campaign
+from .lanes import lane_config
+from .redis_service import conn
+
+
+# (key, tokens per second, burst capacity)
+Bucket = Tuple[str, float, float]
+
+# Refills every bucket from the Redis clock, then grants the largest count
+# (<= requested) that all buckets can cover and debits it from each of them.
+# Returns {granted, wait_ms}; wait_ms is how long until one token is available
+# everywhere when nothing could be granted.
+_TOKEN_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local want = tonumber(ARGV[1])
+local levels = {}
+local grant = want
+for i = 1, #KEYS do
+  local rate = tonumber(ARGV[2 * i])
+  local burst = tonumber(ARGV[2 * i + 1])
+  local st = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+  local tokens = tonumber(st[1]) or burst
+  local ts = tonumber(st[2]) or now
+  tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+  levels[i] = tokens
+  local avail = math.floor(tokens)
+  if avail < grant then grant = avail end
+end
+if grant < 0 then grant = 0 end
+local wait = 0
+for i = 1, #KEYS do
+  local rate = tonumber(ARGV[2 * i])
+  local burst = tonumber(ARGV[2 * i + 1])
+  local left = levels[i] - grant
+  redis.call('HSET', KEYS[i], 'tokens', tostring(left), 'ts', now)
+  redis.call('PEXPIRE', KEYS[i], math.ceil(burst / rate * 1000) + 1000)
+  if grant == 0 and left < 1 then
+    local need = math.ceil((1 - left) * 1000 / rate)
+    if need > wait then wait = need end
+  end
+end
+return {grant, wait}
+"""
+
+_script = None
+
+
+def _token_bucket():
+    global _script
+    if _script is None:
+        _script = conn().register_script(_TOKEN_BUCKET_LUA)
+    return _script
+
+
+# ------------ Keys ------------
+def global_bucket_key() -> str:
+    return "ratelimit:global"
+
+def campaign_bucket_key(campaign_id: str) -> str:
+    return f"ratelimit:campaign:{campaign_id}"
+
+def sender_domain_bucket_key(domain: str) -> str:
+    return f"ratelimit:sender:{domain.lower()}"
+
+def lane_bucket_key(lane: str) -> str:
+    return f"ratelimit:lane:{lane}"
+
+
+def _bucket(key: str, rate: float) -> List[Bucket]:
+    """A bucket for `rate` msgs/sec, or nothing when the limit is disabled (0)."""
+    if not rate or rate <= 0:
+        return []
+    burst_seconds = float(getattr(settings, "SEND_RATE_BURST_SECONDS", 1.0))
+    return [(key, float(rate), max(1.0, rate * burst_seconds))]
+
+
+def buckets_for(campaign: Campaign, lane: str | None = None) -> List[Bucket]:
+    """Global, per-campaign, per-sender-domain and per-lane limits that apply to `campaign`."""
+    domain = (campaign.from_email or "").rpartition("@")[2]
+    buckets: List[Bucket] = []
+    buckets += _bucket(global_bucket_key(), getattr(settings, "SEND_RATE_GLOBAL", 0))
+    buckets += _bucket(campaign_bucket_key(str(campaign.id)), getattr(settings, "SEND_RATE_PER_CAMPAIGN", 0))
+    if domain:
+        buckets += _bucket(sender_domain_bucket_key(domain), getattr(settings, "SEND_RATE_PER_SENDER_DOMAIN", 0))
+    if lane:
+        buckets += _bucket(lane_bucket_key(lane), lane_config(lane)["rate"])
+    return buckets
+
+
+def acquire(buckets: Sequence[Bucket], requested: int) -> Tuple[int, float]:
+    """
+    Take up to `requested` tokens from every bucket in one atomic call.
+    Returns (granted, wait_seconds); wait_seconds is only set when granted is 0.
+    """
+    if requested <= 0:
+        return 0, 0.0
+    if not buckets:
+        return requested, 0.0
+    args: List = [requested]
+    for _, rate, burst in buckets:
+        args += [rate, burst]
+    granted, wait_ms = _token_bucket()(keys=[k for k, _, _ in buckets], args=args)
+    return int(granted), int(wait_ms) / 1000.0
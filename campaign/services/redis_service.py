@@ -1,9 +1,16 @@
 from __future__ import annotations
 from contextlib import contextmanager
-from typing import List
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+import random
+import time
 import uuid
+from django.conf import settings
 from django_redis import get_redis_connection
 
+from .lanes import DEFAULT_LANE, all_lanes, lane_config, lane_for
+
 # ------------ Keys ------------
 def recipients_key(campaign_id: str) -> str:
     return f"campaign:{campaign_id}:recipients"
@@ -14,6 +21,101 @@ def inflight_key(campaign_id: str) -> str:
 def lock_key(campaign_id: str) -> str:
     return f"campaign:{campaign_id}:lock"
 
+def lane_key(campaign_id: str, lane: str) -> str:
+    return f"campaign:{campaign_id}:lane:{lane}"
+
+def lane_inflight_key(campaign_id: str, lane: str) -> str:
+    return f"campaign:{campaign_id}:lane:{lane}:inflight"
+
+def loading_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:loading"
+
+def rr_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:rr"
+
+def wakeup_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:wakeup"
+
+def control_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:control"
+
+def window_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:window"
+
+# In-flight chunks: lease id -> deadline (ZSET) and lease id -> "lane\nrecord\n..." (HASH);
+# the lane gets a "*" prefix once the worker has claimed the records
+def leases_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:leases"
+
+def lease_data_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:lease_data"
+
+def lease_seq_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:lease_seq"
+
+# Sent guard: one bit per recipient ordinal in each bitmap, see claim_records
+def claimed_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:claimed"
+
+def sent_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:sent"
+
+# Transient failures waiting out their backoff: "lane\nrecord" -> due (ms, ZSET),
+# and recipient ordinal -> attempts so far (HASH)
+def retry_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:retry"
+
+def retry_attempts_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:retry_attempts"
+
+# Live progress counters and sent-per-bucket rate, see services.progress
+def progress_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:progress"
+
+def rate_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:rate"
+
+# Per-stage chunk timings and sampled profiles (stage_timing, opt-in)
+def stages_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:stages"
+
+def profiles_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:profiles"
+
+# The campaign's slice of the cluster-wide chunk budget, set by fair_share.rebalance
+def share_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:share"
+
+CONTROL_CHANNEL = "campaign:control"
+
+# Recipient-local-time sends (services.local_time): records wait in one list
+# per (UTC offset in minutes, lane) until that offset's local send time.
+# tz_pending scores each unreleased offset by its release time (ms);
+# TZ_RELEASE_KEY scores every such campaign by its next release, so the
+# release sweep finds due campaigns with one call.
+def tz_bucket_key(campaign_id: str, offset: int, lane: str) -> str:
+    return f"campaign:{campaign_id}:tz:{offset}:{lane}"
+
+def tz_pending_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:tz_pending"
+
+TZ_RELEASE_KEY = "send:tz_release"
+
+# Provider throttling is per sending IP, so lane backoff is shared by all campaigns.
+def lane_backoff_key(lane: str) -> str:
+    return f"lane:{lane}:backoff"
+
+def lane_strikes_key(lane: str) -> str:
+    return f"lane:{lane}:strikes"
+
+# The catch-all lane mixes every unlisted provider, so throttling there parks
+# only the recipient's domain instead of the whole lane.
+def domain_backoff_key(domain: str) -> str:
+    return f"domain:{domain}:backoff"
+
+def domain_strikes_key(domain: str) -> str:
+    return f"domain:{domain}:strikes"
+
 # ------------ Conn ------------
 def conn():
     return get_redis_connection("default")
@@ -34,63 +136,659 @@ def redis_lock(name: str, ttl: int = 15):
         except Exception:
             pass
 
+# ------------ Recipient records ------------
+# A queued recipient is "<contact id as 22 url-safe base64 chars><ordinal as 8
+# hex digits><email>": the chunk worker needs no lookup to get back to the
+# contact, the ordinal (position in this send) indexes the sent-guard bitmap,
+# and the fixed-width prefix needs no delimiter.
+_ID_LEN = 22
+_ORD_LEN = 8
+_PREFIX_LEN = _ID_LEN + _ORD_LEN
+
+def pack_recipient(contact_id, email: str, ordinal: int) -> str:
+    raw = contact_id.bytes if isinstance(contact_id, uuid.UUID) else uuid.UUID(str(contact_id)).bytes
+    return urlsafe_b64encode(raw)[:_ID_LEN].decode() + f"{ordinal:08x}" + email
+
+def unpack_recipient(record: str) -> Tuple[str, str]:
+    """-> (contact_id, email)"""
+    contact_id = uuid.UUID(bytes=urlsafe_b64decode(record[:_ID_LEN] + "=="))
+    return str(contact_id), record[_PREFIX_LEN:]
+
+def record_ordinal(record: str) -> int:
+    return int(record[_ID_LEN:_PREFIX_LEN], 16)
+
+def _split_by_lane(records: Iterable[str]) -> Dict[str, List[str]]:
+    by_lane: Dict[str, List[str]] = defaultdict(list)
+    for record in records:
+        by_lane[lane_for(record[_PREFIX_LEN:])].append(record)
+    return by_lane
+
 # ------------ State ops ------------
-def init_state(campaign_id: str, emails: List[str]) -> None:
+def _campaign_keys(campaign_id: str) -> List[str]:
+    keys = [recipients_key(campaign_id), inflight_key(campaign_id),
+            wakeup_key(campaign_id), rr_key(campaign_id), loading_key(campaign_id),
+            leases_key(campaign_id), lease_data_key(campaign_id), lease_seq_key(campaign_id),
+            claimed_key(campaign_id), sent_key(campaign_id), retry_key(campaign_id), retry_attempts_key(campaign_id),
+            share_key(campaign_id)]
+    for lane in all_lanes():
+        keys += [lane_key(campaign_id, lane), lane_inflight_key(campaign_id, lane)]
+    return keys
+
+# Recipients are still being materialized while this flag is up; it expires on
+# its own if kickoff dies, so a crashed load can't block finalization forever.
+LOADING_TTL = 3600
+
+def init_state(campaign_id: str, recipients: List[Tuple[str, str]] = ()) -> None:
+    """Reset the campaign's queues and mark it as loading recipients; `recipients` get ordinals from 0."""
     c = conn()
-    rk, ik = recipients_key(campaign_id), inflight_key(campaign_id)
+    _drop_staged(campaign_id)
     p = c.pipeline()
-    p.delete(rk)
-    p.delete(ik)
-    if emails:
-        p.rpush(rk, *emails)
-    p.set(ik, 0)
+    # progress and stage timings outlive cleanup (read after the send) and are reset here
+    p.delete(*_campaign_keys(campaign_id), progress_key(campaign_id), rate_key(campaign_id),
+             stages_key(campaign_id), profiles_key(campaign_id))
+    p.set(inflight_key(campaign_id), 0)
+    p.set(loading_key(campaign_id), 1, ex=LOADING_TTL)
     p.execute()
+    append_recipients(campaign_id, recipients)
+
+def append_recipients(campaign_id: str, recipients: List[Tuple[str, str]], first_ordinal: int = 0) -> None:
+    """
+    Pack one bounded batch of (contact_id, email) pairs, numbered from
+    first_ordinal, and split it into per-domain lanes in a single pipeline.
+    """
+    if not recipients:
+        return
+    by_lane = _split_by_lane(
+        pack_recipient(cid, email, first_ordinal + i) for i, (cid, email) in enumerate(recipients)
+    )
+
+    p = conn().pipeline(transaction=False)
+    for lane, records in by_lane.items():
+        p.rpush(lane_key(campaign_id, lane), *records)
+    p.expire(loading_key(campaign_id), LOADING_TTL)
+    p.execute()
+
+def finish_loading(campaign_id: str) -> None:
+    conn().delete(loading_key(campaign_id))
+
+def is_loading(campaign_id: str) -> bool:
+    return bool(conn().exists(loading_key(campaign_id)))
 
 def cleanup(campaign_id: str) -> None:
-    c = conn()
-    c.delete(recipients_key(campaign_id))
-    c.delete(inflight_key(campaign_id))
+    _drop_staged(campaign_id)
+    conn().delete(*_campaign_keys(campaign_id))
+
+def lane_lengths(campaign_id: str) -> Dict[str, int]:
+    lanes = all_lanes()
+    p = conn().pipeline()
+    for lane in lanes:
+        p.llen(lane_key(campaign_id, lane))
+    return {lane: int(n) for lane, n in zip(lanes, p.execute())}
 
 def queue_len(campaign_id: str) -> int:
-    return int(conn().llen(recipients_key(campaign_id)))
+    return sum(lane_lengths(campaign_id).values())
 
-def get_inflight(campaign_id: str) -> int:
-    raw = conn().get(inflight_key(campaign_id)) or b"0"
-    return int(raw if isinstance(raw, bytes) else str(raw))
+def retry_len(campaign_id: str) -> int:
+    return int(conn().zcard(retry_key(campaign_id)))
 
-def incr_inflight(campaign_id: str) -> int:
-    return int(conn().incr(inflight_key(campaign_id)))
+def _as_int(raw) -> int:
+    return int(raw if isinstance(raw, bytes) else str(raw or 0))
 
-def decr_inflight(campaign_id: str) -> int:
-    c = conn()
-    nv = int(c.decr(inflight_key(campaign_id)))
+def get_inflight(campaign_id: str) -> int:
+    return _as_int(conn().get(inflight_key(campaign_id)) or b"0")
+
+def _decr_floor(c, key: str) -> int:
+    nv = int(c.decr(key))
     if nv < 0:
-        c.set(inflight_key(campaign_id), 0)
+        c.set(key, 0)
         nv = 0
     return nv
 
-def pop_chunk(campaign_id: str, chunk_size: int) -> List[str]:
+def decr_inflight(campaign_id: str, lane: str = DEFAULT_LANE) -> int:
+    c = conn()
+    _decr_floor(c, lane_inflight_key(campaign_id, lane))
+    return _decr_floor(c, inflight_key(campaign_id))
+
+def push_back_front(campaign_id: str, records: List[str], lane: Optional[str] = None) -> None:
     """
-    Atomically pop up to chunk_size from the head.
-    Uses LPOP count if available; falls back to LRANGE+LTRIM.
+    Push remainder back to the front of its lane(s) preserving order, and drop
+    their sent-guard claims in the same transaction so the next chunk can take them.
     """
+    if not records:
+        return
+    by_lane = _split_by_lane(records) if lane is None else {lane: list(records)}
+    p = conn().pipeline()
+    _release(p, campaign_id, records)
+    for name, lane_records in by_lane.items():
+        p.lpush(lane_key(campaign_id, name), *list(reversed(lane_records)))
+    p.execute()
+
+# ------------ Sent guard ------------
+# Two bitmaps, one bit per recipient ordinal. "claimed" is set while a chunk
+# owns the recipient and kept once it was handled for good; "sent" is set as
+# soon as the relay accepted the message. A redelivered chunk or a remainder
+# racing a pause/resume finds the claim and skips the address; the reaper only
+# requeues records that are claimed but not sent, so a dead worker's delivered
+# recipients never get the campaign twice. 1M recipients cost 250 KB.
+def _release(c, campaign_id: str, records: Iterable[str]) -> None:
+    ops = c.bitfield(claimed_key(campaign_id))
+    n = 0
+    for record in records:
+        ops.set("u1", record_ordinal(record), 0)
+        n += 1
+    if n:
+        ops.execute()
+
+# Claims every record nobody holds or sent yet and narrows the chunk's lease to
+# them, marked as owned, so the reaper never requeues records another chunk holds.
+# KEYS: claimed, sent, leases, lease data; ARGV: lease id ('' for none), lease seconds, lane, records...
+_CLAIM_LUA = """
+local claimed = {}
+for i = 4, #ARGV do
+  local ordinal = tonumber(string.sub(ARGV[i], 23, 30), 16)
+  if redis.call('GETBIT', KEYS[2], ordinal) == 0 and redis.call('SETBIT', KEYS[1], ordinal, 1) == 0 then
+    claimed[#claimed + 1] = ARGV[i]
+  end
+end
+if ARGV[1] ~= '' and redis.call('ZSCORE', KEYS[3], ARGV[1]) then
+  local t = redis.call('TIME')
+  local deadline = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000) + tonumber(ARGV[2]) * 1000
+  redis.call('ZADD', KEYS[3], 'XX', deadline, ARGV[1])
+  redis.call('HSET', KEYS[4], ARGV[1], '*' .. ARGV[3] .. '\\n' .. table.concat(claimed, '\\n'))
+end
+return claimed
+"""
+
+def claim_records(campaign_id: str, records: List[str], lane: str = DEFAULT_LANE,
+                  lease_id: Optional[str] = None) -> List[str]:
+    """Atomically claim a chunk's recipients; returns those nobody held or sent yet."""
+    if not records:
+        return []
+    keys = [claimed_key(campaign_id), sent_key(campaign_id), leases_key(campaign_id), lease_data_key(campaign_id)]
+    raw = _script("claim", _CLAIM_LUA)(keys=keys, args=[lease_id or "", lease_seconds(), lane, *records])
+    return [_text(v) for v in raw]
+
+def mark_sent(campaign_id: str, records: List[str]) -> None:
+    """Record that the relay accepted these recipients (one BITFIELD)."""
+    if not records:
+        return
+    ops = conn().bitfield(sent_key(campaign_id))
+    for record in records:
+        ops.set("u1", record_ordinal(record), 1)
+    ops.execute()
+
+def release_records(campaign_id: str, records: List[str]) -> None:
+    """Give up claims on recipients this chunk hands back without sending."""
+    _release(conn(), campaign_id, records)
+
+# ------------ Retry queue ------------
+# A transient failure (4xx, dropped session) waits in the campaign's retry ZSET
+# for a jittered exponential backoff; the dispatch script moves due entries to
+# the tail of their lane, so retries never hold up fresh sends.
+_RETRY_DEFAULTS = {"base_seconds": 60, "max_seconds": 3600, "max_retries": 5, "batch": 200}
+
+def retry_config() -> Dict[str, float]:
+    return {**_RETRY_DEFAULTS, **getattr(settings, "SEND_RETRY", {})}
+
+def _backoff(attempt: int, cfg: Dict[str, float]) -> float:
+    # "equal jitter": half the exponential delay, plus up to the other half at random
+    delay = min(cfg["max_seconds"], cfg["base_seconds"] * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def schedule_retries(campaign_id: str, records: List[str], lane: str) -> Tuple[List[str], List[str]]:
+    """
+    Queue records for another attempt after their backoff and release their
+    sent-guard claims. -> (scheduled, exhausted); exhausted records used up their
+    max_retries, stay claimed and should be recorded as failed.
+    """
+    if not records:
+        return [], []
+    cfg = retry_config()
     c = conn()
-    try:
-        vals = c.lpop(recipients_key(campaign_id), chunk_size) or []
-        if isinstance(vals, (bytes, str)):  # single item case
-            vals = [vals]
-    except TypeError:
-        # redis-py without LPOP count
+    p = c.pipeline(transaction=False)
+    for record in records:
+        p.hincrby(retry_attempts_key(campaign_id), record_ordinal(record), 1)
+    attempts = p.execute()
+
+    now_ms = time.time() * 1000
+    scheduled, exhausted, due = [], [], {}
+    for record, attempt in zip(records, attempts):
+        if attempt > cfg["max_retries"]:
+            exhausted.append(record)
+        else:
+            scheduled.append(record)
+            due[f"{lane}\n{record}"] = now_ms + _backoff(attempt, cfg) * 1000
+    if scheduled:
         p = c.pipeline()
-        p.lrange(recipients_key(campaign_id), 0, chunk_size - 1)
-        p.ltrim(recipients_key(campaign_id), chunk_size, -1)
-        vals, _ = p.execute()
+        _release(p, campaign_id, scheduled)
+        p.zadd(retry_key(campaign_id), due)
+        p.execute()
+    return scheduled, exhausted
+
+# ------------ Dispatch ------------
+# One round-trip per dispatch: check the control mirror, move due retries to
+# the tail of their lanes, read the AIMD window (capped by the fair share when
+# the scheduler has set one), round-robin the non-parked lanes that are under
+# their cap, pop one chunk per lane turn, lease it and bump the counters.
+# Atomic, so no lock is needed.
+# KEYS: control, inflight, rr, window, leases, lease data, lease seq, retry,
+#       share, then (queue, inflight, backoff) per lane
+# ARGV: required state, default window, default chunk size, lease seconds,
+#       retries moved per call, then a cap per lane, then the lane names
+# Returns {status, inflight, retry_in, lane index, lease id, count, records..., ...};
+# retry_in is the time until a parked lane with work unparks or the next retry
+# is due, whichever comes first (-1 if neither).
+_DISPATCH_LUA = """
+local state = redis.call('GET', KEYS[1])
+if not state then return {'unknown', 0, -1} end
+if state ~= ARGV[1] then return {state, 0, -1} end
+local nlanes = (#KEYS - 9) / 3
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local lane_of = {}
+for i = 1, nlanes do lane_of[ARGV[5 + nlanes + i]] = i end
+local due = redis.call('ZRANGEBYSCORE', KEYS[8], '-inf', now, 'LIMIT', 0, tonumber(ARGV[5]))
+for _, member in ipairs(due) do
+  local sep = string.find(member, '\\n', 1, true)
+  local i = lane_of[string.sub(member, 1, sep - 1)] or nlanes
+  redis.call('RPUSH', KEYS[3 * i + 7], string.sub(member, sep + 1))
+  redis.call('ZREM', KEYS[8], member)
+end
+local inflight = tonumber(redis.call('GET', KEYS[2]) or '0')
+local win = redis.call('HMGET', KEYS[4], 'inflight', 'chunk_size')
+local window = tonumber(win[1]) or tonumber(ARGV[2])
+local share = tonumber(redis.call('GET', KEYS[9]) or '')
+if share then window = math.min(window, share) end
+local need = math.floor(window) - inflight
+local size = math.floor(tonumber(win[2]) or tonumber(ARGV[3]))
+local active, busy = {}, {}
+local retry_in = -1
+local nxt = redis.call('ZRANGE', KEYS[8], 0, 0, 'WITHSCORES')
+if nxt[2] then retry_in = math.max(1, math.ceil((tonumber(nxt[2]) - now) / 1000)) end
+for i = 1, nlanes do
+  local q, li, bo = KEYS[3 * i + 7], KEYS[3 * i + 8], KEYS[3 * i + 9]
+  if redis.call('LLEN', q) > 0 then
+    local ttl = redis.call('TTL', bo)
+    if ttl > 0 then
+      if retry_in < 0 or ttl < retry_in then retry_in = ttl end
+    else
+      active[#active + 1] = i
+      busy[i] = tonumber(redis.call('GET', li) or '0')
+    end
+  end
+end
+local out = {'ok', inflight, retry_in}
+if need <= 0 or #active == 0 then return out end
+local deadline = now + tonumber(ARGV[4]) * 1000
+local start = redis.call('INCR', KEYS[3]) % #active
+local order = {}
+for j = 0, #active - 1 do order[#order + 1] = active[(start + j) % #active + 1] end
+while need > 0 and #order > 0 do
+  local again = {}
+  for _, i in ipairs(order) do
+    if need > 0 and busy[i] < tonumber(ARGV[5 + i]) then
+      local q = KEYS[3 * i + 7]
+      local items = redis.call('LRANGE', q, 0, size - 1)
+      redis.call('LTRIM', q, #items, -1)
+      local lease = tostring(redis.call('INCR', KEYS[7]))
+      redis.call('ZADD', KEYS[5], deadline, lease)
+      redis.call('HSET', KEYS[6], lease, ARGV[5 + nlanes + i] .. '\\n' .. table.concat(items, '\\n'))
+      redis.call('INCR', KEYS[3 * i + 8])
+      busy[i] = busy[i] + 1
+      inflight = redis.call('INCR', KEYS[2])
+      need = need - 1
+      out[#out + 1] = i
+      out[#out + 1] = lease
+      out[#out + 1] = #items
+      for _, v in ipairs(items) do out[#out + 1] = v end
+      if redis.call('LLEN', q) > 0 then again[#again + 1] = i end
+    end
+  end
+  order = again
+end
+out[2] = inflight
+return out
+"""
+
+_scripts: Dict[str, object] = {}
+
+def _script(name: str, source: str):
+    if name not in _scripts:
+        _scripts[name] = conn().register_script(source)
+    return _scripts[name]
+
+def _text(raw) -> str:
+    return raw.decode() if isinstance(raw, bytes) else str(raw)
+
+def lease_seconds() -> int:
+    """Visibility timeout: a chunk not acked by then is assumed lost with its worker."""
+    return int(getattr(settings, "CHUNK_LEASE_SECONDS", 600))
+
+def dispatch_chunks(campaign_id: str, *, state: str, default_inflight: int, default_chunk: int) -> Dict:
+    """
+    Pop and lease as many chunks as the campaign's window allows, provided
+    its control state is `state`.
+    -> {"status": "ok" | other state | "unknown", "inflight": int,
+        "retry_in": int | None, "chunks": [(lane, lease_id, records), ...]}
+    """
+    lanes = all_lanes()
+    keys = [control_key(campaign_id), inflight_key(campaign_id), rr_key(campaign_id), window_key(campaign_id),
+            leases_key(campaign_id), lease_data_key(campaign_id), lease_seq_key(campaign_id),
+            retry_key(campaign_id), share_key(campaign_id)]
+    args = [state, default_inflight, default_chunk, lease_seconds(), int(retry_config()["batch"])]
+    for lane in lanes:
+        keys += [lane_key(campaign_id, lane), lane_inflight_key(campaign_id, lane), lane_backoff_key(lane)]
+        args.append(int(lane_config(lane)["max_inflight"]))
+    args += lanes
+    raw = _script("dispatch", _DISPATCH_LUA)(keys=keys, args=args)
+
+    chunks: List[Tuple[str, str, List[str]]] = []
+    pos = 3
+    while pos < len(raw):
+        lane, lease, count = lanes[int(raw[pos]) - 1], _text(raw[pos + 1]), int(raw[pos + 2])
+        chunks.append((lane, lease, [_text(v) for v in raw[pos + 3:pos + 3 + count]]))
+        pos += 3 + count
+    retry_in = int(raw[2])
+    return {
+        "status": _text(raw[0]),
+        "inflight": int(raw[1]),
+        "retry_in": retry_in if retry_in > 0 else None,
+        "chunks": chunks,
+    }
+
+# ------------ Leases ------------
+# KEYS: leases, lease data, inflight, lane inflight; ARGV: lease id
+_ACK_LUA = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then return 0 end
+redis.call('HDEL', KEYS[2], ARGV[1])
+for i = 3, 4 do
+  if redis.call('DECR', KEYS[i]) < 0 then redis.call('SET', KEYS[i], 0) end
+end
+return 1
+"""
+
+# KEYS: leases, lease data; ARGV: lease id, seconds, new payload ('' keeps the records)
+_RENEW_LUA = """
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then return 0 end
+local t = redis.call('TIME')
+local deadline = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000) + tonumber(ARGV[2]) * 1000
+redis.call('ZADD', KEYS[1], 'XX', deadline, ARGV[1])
+if ARGV[3] ~= '' then redis.call('HSET', KEYS[2], ARGV[1], ARGV[3]) end
+return 1
+"""
+
+# Requeue every chunk whose lease ran out (or just the lease in ARGV[1]) and
+# release its in-flight slots. Of an owned ("*") lease only records still
+# claimed and not sent go back to the front of their lane, with their claims
+# dropped: delivered ones stay done, and records the chunk already handed back
+# (pause, retry queue) aren't queued twice. A lease whose worker never claimed
+# it gets back every record that is neither sent nor held by another chunk.
+# KEYS: leases, lease data, inflight, claimed, sent, then (queue, inflight) per lane
+# ARGV: lease id ('' for every expired lease), then the lane names
+_REAP_LUA = """
+local expired
+if ARGV[1] ~= '' then
+  expired = {}
+  if redis.call('ZSCORE', KEYS[1], ARGV[1]) then expired[1] = ARGV[1] end
+else
+  local t = redis.call('TIME')
+  local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+  expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now)
+end
+local nlanes = #ARGV - 1
+local lanes = {}
+for i = 1, nlanes do lanes[ARGV[i + 1]] = i end
+for _, lease in ipairs(expired) do
+  local payload = redis.call('HGET', KEYS[2], lease)
+  redis.call('ZREM', KEYS[1], lease)
+  redis.call('HDEL', KEYS[2], lease)
+  local i = nlanes
+  if payload then
+    local records = {}
+    for line in string.gmatch(payload, '[^\\n]+') do records[#records + 1] = line end
+    local lane = table.remove(records, 1)
+    local owned = string.sub(lane, 1, 1) == '*'
+    if owned then lane = string.sub(lane, 2) end
+    i = lanes[lane] or nlanes
+    for j = #records, 1, -1 do
+      local ordinal = tonumber(string.sub(records[j], 23, 30), 16)
+      local held = redis.call('GETBIT', KEYS[4], ordinal) == 1
+      if held == owned and redis.call('GETBIT', KEYS[5], ordinal) == 0 then
+        redis.call('LPUSH', KEYS[4 + 2 * i], records[j])
+        if owned then redis.call('SETBIT', KEYS[4], ordinal, 0) end
+      end
+    end
+  end
+  for _, k in ipairs({KEYS[3], KEYS[5 + 2 * i]}) do
+    if redis.call('DECR', k) < 0 then redis.call('SET', k, 0) end
+  end
+end
+return #expired
+"""
+
+def ack_chunk(campaign_id: str, lane: str, lease_id: Optional[str]) -> bool:
+    """Release a finished chunk's lease and in-flight slots; False if the reaper got there first."""
+    if lease_id is None:
+        decr_inflight(campaign_id, lane)
+        return True
+    keys = [leases_key(campaign_id), lease_data_key(campaign_id),
+            inflight_key(campaign_id), lane_inflight_key(campaign_id, lane)]
+    return bool(_script("ack", _ACK_LUA)(keys=keys, args=[lease_id]))
+
+def renew_lease(campaign_id: str, lease_id: Optional[str], lane: str, records: List[str], seconds: float) -> bool:
+    """Push a lease's deadline out and narrow it to the records still unsent."""
+    if lease_id is None:
+        return False
+    keys = [leases_key(campaign_id), lease_data_key(campaign_id)]
+    payload = "\n".join([lane, *records])
+    return bool(_script("renew", _RENEW_LUA)(keys=keys, args=[lease_id, int(seconds), payload]))
+
+def extend_lease(campaign_id: str, lease_id: Optional[str], seconds: float) -> bool:
+    """Push a lease's deadline out, keeping its records; False if the reaper already took it."""
+    if lease_id is None:
+        return True
+    keys = [leases_key(campaign_id), lease_data_key(campaign_id)]
+    return bool(_script("renew", _RENEW_LUA)(keys=keys, args=[lease_id, int(seconds), ""]))
+
+class LeaseKeeper:
+    """
+    Heartbeat for a chunk's lease, called from the send loop: a slow but live
+    worker renews it every third of CHUNK_LEASE_SECONDS, so the reaper only
+    takes chunks whose worker is really gone. Between renewals beat() costs a
+    clock read.
+    """
+
+    def __init__(self, campaign_id: str, lease_id: Optional[str]) -> None:
+        self.campaign_id, self.lease_id = campaign_id, lease_id
+        self.interval = lease_seconds() / 3
+        self.due = time.monotonic() + self.interval
+        self.lost = False
+
+    def beat(self) -> bool:
+        """False once the lease is gone: its unsent records are back on the lane, stop sending."""
+        if self.lease_id is None or self.lost:
+            return not self.lost
+        now = time.monotonic()
+        if now >= self.due:
+            self.lost = not extend_lease(self.campaign_id, self.lease_id, lease_seconds())
+            self.due = now + self.interval
+        return not self.lost
+
+def abandon_chunk(campaign_id: str, lane: str, lease_id: Optional[str], records: List[str]) -> None:
+    """A chunk that crashed hands its claimed, unsent records back now instead of waiting out its lease."""
+    if lease_id is not None:
+        reap_expired(campaign_id, lease_id)
+        return
+    p = conn().pipeline(transaction=False)
+    for record in records:
+        p.getbit(claimed_key(campaign_id), record_ordinal(record))
+        p.getbit(sent_key(campaign_id), record_ordinal(record))
+    flags = p.execute()
+    unsent = [r for r, held, sent in zip(records, flags[::2], flags[1::2]) if held and not sent]
+    push_back_front(campaign_id, unsent, lane)
+    decr_inflight(campaign_id, lane)
+
+def reap_expired(campaign_id: str, lease_id: Optional[str] = None) -> int:
+    """Requeue chunks whose worker died or hung past the lease (or just lease_id, now); returns how many."""
+    lanes = all_lanes()
+    keys = [leases_key(campaign_id), lease_data_key(campaign_id), inflight_key(campaign_id),
+            claimed_key(campaign_id), sent_key(campaign_id)]
+    for lane in lanes:
+        keys += [lane_key(campaign_id, lane), lane_inflight_key(campaign_id, lane)]
+    return int(_script("reap", _REAP_LUA)(keys=keys, args=[lease_id or "", *lanes]))
+
+# ------------ Control state ------------
+# Mirror of Campaign.status for the hot path; outlives the send state so late
+# chunks still see "canceled"/"completed".
+CONTROL_TTL = 7 * 24 * 3600
+
+def set_control_state(campaign_id: str, state: str) -> None:
+    """Mirror the campaign status into Redis and broadcast the change."""
+    p = conn().pipeline()
+    p.set(control_key(campaign_id), state, ex=CONTROL_TTL)
+    p.publish(CONTROL_CHANNEL, f"{campaign_id}:{state}")
+    p.execute()
+
+def get_control_state(campaign_id: str) -> Optional[str]:
+    raw = conn().get(control_key(campaign_id))
+    return raw.decode() if isinstance(raw, bytes) else raw
+
+# ------------ Lane backoff ------------
+def _park(backoff_key: str, strikes_key: str, cfg: dict) -> int:
+    c = conn()
+    strikes = int(c.incr(strikes_key))
+    c.expire(strikes_key, int(cfg["backoff_max"]) * 2)
+    ttl = int(min(cfg["backoff_max"], cfg["backoff_base"] * 2 ** (strikes - 1)))
+    c.set(backoff_key, 1, ex=max(1, ttl))
+    return ttl
 
-    return [v.decode() if isinstance(v, bytes) else v for v in (vals or [])]
+def park_lane(lane: str) -> int:
+    """Park a lane after a throttling reply; each consecutive strike doubles the backoff."""
+    return _park(lane_backoff_key(lane), lane_strikes_key(lane), lane_config(lane))
 
-def push_back_front(campaign_id: str, emails: List[str]) -> None:
-    """Push remainder back to the front preserving order."""
-    if not emails:
+def park_domain(domain: str) -> int:
+    """park_lane for one domain of the catch-all lane, with that lane's backoff settings."""
+    return _park(domain_backoff_key(domain), domain_strikes_key(domain), lane_config(DEFAULT_LANE))
+
+def parked_domains(domains: Iterable[str]) -> Dict[str, int]:
+    """Those of `domains` currently backing off -> seconds left, in one round-trip."""
+    domains = list(domains)
+    if not domains:
+        return {}
+    p = conn().pipeline(transaction=False)
+    for domain in domains:
+        p.ttl(domain_backoff_key(domain))
+    return {domain: int(t) for domain, t in zip(domains, p.execute()) if int(t) > 0}
+
+def hold_records(campaign_id: str, lane: str, held: Dict[str, int]) -> None:
+    """
+    Move records whose domain is parked to the retry queue until its backoff
+    (record -> seconds) is over. Unlike schedule_retries this costs no attempt.
+    """
+    if not held:
         return
+    now_ms = time.time() * 1000
+    p = conn().pipeline()
+    _release(p, campaign_id, held)
+    p.zadd(retry_key(campaign_id), {f"{lane}\n{record}": now_ms + seconds * 1000 for record, seconds in held.items()})
+    p.execute()
+
+def clear_lane_strikes(lane: str) -> None:
+    conn().delete(lane_strikes_key(lane))
+
+def parked_lanes() -> Dict[str, int]:
+    """Lanes currently backing off -> seconds left."""
+    lanes = all_lanes()
+    p = conn().pipeline()
+    for lane in lanes:
+        p.ttl(lane_backoff_key(lane))
+    return {lane: int(t) for lane, t in zip(lanes, p.execute()) if int(t) > 0}
+
+def claim_wakeup(campaign_id: str, delay: int) -> bool:
+    """True for the single caller allowed to schedule a delayed re-dispatch."""
+    return bool(conn().set(wakeup_key(campaign_id), 1, nx=True, ex=max(1, delay)))
+
+# ------------ Local-time buckets ------------
+# Moves a staged bucket onto the tail of its lane queue: a rename when the
+# lane is empty, else at most ARGV[1] records per call.
+_RELEASE_LUA = """
+if redis.call('LLEN', KEYS[2]) == 0 and redis.call('EXISTS', KEYS[1]) == 1 then
+  redis.call('RENAME', KEYS[1], KEYS[2])
+  return 0
+end
+local limit, moved = tonumber(ARGV[1]), 0
+while moved < limit do
+  local items = redis.call('LRANGE', KEYS[1], 0, 999)
+  if #items == 0 then break end
+  redis.call('RPUSH', KEYS[2], unpack(items))
+  redis.call('LTRIM', KEYS[1], #items, -1)
+  moved = moved + #items
+end
+return redis.call('LLEN', KEYS[1])
+"""
+
+# Points the campaign's TZ_RELEASE_KEY entry at its earliest unreleased bucket, or drops it.
+_NEXT_RELEASE_LUA = """
+local first = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+if #first == 0 then
+  redis.call('ZREM', KEYS[2], ARGV[1])
+else
+  redis.call('ZADD', KEYS[2], first[2], ARGV[1])
+end
+return #first
+"""
+
+RELEASE_BATCH = 50000
+
+def stage_recipients(campaign_id: str, recipients: List[Tuple[str, str]], first_ordinal: int,
+                     offset: int, release_ms: int) -> None:
+    """Like append_recipients, but into the offset's waiting lists until release_ms."""
+    if not recipients:
+        return
+    by_lane = _split_by_lane(
+        pack_recipient(cid, email, first_ordinal + i) for i, (cid, email) in enumerate(recipients)
+    )
+    p = conn().pipeline()
+    for lane, records in by_lane.items():
+        p.rpush(tz_bucket_key(campaign_id, offset, lane), *records)
+    # (re)arm the offset: a bucket released while kickoff was still loading gets swept again
+    p.zadd(tz_pending_key(campaign_id), {str(offset): release_ms})
+    p.zadd(TZ_RELEASE_KEY, {campaign_id: release_ms}, lt=True)
+    p.expire(loading_key(campaign_id), LOADING_TTL)
+    p.execute()
+
+def local_pending(campaign_id: str) -> int:
+    """Offsets whose local send time hasn't been reached yet."""
+    return int(conn().zcard(tz_pending_key(campaign_id)))
+
+def due_local_campaigns(now_ms: int | None = None) -> List[str]:
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    return [cid.decode() for cid in conn().zrangebyscore(TZ_RELEASE_KEY, "-inf", now_ms)]
+
+def release_due_buckets(campaign_id: str, now_ms: int | None = None) -> int:
+    """Move every due bucket onto the lane queues; returns how many offsets were released."""
     c = conn()
-    c.lpush(recipients_key(campaign_id), *list(reversed(emails)))
\ No newline at end of file
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    due = [o.decode() for o in c.zrangebyscore(tz_pending_key(campaign_id), "-inf", now_ms)]
+    release = _script("tz_release", _RELEASE_LUA)
+    for offset in due:
+        for lane in all_lanes():
+            keys = [tz_bucket_key(campaign_id, int(offset), lane), lane_key(campaign_id, lane)]
+            while release(keys=keys, args=[RELEASE_BATCH]):
+                pass
+    # only once the records are on the lanes, so finalization never sees an empty send
+    if due:
+        c.zrem(tz_pending_key(campaign_id), *due)
+    _script("tz_next", _NEXT_RELEASE_LUA)(keys=[tz_pending_key(campaign_id), TZ_RELEASE_KEY], args=[campaign_id])
+    return len(due)
+
+def _drop_staged(campaign_id: str) -> None:
+    c = conn()
+    offsets = [int(o) for o in c.zrange(tz_pending_key(campaign_id), 0, -1)]
+    keys = [tz_bucket_key(campaign_id, o, lane) for o in offsets for lane in all_lanes()]
+    p = c.pipeline()
+    if keys:
+        p.delete(*keys)
+    p.delete(tz_pending_key(campaign_id))
+    p.zrem(TZ_RELEASE_KEY, campaign_id)
+    p.execute()
@@ -0,0 +1,81 @@
+from __future__ import annotations
+import re
+from typing import List, Mapping, Optional
+
+from django.utils.html import escape
+
+
+# Tracking links carry "{recipient_id}" (see tracking.link_compiler); merge
+# tags use "{{ name }}" and are matched case-insensitively.
+_SLOT_RE = re.compile(r"\{(recipient_id)\}|\{\{\s*([A-Za-z_][\w.]*)\s*\}\}")
+
+# friendly names for the merge fields imports usually carry
+_ALIASES = {"first_name": "fname", "last_name": "lname"}
+
+RECIPIENT_ID = "recipient_id"
+
+
+def split_template(text: str) -> List[str]:
+    """
+    Split `text` once into [static, slot, static, slot, ..., static]:
+    even indexes are literal text, odd indexes are placeholder names.
+    """
+    segments: List[str] = []
+    pos = 0
+    for m in _SLOT_RE.finditer(text or ""):
+        segments.append(text[pos:m.start()])
+        name = m.group(1) or m.group(2).lower()
+        segments.append(_ALIASES.get(name, name))
+        pos = m.end()
+    segments.append((text or "")[pos:])
+    return segments
+
+
+def slot_names(segments: List[str]) -> set[str]:
+    return set(segments[1::2])
+
+
+def render(segments: List[str], context: Mapping[str, str]) -> str:
+    """Fill every slot from `context` (missing -> "") and build the result in one join."""
+    if len(segments) == 1:
+        return segments[0]
+    out = list(segments)
+    out[1::2] = [context.get(name, "") for name in segments[1::2]]
+    return "".join(out)
+
+
+def merge_context(merge_fields: Optional[Mapping], *, html: bool = False) -> dict:
+    """Lower-case merge field keys; escape values destined for an HTML body."""
+    ctx = {}
+    for key, value in (merge_fields or {}).items():
+        value = "" if value is None else str(value)
+        ctx[str(key).lower()] = escape(value) if html else value
+    return ctx
+
+
+class CampaignTemplate:
+    """Per-campaign pre-split HTML body, text body and To-name format."""
+
+    def __init__(self, html_segments: List[str], name_format: str = "", text: str = "") -> None:
+        self.html_segments = html_segments
+        self.text_segments = split_template(text)
+        self.name_segments = split_template(name_format) if name_format else None
+        merge_slots = slot_names(html_segments) | slot_names(self.text_segments)
+        if self.name_segments:
+            merge_slots |= slot_names(self.name_segments)
+        self.needs_merge_fields = bool(merge_slots - {RECIPIENT_ID})
+
+    def html_for(self, contact_id: str, merge_fields: Optional[Mapping] = None) -> str:
+        ctx = merge_context(merge_fields, html=True) if self.needs_merge_fields else {}
+        ctx[RECIPIENT_ID] = contact_id
+        return render(self.html_segments, ctx)
+
+    def text_for(self, contact_id: str, merge_fields: Optional[Mapping] = None) -> str:
+        ctx = merge_context(merge_fields) if self.needs_merge_fields else {}
+        ctx[RECIPIENT_ID] = contact_id
+        return render(self.text_segments, ctx)
+
+    def to_name_for(self, merge_fields: Optional[Mapping] = None) -> str:
+        if not self.name_segments:
+            return ""
+        return render(self.name_segments, merge_context(merge_fields)).strip()
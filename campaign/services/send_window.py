@@ -0,0 +1,125 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from django.conf import settings
+
+from .redis_service import conn, window_key
+
+
+# Every finished chunk reports what it saw. The window (chunks in flight) and
+# the chunk size grow additively while the relay keeps up and are cut
+# multiplicatively on a deferral or a burst of errors, like TCP congestion
+# control. The per-message latency is tracked as an EWMA; above the target the
+# window shrinks by one step instead of growing.
+_AIMD_LUA = """
+local cfg = {}
+for i = 5, #ARGV do cfg[#cfg + 1] = tonumber(ARGV[i]) end
+local init_w, min_w, max_w, init_c, min_c, max_c, inc_w, inc_c, decrease, target, err_max, ttl = unpack(cfg)
+local sent, failed, deferred, latency = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local st = redis.call('HMGET', KEYS[1], 'inflight', 'chunk_size', 'latency_ms')
+local w = tonumber(st[1]) or init_w
+local c = tonumber(st[2]) or init_c
+local ewma = tonumber(st[3]) or latency
+local attempted = sent + failed + deferred
+if attempted > 0 then
+  ewma = 0.8 * ewma + 0.2 * latency
+  local mode
+  if deferred > 0 or failed / attempted > err_max then
+    w = math.max(min_w, w * decrease)
+    c = math.max(min_c, math.floor(c * decrease))
+    mode = 'decrease'
+  elseif ewma > target then
+    w = math.max(min_w, w - inc_w)
+    mode = 'slow'
+  else
+    -- +inc per window's worth of reports, i.e. per round-trip of the whole window
+    w = math.min(max_w, w + inc_w / w)
+    c = math.min(max_c, c + inc_c / w)
+    mode = 'increase'
+  end
+  redis.call('HSET', KEYS[1], 'inflight', tostring(w), 'chunk_size', tostring(c),
+             'latency_ms', tostring(ewma), 'mode', mode)
+  redis.call('HINCRBY', KEYS[1], 'sent', sent)
+  redis.call('HINCRBY', KEYS[1], 'failed', failed)
+  redis.call('HINCRBY', KEYS[1], 'deferred', deferred)
+  redis.call('EXPIRE', KEYS[1], ttl)
+end
+return {tostring(w), tostring(c)}
+"""
+
+_script = None
+
+# the learned window outlives a send so a resumed or re-sent campaign starts warm
+WINDOW_TTL = 7 * 24 * 3600
+
+_DEFAULTS = {
+    "initial_inflight": 3, "min_inflight": 1, "max_inflight": 16,
+    "initial_chunk": 30, "min_chunk": 10, "max_chunk": 200,
+    "inflight_step": 1, "chunk_step": 5,
+    "decrease": 0.5,
+    "latency_target_ms": 2000,
+    "error_rate_max": 0.2,
+}
+_ORDER = ["initial_inflight", "min_inflight", "max_inflight", "initial_chunk", "min_chunk", "max_chunk",
+          "inflight_step", "chunk_step", "decrease", "latency_target_ms", "error_rate_max"]
+
+
+def _aimd():
+    global _script
+    if _script is None:
+        _script = conn().register_script(_AIMD_LUA)
+    return _script
+
+
+def window_config() -> Dict[str, float]:
+    cfg = {**_DEFAULTS, **getattr(settings, "SEND_WINDOW", {})}
+    if getattr(settings, "SEND_ENGINE", "sync") == "async":
+        # one async chunk feeds many SMTP sessions, so it starts (and may grow) larger
+        cfg["initial_chunk"] = getattr(settings, "ASYNC_SEND_CHUNK_SIZE", cfg["initial_chunk"])
+        cfg["max_chunk"] = max(cfg["max_chunk"], cfg["initial_chunk"] * 4)
+    return cfg
+
+
+@dataclass
+class ChunkReport:
+    """What one send_campaign_chunk run observed."""
+    sent: int = 0
+    failed: int = 0
+    deferred: int = 0
+    processed: int = 0
+    smtp_seconds: float = 0.0   # summed time spent in SMTP transactions
+    requeued: bool = False      # rate-limited remainder rescheduled, keeps its in-flight slot
+    deliveries: List[tuple] = field(default_factory=list)  # ledger.Outcome rows
+    retry: List[tuple] = field(default_factory=list)       # (record, smtp code) of transient failures
+    bounced: List[str] = field(default_factory=list)       # contact ids to clean
+
+    @property
+    def attempted(self) -> int:
+        return self.sent + self.failed + self.deferred
+
+
+def record(campaign_id: str, report: ChunkReport) -> Dict[str, int]:
+    """Feed one chunk's outcome into the campaign's window; returns the new sizes."""
+    cfg = window_config()
+    latency_ms = report.smtp_seconds * 1000 / report.attempted if report.attempted else 0
+    args = [report.sent, report.failed, report.deferred, latency_ms]
+    args += [cfg[name] for name in _ORDER] + [WINDOW_TTL]
+    w, c = _aimd()(keys=[window_key(campaign_id)], args=args)
+    return {"max_inflight": int(float(w)), "chunk_size": int(float(c))}
+
+
+def current(campaign_id: str) -> Dict:
+    """The dispatcher's sizes plus the signals behind them (for the API)."""
+    cfg = window_config()
+    raw = conn().hgetall(window_key(campaign_id))
+    st = {k.decode(): v.decode() for k, v in raw.items()}
+    return {
+        "max_inflight": int(float(st.get("inflight", cfg["initial_inflight"]))),
+        "chunk_size": int(float(st.get("chunk_size", cfg["initial_chunk"]))),
+        "latency_ms": round(float(st.get("latency_ms", 0)), 1),
+        "mode": st.get("mode", "initial"),
+        "sent": int(st.get("sent", 0)),
+        "failed": int(st.get("failed", 0)),
+        "deferred": int(st.get("deferred", 0)),
+    }
@@ -0,0 +1,173 @@
+from __future__ import annotations
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+
+# ------------ Config ------------
+def _max_connections() -> int:
+    return int(getattr(settings, "SMTP_POOL_MAX_CONNECTIONS", 4))
+
+def _max_messages() -> int:
+    return int(getattr(settings, "SMTP_POOL_MAX_MESSAGES_PER_CONNECTION", 500))
+
+def _max_idle() -> float:
+    return float(getattr(settings, "SMTP_POOL_MAX_IDLE_SECONDS", 60))
+
+
+class PooledConnection:
+    """An email backend checked out of the pool plus its usage bookkeeping."""
+
+    def __init__(self, backend) -> None:
+        self.backend = backend
+        self.messages_sent = 0
+        self.opened_at = time.monotonic()
+        self.last_used_at = self.opened_at
+
+    def is_healthy(self) -> bool:
+        if time.monotonic() - self.last_used_at > _max_idle():
+            return False
+        smtp = getattr(self.backend, "connection", None)
+        if smtp is None:
+            # non-SMTP backends (console/locmem) have nothing to probe
+            return not hasattr(self.backend, "connection")
+        try:
+            return smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def recycle(self) -> None:
+        """
+        Drop the underlying session. The fresh one is opened lazily, by the next
+        checkout or send, so a relay that refuses to reconnect fails that send
+        rather than the one that just went through.
+        """
+        close_quietly(self.backend)
+        self.messages_sent = 0
+        self.opened_at = self.last_used_at = time.monotonic()
+
+
+def close_quietly(backend) -> None:
+    try:
+        backend.close()
+    except Exception:
+        pass
+
+
+class SMTPConnectionPool:
+    """
+    Per-process pool of open email backends.
+    Connections are reused across chunks and campaigns, health-checked on
+    checkout and recycled once they hit the per-connection message cap.
+    """
+
+    def __init__(self, max_connections: int, max_messages: int) -> None:
+        self.max_connections = max_connections
+        self.max_messages = max_messages
+        self._idle: List[PooledConnection] = []
+        self._in_use: Dict[int, PooledConnection] = {}
+        self._cond = threading.Condition()
+
+    @property
+    def size(self) -> int:
+        return len(self._idle) + len(self._in_use)
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        with self._cond:
+            while not self._idle and len(self._in_use) >= self.max_connections:
+                if not self._cond.wait(timeout):
+                    raise TimeoutError("SMTP pool exhausted")
+            pc = self._idle.pop() if self._idle else None
+            if pc is None:
+                pc = PooledConnection(get_connection())
+            self._in_use[id(pc.backend)] = pc
+
+        if not pc.is_healthy():
+            pc.recycle()
+        try:
+            pc.backend.open()
+        except Exception:
+            self.release(pc, discard=True)
+            raise
+        return pc
+
+    def release(self, pc: PooledConnection, *, discard: bool = False) -> None:
+        if discard or pc.messages_sent >= self.max_messages:
+            close_quietly(pc.backend)
+            discard = True
+        with self._cond:
+            self._in_use.pop(id(pc.backend), None)
+            if not discard:
+                pc.last_used_at = time.monotonic()
+                self._idle.append(pc)
+            self._cond.notify()
+
+    def note_sent(self, backend, ok: bool = True) -> None:
+        """Count a message on `backend`; recycle the session when the cap is reached."""
+        pc = self._in_use.get(id(backend))
+        if pc is None:
+            return
+        pc.last_used_at = time.monotonic()
+        if ok:
+            pc.messages_sent += 1
+        if pc.messages_sent >= self.max_messages:
+            pc.recycle()
+
+    def discard_broken(self, backend) -> None:
+        """Close a session the server dropped under us; the next send reopens it."""
+        pc = self._in_use.get(id(backend))
+        if pc is not None:
+            pc.recycle()
+
+    def close_all(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for pc in idle:
+            close_quietly(pc.backend)
+
+    @contextmanager
+    def connection(self):
+        pc = self.acquire()
+        broken = False
+        try:
+            yield pc.backend
+        except Exception:
+            broken = True
+            raise
+        finally:
+            self.release(pc, discard=broken)
+
+
+# ------------ Per-process singleton ------------
+_pool: Optional[SMTPConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SMTPConnectionPool:
+    """Return this process' pool; a forked child never inherits the parent's sockets."""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = SMTPConnectionPool(_max_connections(), _max_messages())
+                _pool_pid = pid
+    return _pool
+
+
+def connection():
+    return get_pool().connection()
+
+
+def reset_pool() -> None:
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close_all()
+        _pool, _pool_pid = None, None
@@ -0,0 +1,161 @@
+from __future__ import annotations
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import time
+from typing import Dict, List
+
+from django.conf import settings
+
+from .redis_service import conn, profiles_key, stages_key
+
+logger = logging.getLogger(__name__)
+
+
+# Opt-in breakdown of where send_campaign_chunk spends its time
+# (SEND_PROFILING["enabled"]). A chunk calls timer.lap(stage) after each step;
+# the time since the previous lap is charged to that stage. At the end one
+# pipeline adds the chunk's totals to campaign:<id>:stages, so the summary is
+# an average over every chunk of the send. A sample_rate share of chunks also
+# runs under cProfile: the top functions go to campaign:<id>:profiles and the
+# full stats to dump_dir when set (open them with pstats or snakeviz).
+#
+# Off, timer() hands out a shared no-op object, so the cost per message is one
+# empty method call.
+_DEFAULTS = {"enabled": False, "sample_rate": 0.0, "dump_dir": "", "keep": 20}
+STAGES = ("claim", "fetch", "prepare", "merge_fields", "control", "rate_limit", "build", "smtp", "settle", "ack")
+SUMMARY_TTL = 7 * 24 * 3600
+TOP_FUNCTIONS = 15
+
+
+def profiling_config() -> Dict:
+    return {**_DEFAULTS, **getattr(settings, "SEND_PROFILING", {})}
+
+
+class StageTimer:
+    enabled = True
+
+    def __init__(self) -> None:
+        self.started = self._mark = time.perf_counter()
+        self.totals: Dict[str, float] = {}
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.totals[stage] = self.totals.get(stage, 0.0) + now - self._mark
+        self._mark = now
+
+    def wall(self) -> float:
+        return time.perf_counter() - self.started
+
+
+class _NoTimer:
+    enabled = False
+
+    def lap(self, stage: str) -> None:
+        pass
+
+
+NO_TIMER = _NoTimer()
+
+
+def timer() -> StageTimer | _NoTimer:
+    return StageTimer() if profiling_config()["enabled"] else NO_TIMER
+
+
+def start_profile() -> cProfile.Profile | None:
+    """A running profiler for a sampled chunk, else None."""
+    cfg = profiling_config()
+    if not cfg["enabled"] or random.random() >= float(cfg["sample_rate"]):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # another profiler is active in this process (threaded pool)
+        return None
+    return profiler
+
+
+def finish(campaign_id: str, lane: str, t: StageTimer | _NoTimer, messages: int,
+           profiler: cProfile.Profile | None = None) -> None:
+    """Add one chunk's stage times to the campaign summary; store the profile if it was sampled."""
+    if profiler is not None:
+        profiler.disable()
+    if not t.enabled:
+        return
+    key = stages_key(campaign_id)
+    p = conn().pipeline(transaction=False)
+    for stage, seconds in t.totals.items():
+        p.hincrbyfloat(key, stage, round(seconds * 1000, 3))
+    p.hincrbyfloat(key, "wall", round(t.wall() * 1000, 3))
+    p.hincrby(key, "chunks", 1)
+    p.hincrby(key, "messages", messages)
+    p.expire(key, SUMMARY_TTL)
+    try:
+        if profiler is not None:
+            _push_profile(p, campaign_id, lane, messages, profiler)
+        p.execute()
+    except Exception as e:
+        # diagnostics must never fail a chunk
+        logger.warning("stage timing not recorded: %s", e)
+
+
+def _push_profile(p, campaign_id: str, lane: str, messages: int, profiler: cProfile.Profile) -> None:
+    cfg = profiling_config()
+    at = int(time.time() * 1000)
+    path = ""
+    if cfg["dump_dir"]:
+        os.makedirs(cfg["dump_dir"], exist_ok=True)
+        path = os.path.join(cfg["dump_dir"], f"{campaign_id}-{at}-{lane}.prof")
+        profiler.dump_stats(path)
+    stats = pstats.Stats(profiler).stats
+    top = sorted(stats.items(), key=lambda kv: -kv[1][3])[:TOP_FUNCTIONS]
+    entry = {
+        "at": at, "lane": lane, "messages": messages, "path": path,
+        "top": [
+            {"function": f"{func} ({os.path.basename(filename)}:{line})", "calls": ncalls,
+             "own_ms": round(tottime * 1000, 3), "cumulative_ms": round(cumtime * 1000, 3)}
+            for (filename, line, func), (_, ncalls, tottime, cumtime, _) in top
+        ],
+    }
+    key = profiles_key(campaign_id)
+    p.lpush(key, json.dumps(entry))
+    p.ltrim(key, 0, int(cfg["keep"]) - 1)
+    p.expire(key, SUMMARY_TTL)
+
+
+def summary(campaign_id: str) -> Dict:
+    """Per-stage totals and averages for the campaign's chunks, plus the latest sampled profiles."""
+    p = conn().pipeline(transaction=False)
+    p.hgetall(stages_key(campaign_id))
+    p.lrange(profiles_key(campaign_id), 0, -1)
+    raw, profiles = p.execute()
+    totals = {k.decode(): float(v) for k, v in raw.items()}
+    chunks = int(totals.pop("chunks", 0))
+    messages = int(totals.pop("messages", 0))
+    wall = totals.pop("wall", 0.0)
+    # whatever no lap covered (bookkeeping between stages) shows up as "other"
+    totals["other"] = max(0.0, wall - sum(totals.values()))
+
+    stages: List[Dict] = []
+    order = {name: n for n, name in enumerate(STAGES + ("other",))}
+    for stage in sorted(totals, key=lambda s: order.get(s, len(order))):
+        ms = totals[stage]
+        stages.append({
+            "stage": stage,
+            "total_ms": round(ms, 1),
+            "per_chunk_ms": round(ms / chunks, 3) if chunks else 0.0,
+            "per_message_ms": round(ms / messages, 3) if messages else 0.0,
+            "share": round(ms / wall, 3) if wall else 0.0,
+        })
+    return {
+        "enabled": profiling_config()["enabled"],
+        "chunks": chunks,
+        "messages": messages,
+        "wall_ms": round(wall, 1),
+        "stages": stages,
+        "profiles": [json.loads(entry) for entry in profiles],
+    }
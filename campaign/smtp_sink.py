@@ -0,0 +1,148 @@
+"""
+Minimal local SMTP sink for benchmarks and load experiments.
+
+Accepts everything, stores nothing but counters. `handshake_delay` is added
+once per connection to stand in for the TCP + TLS + AUTH cost of a real relay.
+
+For tests it can also keep the received messages (`keep_messages`), leave
+PIPELINING out of its EHLO reply, answer RCPT for chosen addresses with a
+canned reply (`rcpt_replies`) or hang up on them (`drop_rcpt`).
+"""
+from __future__ import annotations
+import socketserver
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class SinkStats:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        self.recipients = 0
+        self.bytes = 0
+        self.messages_kept: List[Tuple[str, str, bytes]] = []   # (MAIL FROM, RCPT TO, body)
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            return {
+                "connections": self.connections,
+                "messages": self.messages,
+                "recipients": self.recipients,
+                "bytes": self.bytes,
+            }
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self) -> None:
+        server: SMTPSink = self.server  # type: ignore[assignment]
+        with server.stats.lock:
+            server.stats.connections += 1
+        if server.handshake_delay:
+            time.sleep(server.handshake_delay)
+        self._reply("220 sink ESMTP ready")
+        mail_from, rcpt_to = "", []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            cmd = raw.decode("ascii", "replace").strip()
+            verb = cmd.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                pipelining = b"250-PIPELINING\r\n" if server.pipelining else b""
+                self.wfile.write(b"250-sink\r\n" + pipelining + b"250-8BITMIME\r\n250 SIZE 52428800\r\n")
+            elif verb == "HELO":
+                self._reply("250 sink")
+            elif verb == "MAIL":
+                mail_from, rcpt_to = _address(cmd), []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                to = _address(cmd)
+                if to in server.drop_rcpt:
+                    return
+                if to in server.rcpt_replies:
+                    self._reply(server.rcpt_replies[to])
+                    continue
+                with server.stats.lock:
+                    server.stats.recipients += 1
+                rcpt_to.append(to)
+                self._reply("250 OK")
+            elif verb in {"RSET", "NOOP"}:
+                mail_from, rcpt_to = "", []
+                self._reply("250 OK")
+            elif verb == "DATA":
+                if not rcpt_to:
+                    self._reply("554 5.5.1 No valid recipients")
+                    continue
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                size, lines = 0, []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line in (b".\r\n", b".\n"):
+                        break
+                    size += len(line)
+                    if server.keep_messages:
+                        # undo the client's dot-stuffing
+                        lines.append(line[1:] if line.startswith(b".") else line)
+                if server.message_delay:
+                    time.sleep(server.message_delay)
+                with server.stats.lock:
+                    server.stats.messages += 1
+                    server.stats.bytes += size
+                    if server.keep_messages:
+                        server.stats.messages_kept.append((mail_from, rcpt_to[0], b"".join(lines)))
+                mail_from, rcpt_to = "", []
+                self._reply("250 OK queued")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+def _address(cmd: str) -> str:
+    return cmd.partition("<")[2].partition(">")[0].lower()
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # async engine benchmarks open dozens of sessions at once
+    request_queue_size = 128
+
+    def __init__(self, address: Tuple[str, int] = ("127.0.0.1", 0), *,
+                 handshake_delay: float = 0.0, message_delay: float = 0.0, pipelining: bool = True,
+                 keep_messages: bool = False, rcpt_replies: Optional[Dict[str, str]] = None,
+                 drop_rcpt: Iterable[str] = ()) -> None:
+        super().__init__(address, _SMTPHandler)
+        self.handshake_delay = handshake_delay
+        self.message_delay = message_delay
+        self.pipelining = pipelining
+        self.keep_messages = keep_messages
+        self.rcpt_replies = {to.lower(): reply for to, reply in (rcpt_replies or {}).items()}
+        self.drop_rcpt = {to.lower() for to in drop_rcpt}
+        self.stats = SinkStats()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> "SMTPSink":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "SMTPSink":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -1,109 +1,523 @@
 from celery import shared_task
-from django.core.mail import get_connection
-from django.db.models import F
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from collections import Counter
 from typing import List, Dict
+import logging
+import time
+from smtplib import SMTPException
 from .redis_keys import recipients_key, inflight_key, lock_key
 from .redis_client import r, redis_lock
 
-from campaign.models import Campaign, CampaignStatus
-from campaign.services import email_service, exceptions, redis_service, dispatcher_service
+from campaign.models import Campaign, CampaignStatus, DeliveryStatus
+from campaign.services.lanes import DEFAULT_LANE, domain_of
+from campaign.services import email_service, exceptions, redis_service, dispatcher_service, smtp_pool, rate_limiter, control
+from campaign.services import mime_builder, async_sender, send_window, ledger, fair_share, progress, events, metrics, stage_timing
+from campaign.services import local_time
+from audience.services import suppression
 
+logger = logging.getLogger(__name__)
 
-CHUNK_SIZE = 30
-MAX_INFLIGHT_CHUNKS = 3
-PER_EMAIL_SLEEP = 0.6      # ≈300 emails/min total per campaign (≈5/sec)
-TASK_RATE = "1000/m"       # or None; let sleep control throughput
 
+# Chunk size and in-flight window adapt per campaign (SEND_WINDOW settings, services.send_window).
+MATERIALIZE_BATCH_SIZE = 1000
+# Throughput is capped by the Redis token buckets (SEND_RATE_* settings), not by sleeping.
+
+
+def _unsent_batches(campaign: Campaign, plan: local_time.Plan | None = None, suppress: List[str] = ()):
+    """
+    (bucket, recipients) batches minus suppressed addresses and anyone the
+    ledger already has as sent (a resumed send). bucket is the UTC offset for
+    local-time sends, else None.
+    """
+    qs = email_service.recipient_qs_for(campaign)
+    if plan is None:
+        for batch in email_service.iter_recipients(qs, batch_size=MATERIALIZE_BATCH_SIZE):
+            batch = ledger.drop_sent(str(campaign.id), suppression.drop_suppressed(suppress, batch))
+            if batch:
+                yield None, batch
+        return
+    for rows in email_service.iter_recipients(plan.annotate(qs), batch_size=MATERIALIZE_BATCH_SIZE, extra="bucket"):
+        for bucket, batch in local_time.split(rows).items():
+            batch = ledger.drop_sent(str(campaign.id), suppression.drop_suppressed(suppress, batch))
+            if batch:
+                yield bucket, batch
+
+def _queue_batch(campaign_id: str, bucket: int | None, batch, first_ordinal: int, plan: local_time.Plan | None) -> None:
+    if bucket is None or plan.is_due(bucket):
+        redis_service.append_recipients(campaign_id, batch, first_ordinal=first_ordinal)
+    else:
+        redis_service.stage_recipients(campaign_id, batch, first_ordinal, bucket, plan.release_ms(bucket))
 
 @shared_task(bind=True, max_retries=3)
 def kickoff_campaign_send(self, campaign_id: str) -> Dict:
 
     try:
         campaign = Campaign.objects.get(pk=campaign_id)
-        emails = email_service.distinct_emails(email_service.recipient_qs_for(campaign))
     except Campaign.DoesNotExist:
         return {"detail": "Campaign not found"}
-    except exceptions.ZeroRecipients:
+
+    plan = None
+    if campaign.per_recipient_local_time:
+        # "9am local": one GROUP BY over the recipients' zones decides the buckets
+        plan = local_time.plan_for(campaign, email_service.recipient_qs_for(campaign))
+    # global suppression lists plus the campaign's own, checked in Redis per batch
+    suppress = suppression.lists_for(campaign)
+    suppression.ensure_mirrored(suppress)
+    batches = _unsent_batches(campaign, plan, suppress)
+    bucket, first = next(batches, (None, None))
+    if not first:
+        # everyone is suppressed, unsubscribed or already sent: nothing will ever finalize it
+        with transaction.atomic():
+            c = Campaign.objects.select_for_update().get(pk=campaign_id)
+            if c.status == CampaignStatus.Sending:
+                c.mark_sent()
+                c.save(update_fields=["status", "completed_at"])
+        control.publish(campaign_id, CampaignStatus.Completed)
         return {"detail": "No valid recipients found"}
 
-    redis_service.init_state(campaign_id, emails)
+    already_sent = ledger.sent_count(campaign_id)
+    redis_service.init_state(campaign_id)
+    _queue_batch(campaign_id, bucket, first, 0, plan)
+    progress.start(campaign_id, already_sent)
+    progress.add_queued(campaign_id, len(first))
+    ledger.mark_queued(campaign_id, [cid for cid, _ in first])
+    control.publish(campaign_id, CampaignStatus.Sending)
 
     with transaction.atomic():
         campaign.mark_sending()
-        campaign.estimated_recipients = len(emails)
-        campaign.emails_sent = 0
-        campaign.save(update_fields=["status", "started_sending_at", "estimated_recipients", "emails_sent"])
+        campaign.emails_sent = already_sent
+        campaign.save(update_fields=["status", "started_sending_at", "emails_sent"])
+
+    # make room for the newcomer now rather than at the next beat, then start
+    # sending while the rest of the audience streams in
+    rebalance_send_shares.delay()
+    dispatch_next_chunk.delay(campaign_id)
 
+    queued = len(first)
+    for bucket, batch in batches:
+        _queue_batch(campaign_id, bucket, batch, queued, plan)
+        progress.add_queued(campaign_id, len(batch))
+        ledger.mark_queued(campaign_id, [cid for cid, _ in batch])
+        queued += len(batch)
+        if redis_service.get_inflight(campaign_id) == 0:
+            # the dispatcher drained the queue and went idle; wake it up
+            dispatch_next_chunk.delay(campaign_id)
+    redis_service.finish_loading(campaign_id)
+
+    Campaign.objects.filter(pk=campaign_id).update(estimated_recipients=queued + already_sent)
     dispatch_next_chunk.delay(campaign_id)
-    return {"queued_recipients": len(emails)}
+    result = {"queued_recipients": queued, "already_sent": already_sent}
+    if plan is not None:
+        result["local_time_buckets"] = plan.summary()
+    return result
+
 
+def _schedule_chunk(campaign_id: str, emails_chunk: List[str], lane: str, lease_id: str) -> None:
+    send_campaign_chunk.apply_async(args=[campaign_id, emails_chunk, lane, lease_id])
+    metrics.dispatched.labels(lane).inc()
 
-def _schedule_chunk(campaign_id: str, emails_chunk: List[str]) -> None:
-    send_campaign_chunk.apply_async(args=[campaign_id, emails_chunk])
+def _requeue_later(campaign_id: str, records: List[str], lane: str, lease_id: str | None, wait: float) -> None:
+    """Retry a rate-limited remainder once the buckets refill; it keeps its lease and in-flight slot."""
+    redis_service.renew_lease(campaign_id, lease_id, lane, records, wait + redis_service.lease_seconds())
+    # the retry claims them again
+    redis_service.release_records(campaign_id, records)
+    send_campaign_chunk.apply_async(args=[campaign_id, records, lane, lease_id], countdown=wait)
+
+def _note_failure(report: send_window.ChunkReport, record: str, code: int | None, message: str) -> None:
+    """Route one failed send: retry queue (transient), cleaned contact (bounce) or plain failure."""
+    kind = email_service.classify(code, message)
+    if kind == email_service.TRANSIENT:
+        report.retry.append((record, code))
+        return
+    contact_id = redis_service.unpack_recipient(record)[0]
+    report.deliveries.append((contact_id, DeliveryStatus.Failed, code))
+    if kind == email_service.BOUNCE:
+        report.bounced.append(contact_id)
+
+def _settle_retries(campaign_id: str, lane: str, report: send_window.ChunkReport) -> None:
+    """Hand transient failures to the retry queue; those out of attempts are recorded as failed."""
+    if not report.retry:
+        return
+    codes = dict(report.retry)
+    scheduled, exhausted = redis_service.schedule_retries(campaign_id, list(codes), lane)
+    for status, records in ((DeliveryStatus.Deferred, scheduled), (DeliveryStatus.Failed, exhausted)):
+        for record in records:
+            report.deliveries.append((redis_service.unpack_recipient(record)[0], status, codes[record]))
+
+def _domain(record: str) -> str:
+    return domain_of(redis_service.unpack_recipient(record)[1])
+
+def _parked_domains(lane: str, records: List[str]) -> Dict[str, int]:
+    # only the catch-all lane parks per domain; a named lane is parked as a whole by the dispatcher
+    if lane != DEFAULT_LANE:
+        return {}
+    return redis_service.parked_domains({_domain(record) for record in records})
+
+def _back_off(lane: str, record: str, error, parked: Dict[str, int]) -> None:
+    """
+    Park after a throttling reply: the whole lane for a named provider, only the
+    recipient's domain in the catch-all lane, which mixes every other provider.
+    """
+    if lane != DEFAULT_LANE:
+        logger.warning("lane %s parked for %ss: %s", lane, redis_service.park_lane(lane), error)
+        return
+    domain = _domain(record)
+    parked[domain] = redis_service.park_domain(domain)
+    logger.warning("domain %s parked for %ss: %s", domain, parked[domain], error)
+
+def _split_parked(records: List[str], parked: Dict[str, int]):
+    """-> (records to send, {record: seconds} to hold until their domain unparks)."""
+    if not parked:
+        return list(records), {}
+    send, held = [], {}
+    for record in records:
+        ttl = parked.get(_domain(record))
+        if ttl:
+            held[record] = ttl
+        else:
+            send.append(record)
+    return send, held
 
 @shared_task(bind=True, max_retries=3)
 def dispatch_next_chunk(self, campaign_id: str) -> Dict:
-    return dispatcher_service.svc_dispatch(
-        campaign_id,
-        chunk_size=CHUNK_SIZE,
-        max_inflight=MAX_INFLIGHT_CHUNKS,
-        schedule_chunk=_schedule_chunk,
-    )
-
-@shared_task(bind=True, rate_limit=TASK_RATE, max_retries=3, acks_late=True)
-def send_campaign_chunk(self, campaign_id: str, emails_chunk: List[str]) -> Dict:
-    sent = 0
+    result = dispatcher_service.svc_dispatch(campaign_id, schedule_chunk=_schedule_chunk)
+    retry_in = result.get("retry_in")
+    if retry_in and redis_service.claim_wakeup(campaign_id, retry_in):
+        dispatch_next_chunk.apply_async(args=[campaign_id], countdown=retry_in)
+    return result
+
+def _send_chunk_sync(campaign_id: str, emails_chunk: List[str], lane: str, lease_id: str | None,
+                     prepared, merge_fields: Dict, buckets, timer, lease) -> send_window.ChunkReport:
+    """One message at a time over a pooled connection."""
+    report = send_window.ChunkReport()
+    tokens = 0
+    parked = _parked_domains(lane, emails_chunk)
+    emails_chunk, held = _split_parked(emails_chunk, parked)
+    with smtp_pool.connection() as conn:
+        for i, record in enumerate(emails_chunk):
+            if not lease.beat():
+                # too slow: the reaper took the lease and requeued what's left
+                break
+            if parked and parked.get(_domain(record)):
+                # its domain was parked earlier in this chunk
+                held[record] = parked[_domain(record)]
+                continue
+            # cooperative pause/cancel, read from the Redis mirror (no DB query per email)
+            state = control.current_state(campaign_id)
+            timer.lap("control")
+            if state == CampaignStatus.Paused:
+                redis_service.push_back_front(campaign_id, emails_chunk[i:], lane)
+                break
+            if state == CampaignStatus.Canceled:
+                break
+
+            contact_id, email = redis_service.unpack_recipient(record)
+
+            if not tokens:
+                tokens, wait = rate_limiter.acquire(buckets, len(emails_chunk) - i)
+                timer.lap("rate_limit")
+                if not tokens:
+                    # out of tokens: free the worker and retry the remainder once the buckets refill
+                    _requeue_later(campaign_id, emails_chunk[i:], lane, lease_id, wait)
+                    report.requeued = True
+                    break
+            tokens -= 1
+            # count only records that reach the relay, not one a pause or requeue hands back
+            report.processed += 1
+
+            msg = prepared.message_for(email, contact_id, conn, merge_fields.get(contact_id))
+            timer.lap("build")
+            started = time.perf_counter()
+            try:
+                email_service.safe_send(msg, email)
+                redis_service.mark_sent(campaign_id, [record])
+                report.sent += 1
+                report.deliveries.append((contact_id, DeliveryStatus.Sent, 250))
+            except exceptions.SendFailed as e:
+                report.failed += 1
+                _note_failure(report, record, e.code, str(e))
+            except exceptions.Deferred as e:
+                # this recipient waits in the retry queue; a throttling reply also
+                # parks its lane (or domain) while the others keep going
+                report.deferred += 1
+                _note_failure(report, record, e.code, str(e))
+                if e.throttled:
+                    _back_off(lane, record, e, parked)
+                    if lane != DEFAULT_LANE:
+                        redis_service.push_back_front(campaign_id, emails_chunk[i + 1:], lane)
+                        break
+            finally:
+                elapsed = time.perf_counter() - started
+                report.smtp_seconds += elapsed
+                metrics.smtp_seconds.labels("sync").observe(elapsed)
+                timer.lap("smtp")
+    if not lease.lost:
+        redis_service.hold_records(campaign_id, lane, held)
+    return report
+
+def _send_chunk_async(campaign_id: str, emails_chunk: List[str], lane: str, lease_id: str | None,
+                      prepared, merge_fields: Dict, buckets, timer, lease) -> send_window.ChunkReport:
+    """Same contract as _send_chunk_sync, but each token grant is sent concurrently."""
+    engine = async_sender.get_engine()
+    stopping = {CampaignStatus.Paused, CampaignStatus.Canceled}
+    report = send_window.ChunkReport()
+    parked = _parked_domains(lane, emails_chunk)
+    pending, held = _split_parked(emails_chunk, parked)
+    while pending:
+        tokens, wait = rate_limiter.acquire(buckets, len(pending))
+        timer.lap("rate_limit")
+        if not tokens:
+            _requeue_later(campaign_id, pending, lane, lease_id, wait)
+            report.requeued = True
+            break
+        batch, pending = pending[:tokens], pending[tokens:]
+
+        jobs = []
+        for record in batch:
+            contact_id, email = redis_service.unpack_recipient(record)
+            data, to_addr = prepared.envelope_for(email, contact_id, merge_fields.get(contact_id))
+            jobs.append(async_sender.Job(record, prepared.from_addr, to_addr, data))
+        timer.lap("build")
+        # the engine polls this off the event loop, which doubles as the lease heartbeat
+        outcome = engine.run_chunk(jobs, lambda: not lease.beat() or control.current_state(campaign_id) in stopping)
+        timer.lap("smtp")
+        redis_service.mark_sent(campaign_id, [job.record for job in outcome.sent])
+        report.sent += len(outcome.sent)
+        report.failed += len(outcome.failed)
+        report.deferred += len(outcome.deferred)
+        report.processed += outcome.attempted
+        report.smtp_seconds += outcome.smtp_seconds
+        for job in outcome.sent:
+            report.deliveries.append((redis_service.unpack_recipient(job.record)[0], DeliveryStatus.Sent, 250))
+        for job in outcome.failed + outcome.deferred:
+            _note_failure(report, job.record, email_service.smtp_code(job.error), str(job.error))
+        for job in outcome.failed:
+            logger.info("send to %s failed: %s", job.to_addr, job.error)
+
+        throttled = [job for job in outcome.deferred
+                     if email_service.is_throttling(email_service.smtp_code(job.error), str(job.error))]
+        if throttled and lane != DEFAULT_LANE:
+            _back_off(lane, throttled[0].record, throttled[0].error, parked)
+            redis_service.push_back_front(campaign_id, outcome.not_attempted + pending, lane)
+            break
+        for job in throttled:
+            if _domain(job.record) not in parked:
+                _back_off(lane, job.record, job.error, parked)
+        if outcome.stopped:
+            # a lost lease's remainder is already back on the lane
+            if not lease.lost and control.current_state(campaign_id) == CampaignStatus.Paused:
+                redis_service.push_back_front(campaign_id, outcome.not_attempted + pending, lane)
+            break
+        # a throttling domain stopped the batch: the other domains carry on
+        pending, more_held = _split_parked(outcome.not_attempted + pending, parked)
+        held.update(more_held)
+    if not lease.lost:
+        redis_service.hold_records(campaign_id, lane, held)
+    return report
+
+def _abandon(campaign_id: str, lane: str, lease_id: str | None, claimed: List[str]) -> None:
+    try:
+        redis_service.abandon_chunk(campaign_id, lane, lease_id, claimed)
+    except Exception:
+        logger.exception("chunk %s of campaign %s not handed back; left to the reaper", lease_id, campaign_id)
+
+# acks_late is off on purpose: a lost chunk comes back through its lease
+# (reap_expired_chunks), not through a broker redelivery that would resend it.
+@shared_task(bind=True, max_retries=3, acks_late=False)
+def send_campaign_chunk(self, campaign_id: str, emails_chunk: List[str], lane: str = DEFAULT_LANE,
+                        lease_id: str | None = None) -> Dict:
+    # emails_chunk holds packed (contact_id, email) records, see redis_service.pack_recipient
+    requeued = settled = False
+    chunk_started = time.perf_counter()
+    # opt-in stage breakdown (SEND_PROFILING); a no-op object when off
+    timer, profiler = stage_timing.timer(), stage_timing.start_profile()
     processed = 0
+    # a redelivered or duplicated chunk skips whoever another run already holds or sent
+    claimed = redis_service.claim_records(campaign_id, emails_chunk, lane, lease_id)
+    lease = redis_service.LeaseKeeper(campaign_id, lease_id)
+    skipped = len(emails_chunk) - len(claimed)
+    timer.lap("claim")
     try:
         campaign = Campaign.objects.get(id=campaign_id)
-        compiled, text_fallback = email_service.get_campaign_content(campaign)
+        compiled, _ = email_service.get_campaign_content(campaign)
+        timer.lap("fetch")
         if not compiled:
-            redis_service.push_back_front(campaign_id, emails_chunk)
+            redis_service.push_back_front(campaign_id, claimed, lane)
+            settled = True
             return {"sent": 0, "detail": "no compiled content"}
 
-        id_by_email = email_service.map_contacts_by_email(emails_chunk)
-
-        from time import sleep
-        with get_connection() as conn:
-            for email in emails_chunk:
-                processed += 1
-                # cooperative pause
-                if Campaign.objects.only("status").get(pk=campaign_id).status == CampaignStatus.Paused:
-                    redis_service.push_back_front(campaign_id, emails_chunk[processed-1:])
-                    break
+        buckets = rate_limiter.buckets_for(campaign, lane)
+        template = email_service.get_campaign_template(campaign)
+        prepared = mime_builder.prepared_for(campaign, template)
+        timer.lap("prepare")
+        merge_fields = {}
+        if template.needs_merge_fields:
+            merge_fields = email_service.merge_fields_for(
+                redis_service.unpack_recipient(rec)[0] for rec in claimed
+            )
+            timer.lap("merge_fields")
 
-                contact_id = id_by_email.get(email.lower())
-                if not contact_id:
-                    continue
+        send = _send_chunk_async if async_sender.send_engine() == "async" else _send_chunk_sync
+        report = send(campaign_id, claimed, lane, lease_id, prepared, merge_fields, buckets, timer, lease)
+        requeued, processed = report.requeued, report.processed
+        _settle_retries(campaign_id, lane, report)
 
-                msg = email_service.build_email_message(
-                    campaign, email, contact_id, compiled, text_fallback, conn
-                )
-                if email_service.safe_send(msg, email):
-                    sent += 1
-                if PER_EMAIL_SLEEP:
-                    sleep(PER_EMAIL_SLEEP)
-
-        Campaign.objects.filter(id=campaign_id).update(emails_sent=F("emails_sent") + sent)
-        return {"sent": sent, "processed": processed}
+        if report.sent and not report.deferred:
+            redis_service.clear_lane_strikes(lane)
+        if report.attempted:
+            send_window.record(campaign_id, report)
+        ledger.record(campaign_id, report.deliveries)
+        email_service.mark_bounced(report.bounced)
+        # counters live in Redis and reach emails_sent via flush_send_progress
+        statuses = Counter(status for _, status, _ in report.deliveries)
+        counts = {"sent": report.sent, "failed": statuses[DeliveryStatus.Failed],
+                  "deferred": statuses[DeliveryStatus.Deferred]}
+        if not progress.record(campaign_id, **counts):
+            progress.add_sent_directly(campaign_id, report.sent)
+        events.progress(campaign_id, **counts)
+        metrics.record_chunk(lane, **counts)
+        timer.lap("settle")
+        settled = True
+        return {"sent": report.sent, "processed": report.processed, "skipped": skipped}
     except Campaign.DoesNotExist:
-        redis_service.push_back_front(campaign_id, emails_chunk)
+        redis_service.push_back_front(campaign_id, claimed, lane)
+        settled = True
         return {"sent": 0, "detail": "campaign gone"}
     finally:
-        try:
-            redis_service.decr_inflight(campaign_id)
-        finally:
-            # keep streaming until done/paused
+        metrics.chunk_seconds.labels(lane).observe(time.perf_counter() - chunk_started)
+        # a rate-limited remainder keeps this chunk's lease and in-flight slot
+        if not requeued:
+            try:
+                if settled:
+                    redis_service.ack_chunk(campaign_id, lane, lease_id)
+                else:
+                    # crashed (relay, DB, Redis): whatever wasn't sent goes back on the lane now;
+                    # if even that fails the lease stays and the reaper does it later
+                    _abandon(campaign_id, lane, lease_id, claimed)
+            finally:
+                # keep streaming until done/paused
+                dispatch_next_chunk.delay(campaign_id)
+        timer.lap("ack")
+        stage_timing.finish(campaign_id, lane, timer, processed, profiler)
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=5)
+def deliver_test_email(self, campaign_id: str, test_email: str) -> Dict:
+    """Transactional queue: a test send never waits behind bulk chunks."""
+    try:
+        campaign = Campaign.objects.get(pk=campaign_id)
+    except Campaign.DoesNotExist:
+        return {"detail": "Campaign not found"}
+    msg = email_service.build_test_message(campaign, test_email)
+    try:
+        msg.send(fail_silently=False)
+    except (SMTPException, OSError) as e:
+        if email_service.classify(email_service.smtp_code(e), str(e)) != email_service.TRANSIENT:
+            return {"detail": f"Rejected: {e}", "sent_to": test_email}
+        raise self.retry(exc=e)
+    return {"sent_to": test_email}
+
+@shared_task
+def flush_send_progress() -> Dict:
+    """Beat task: copy the Redis sent counters of active sends to Campaign.emails_sent."""
+    flushed = {}
+    active = Campaign.objects.filter(status__in=[CampaignStatus.Sending, CampaignStatus.Paused])
+    for campaign_id in active.values_list("id", flat=True):
+        total = progress.flush(str(campaign_id))
+        if total is not None:
+            flushed[str(campaign_id)] = total
+    return {"flushed": flushed}
+
+@shared_task
+def reap_expired_chunks() -> Dict:
+    """Beat task: put chunks whose worker died back on their lanes (see CHUNK_LEASE_SECONDS)."""
+    reaped = {}
+    active = Campaign.objects.filter(status__in=[CampaignStatus.Sending, CampaignStatus.Paused])
+    for campaign_id in active.values_list("id", flat=True):
+        n = redis_service.reap_expired(str(campaign_id))
+        if n:
+            reaped[str(campaign_id)] = n
+            dispatch_next_chunk.delay(str(campaign_id))
+    return {"reaped": reaped}
+
+@shared_task
+def rebalance_send_shares() -> Dict:
+    """Beat task: split the cluster's chunk budget across sending campaigns (see fair_share)."""
+    sending = list(Campaign.objects.filter(status=CampaignStatus.Sending)
+                   .values_list("id", "priority", "share_floor", "share_ceiling"))
+    window = send_window.window_config()["initial_inflight"]
+    limits = {str(cid): (lo, hi) for cid, _, lo, hi in sending if lo is not None or hi is not None}
+    shares = fair_share.rebalance([(str(cid), priority) for cid, priority, _, _ in sending], window, limits)
+    for campaign_id, s in shares.items():
+        if s["share"] > s["inflight"]:
+            # room to grow: the campaign's chain may be idle, give it a push
+            dispatch_next_chunk.delay(campaign_id)
+    return {cid: s["share"] for cid, s in shares.items()}
+
+@shared_task
+def release_local_time_buckets() -> Dict:
+    """Beat task: move local-time buckets whose send time has come onto the lanes (see local_time)."""
+    released = {}
+    for campaign_id in redis_service.due_local_campaigns():
+        n = redis_service.release_due_buckets(campaign_id)
+        if n:
+            released[campaign_id] = n
             dispatch_next_chunk.delay(campaign_id)
+    return {"released": released}
+
+def _kick_off(due) -> None:
+    # the task id is the one send_campaign handed out (send_job_id)
+    for campaign_id, job_id in due:
+        kickoff_campaign_send.apply_async(args=[str(campaign_id)], task_id=job_id)
+
+def _sweep_config() -> Dict[str, int]:
+    return {"batch": 200, "max_batches": 50, **getattr(settings, "SCHEDULED_SEND_SWEEP", {})}
+
+@shared_task
+def start_due_campaigns() -> Dict:
+    """
+    Beat task: start armed scheduled campaigns whose scheduled_at has passed,
+    local-time ones KICKOFF_LEAD early (see campaigns.send_campaign). Due rows are read a batch at a time with
+    FOR UPDATE SKIP LOCKED, so on Postgres overlapping sweeps split the work instead of waiting on each other.
+    sqlite ignores SKIP LOCKED, so the claim itself is a conditional UPDATE per row (Scheduled -> Sending):
+    only the sweep whose UPDATE hit the row kicks it off, and nothing starts twice. Nothing waits in worker memory.
+    """
+    cfg = _sweep_config()
+    started: List[str] = []
+    for _ in range(int(cfg["max_batches"])):
+        now = timezone.now()
+        with transaction.atomic():
+            due = list(
+                Campaign.objects.select_for_update(skip_locked=True)
+                .filter(status=CampaignStatus.Scheduled, scheduled_at__lte=now + local_time.KICKOFF_LEAD)
+                .filter(Q(per_recipient_local_time=True) | Q(scheduled_at__lte=now))
+                .exclude(send_job_id="")
+                .order_by("scheduled_at")
+                .values_list("id", "send_job_id")[:int(cfg["batch"])]
+            )
+            if not due:
+                break
+            claimed = [
+                (cid, job_id) for cid, job_id in due
+                if Campaign.objects.filter(id=cid, status=CampaignStatus.Scheduled).update(
+                    status=CampaignStatus.Sending, started_sending_at=timezone.now(),
+                )
+            ]
+            # queued only once the claim is committed
+            transaction.on_commit(lambda claimed=claimed: _kick_off(claimed))
+        started += [str(cid) for cid, _ in claimed]
+        if len(due) < int(cfg["batch"]):
+            break
+    return {"started": started}
 
 # ------------- FINALIZE -------------
 @shared_task(bind=True, max_retries=3)
 def finalize_campaign_send(self, campaign_id: str) -> dict:
-    key = recipients_key(campaign_id)
-    inflight = inflight_key(campaign_id)
-    remaining = r().llen(key)
-    infl = int(r().get(inflight) or 0)
+    remaining = (redis_service.queue_len(campaign_id) + redis_service.retry_len(campaign_id)
+                 + redis_service.local_pending(campaign_id))
+    infl = redis_service.get_inflight(campaign_id)
     if remaining == 0 and infl == 0:
         with transaction.atomic():
             c = Campaign.objects.select_for_update().get(id=campaign_id)
@@ -111,6 +525,8 @@ def finalize_campaign_send(self, campaign_id: str) -> dict:
                 c.mark_sent()
                 c.save(update_fields=["status", "completed_at"])
         # clean
-        r().delete(key); r().delete(inflight)
+        progress.close(campaign_id)
+        redis_service.cleanup(campaign_id)
+        control.publish(campaign_id, CampaignStatus.Completed)
         return {"status": "completed"}
     return {"status": "not-done", "remaining": int(remaining), "inflight": infl}
@@ -0,0 +1,55 @@
+import uuid
+from unittest import mock
+
+import fakeredis
+
+from campaign.services import control, lanes, rate_limiter, redis_service, send_window
+
+
+class FakeRedisMixin:
+    """Points redis_service (and everything built on it) at a fresh in-memory Redis with Lua support."""
+
+    def setUp(self):
+        super().setUp()
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch.object(redis_service, "get_redis_connection", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # registered scripts and the control cache belong to the previous connection
+        for module in (rate_limiter, send_window):
+            patcher = mock.patch.object(module, "_script", None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        redis_service._scripts.clear()
+        control._cache.clear()
+        self.addCleanup(redis_service._scripts.clear)
+        self.addCleanup(control._cache.clear)
+
+
+CID = "00000000-0000-0000-0000-000000000001"
+LANES = {"gmail": {"domains": ["gmail.com"], "max_inflight": 2}}
+
+
+class SendStateMixin(FakeRedisMixin):
+    """
+    One campaign's send state in fake Redis, queued and dispatched the way
+    kickoff and dispatch_next_chunk do it. Use with override_settings(SEND_LANES=LANES).
+    """
+
+    def setUp(self):
+        super().setUp()
+        # the domain -> lane index is built from SEND_LANES on first use
+        lanes._domain_index.clear()
+        self.addCleanup(lanes._domain_index.clear)
+
+    def _load(self, gmail: int = 0, other: int = 0):
+        recipients = [(uuid.uuid4(), f"g{i}@gmail.com") for i in range(gmail)]
+        recipients += [(uuid.uuid4(), f"o{i}@corp.io") for i in range(other)]
+        redis_service.init_state(CID, recipients)
+        redis_service.set_control_state(CID, "sending")
+
+    def _dispatch(self, window: int = 10, chunk: int = 5, state: str = "sending"):
+        return redis_service.dispatch_chunks(CID, state=state, default_inflight=window, default_chunk=chunk)
+
+    def _expire(self, lease):
+        self.redis.zadd(redis_service.leases_key(CID), {lease: 0})
@@ -0,0 +1,110 @@
+from django.test import SimpleTestCase, override_settings
+
+from campaign.services.async_sender import AsyncEngine, Job
+from campaign.smtp_sink import SMTPSink
+
+
+def _message(n: int, body: bytes = b"Hello") -> bytes:
+    return b"Subject: test %d\r\nTo: u%d@example.com\r\n\r\n%s\r\n" % (n, n, body)
+
+
+class AsyncEngineTests(SimpleTestCase):
+    """AsyncEngine.run_chunk against the local SMTP sink."""
+
+    def _engine(self, concurrency: int = 1, **sink_options) -> SMTPSink:
+        sink = SMTPSink(keep_messages=True, **sink_options).start()
+        self.addCleanup(sink.stop)
+        settings = override_settings(
+            EMAIL_HOST="127.0.0.1", EMAIL_PORT=sink.port, EMAIL_USE_TLS=False, EMAIL_USE_SSL=False,
+            EMAIL_HOST_USER="", EMAIL_HOST_PASSWORD="", EMAIL_TIMEOUT=5,
+            ASYNC_SEND_CONCURRENCY=concurrency, CAMPAIGN_CONTROL_REFRESH_SECONDS=0.01,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.engine = AsyncEngine()
+        self.addCleanup(self.engine.close)
+        return sink
+
+    def _jobs(self, n: int):
+        return [Job(f"record-{i}", "me@example.com", f"u{i}@example.com", _message(i)) for i in range(n)]
+
+    def _run(self, jobs, should_stop=lambda: False):
+        return self.engine.run_chunk(jobs, should_stop)
+
+    def test_sends_with_pipelining(self):
+        sink = self._engine(concurrency=2)
+        outcome = self._run(self._jobs(6))
+        self.assertEqual(len(outcome.sent), 6)
+        self.assertEqual(outcome.not_attempted, [])
+        self.assertEqual(sink.stats.messages, 6)
+        self.assertTrue(all(session.pipelining for session in self.engine._idle))
+
+    def test_sends_without_pipelining(self):
+        sink = self._engine(pipelining=False)
+        outcome = self._run(self._jobs(3))
+        self.assertEqual(len(outcome.sent), 3)
+        self.assertEqual(sink.stats.messages, 3)
+        self.assertFalse(any(session.pipelining for session in self.engine._idle))
+        # one session carried the whole chunk
+        self.assertEqual(sink.stats.connections, 1)
+
+    def test_dot_stuffing(self):
+        sink = self._engine()
+        data = b"Subject: dots\r\n\r\n.leading dot\r\n..two dots\r\n.\r\nlast line"
+        outcome = self._run([Job("r", "me@example.com", "u@example.com", data)])
+        self.assertEqual(len(outcome.sent), 1)
+        _, to, body = sink.stats.messages_kept[0]
+        self.assertEqual(to, "u@example.com")
+        self.assertEqual(body, data + b"\r\n")
+
+    def test_deferral_stops_the_chunk(self):
+        sink = self._engine(rcpt_replies={"u1@example.com": "451 4.7.1 Try again later"})
+        jobs = self._jobs(4)
+        outcome = self._run(jobs)
+        self.assertEqual([job.record for job in outcome.sent], ["record-0"])
+        self.assertEqual([job.record for job in outcome.deferred], ["record-1"])
+        self.assertEqual(outcome.deferred[0].error.smtp_code, 451)
+        self.assertEqual(outcome.failed, [])
+        self.assertEqual(outcome.not_attempted, ["record-2", "record-3"])
+        self.assertEqual(sink.stats.messages, 1)
+
+    def test_recipient_deferral_keeps_going(self):
+        sink = self._engine(rcpt_replies={"u1@example.com": "452 4.2.2 Mailbox full"})
+        outcome = self._run(self._jobs(3))
+        self.assertEqual([job.record for job in outcome.sent], ["record-0", "record-2"])
+        self.assertEqual([job.record for job in outcome.deferred], ["record-1"])
+        self.assertEqual(outcome.not_attempted, [])
+        self.assertFalse(outcome.stopped)
+        self.assertEqual(sink.stats.messages, 2)
+
+    def test_permanent_failure_skips_the_recipient(self):
+        sink = self._engine(rcpt_replies={"u1@example.com": "550 5.1.1 No such user"})
+        outcome = self._run(self._jobs(3))
+        self.assertEqual([job.record for job in outcome.sent], ["record-0", "record-2"])
+        self.assertEqual([job.record for job in outcome.failed], ["record-1"])
+        self.assertEqual(outcome.failed[0].error.smtp_code, 550)
+        self.assertEqual(outcome.deferred, [])
+        # the session survives a rejected recipient
+        self.assertEqual(sink.stats.connections, 1)
+
+    def test_dropped_connection_fails_the_message_and_reconnects(self):
+        sink = self._engine(drop_rcpt=["u1@example.com"])
+        outcome = self._run(self._jobs(3))
+        self.assertEqual([job.record for job in outcome.sent], ["record-0", "record-2"])
+        self.assertEqual([job.record for job in outcome.failed], ["record-1"])
+        self.assertEqual(sink.stats.connections, 2)
+
+    def test_should_stop_before_the_chunk(self):
+        sink = self._engine()
+        outcome = self._run(self._jobs(3), should_stop=lambda: True)
+        self.assertTrue(outcome.stopped)
+        self.assertEqual(outcome.not_attempted, ["record-0", "record-1", "record-2"])
+        self.assertEqual(sink.stats.connections, 0)
+
+    def test_should_stop_mid_chunk(self):
+        sink = self._engine(message_delay=0.05)
+        outcome = self._run(self._jobs(20), should_stop=lambda: sink.stats.messages >= 1)
+        self.assertTrue(outcome.stopped)
+        self.assertTrue(outcome.not_attempted)
+        self.assertEqual(outcome.attempted + len(outcome.not_attempted), 20)
+        self.assertEqual(len(outcome.sent), sink.stats.messages)
@@ -0,0 +1,120 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+
+from audience.models import Audience
+from django.utils import timezone
+
+from campaign import tasks
+from campaign.models import Campaign, CampaignStatus
+from campaign.services import campaigns, exceptions
+
+from .fake_redis import FakeRedisMixin
+
+
+class PauseResumeTests(FakeRedisMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.audience = Audience.objects.create(name="list")
+
+    def _campaign(self, status):
+        return Campaign.objects.create(title=f"c{Campaign.objects.count()}", audience=self.audience, status=status)
+
+    def test_pause_only_from_sending(self):
+        c = self._campaign(CampaignStatus.Sending)
+        campaigns.pause_campaign(c.id)
+        c.refresh_from_db()
+        self.assertEqual(c.status, CampaignStatus.Paused)
+        for status in (CampaignStatus.Draft, CampaignStatus.Scheduled, CampaignStatus.Paused,
+                       CampaignStatus.Completed, CampaignStatus.Canceled):
+            c = self._campaign(status)
+            with self.assertRaises(exceptions.InvalidState, msg=status):
+                campaigns.pause_campaign(c.id)
+            c.refresh_from_db()
+            self.assertEqual(c.status, status)
+
+    @mock.patch.object(campaigns.dispatch_next_chunk, "delay")
+    def test_resume_only_from_paused(self, delay):
+        c = self._campaign(CampaignStatus.Paused)
+        campaigns.resume_campaign(c.id)
+        c.refresh_from_db()
+        self.assertEqual(c.status, CampaignStatus.Sending)
+        delay.assert_called_once()
+        for status in (CampaignStatus.Draft, CampaignStatus.Scheduled, CampaignStatus.Sending,
+                       CampaignStatus.Completed, CampaignStatus.Canceled):
+            c = self._campaign(status)
+            with self.assertRaises(exceptions.InvalidState, msg=status):
+                campaigns.resume_campaign(c.id)
+        delay.assert_called_once()
+
+    def test_api_rejects_with_400(self):
+        c = self._campaign(CampaignStatus.Draft)
+        for action in ("pause", "resume"):
+            response = self.client.post(f"/api/campaigns/{c.id}/{action}/")
+            self.assertEqual(response.status_code, 400, action)
+
+
+class KickoffTests(FakeRedisMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.audience = Audience.objects.create(name="list")
+
+    def test_no_recipients_completes(self):
+        c = Campaign.objects.create(title="empty", audience=self.audience, status=CampaignStatus.Sending)
+        tasks.kickoff_campaign_send(str(c.id))
+        c.refresh_from_db()
+        self.assertEqual(c.status, CampaignStatus.Completed)
+        self.assertIsNotNone(c.completed_at)
+
+    @mock.patch.object(tasks, "_kick_off")
+    def test_sweep_starts_due_campaign(self, kick_off):
+        c = Campaign.objects.create(title="due", audience=self.audience, status=CampaignStatus.Scheduled,
+                                    scheduled_at=timezone.now() - timedelta(minutes=1), send_job_id="job-1")
+        with self.captureOnCommitCallbacks(execute=True):
+            result = tasks.start_due_campaigns()
+        self.assertEqual(result["started"], [str(c.id)])
+        kick_off.assert_called_once_with([(c.id, "job-1")])
+        c.refresh_from_db()
+        self.assertEqual(c.status, CampaignStatus.Sending)
+
+    @mock.patch.object(tasks, "_kick_off")
+    def test_sweep_claims_only_scheduled_rows(self, kick_off):
+        due = timezone.now() - timedelta(minutes=1)
+        c = Campaign.objects.create(title="due", audience=self.audience, status=CampaignStatus.Scheduled,
+                                    scheduled_at=due, send_job_id="job-1")
+        real_filter = Campaign.objects.filter
+
+        def racing_filter(*args, **kwargs):
+            # another sweep claims the row between our SELECT and our UPDATE
+            if kwargs.get("status") == CampaignStatus.Scheduled and "id" in kwargs:
+                real_filter(pk=c.pk).update(status=CampaignStatus.Sending)
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(Campaign.objects, "filter", side_effect=racing_filter), \
+                self.captureOnCommitCallbacks(execute=True):
+            result = tasks.start_due_campaigns()
+        self.assertEqual(result["started"], [])
+        kick_off.assert_called_once_with([])
+
+
+class SendEndpointTests(FakeRedisMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.campaign = Campaign.objects.create(title="c", audience=Audience.objects.create(name="list"))
+        self.url = f"/api/campaigns/{self.campaign.id}/send/"
+
+    @mock.patch.object(campaigns, "send_campaign", side_effect=RuntimeError("broker down"))
+    def test_unexpected_error_is_a_500(self, _):
+        with self.assertLogs("campaign.views", "ERROR"):
+            response = self.client.post(self.url, {}, content_type="application/json")
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json(), {"detail": "Could not start sending."})
+
+    def test_invalid_update_is_a_400(self):
+        response = self.client.post(self.url, {"share_floor": 5, "share_ceiling": 2}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("share_floor", response.json())
@@ -0,0 +1,36 @@
+from django.test import SimpleTestCase, override_settings
+
+from campaign.services import redis_service as rs
+
+from .fake_redis import CID, LANES, SendStateMixin
+
+
+@override_settings(SEND_LANES=LANES, CHUNK_LEASE_SECONDS=600)
+class DispatchScriptTests(SendStateMixin, SimpleTestCase):
+    """The single round-trip dispatch script."""
+
+    def test_dispatch_leases_chunks_per_lane(self):
+        self._load(gmail=6, other=3)
+        res = self._dispatch(chunk=5)
+        self.assertEqual(res["status"], "ok")
+        chunks = sorted((lane, len(records)) for lane, _, records in res["chunks"])
+        self.assertEqual(chunks, [("gmail", 1), ("gmail", 5), ("other", 3)])
+        self.assertEqual(res["inflight"], 3)
+        self.assertEqual(rs.get_inflight(CID), 3)
+        self.assertEqual(rs.queue_len(CID), 0)
+        self.assertEqual(self.redis.zcard(rs.leases_key(CID)), 3)
+
+    def test_dispatch_respects_window_and_lane_cap(self):
+        self._load(gmail=20)
+        res = self._dispatch(window=10, chunk=2)
+        # SEND_LANES caps gmail at two chunks in flight
+        self.assertEqual(len(res["chunks"]), 2)
+        self.assertEqual(rs.queue_len(CID), 16)
+
+    def test_dispatch_checks_control_state(self):
+        self._load(other=3)
+        rs.set_control_state(CID, "paused")
+        res = self._dispatch()
+        self.assertEqual(res["status"], "paused")
+        self.assertEqual(res["chunks"], [])
+        self.assertEqual(rs.queue_len(CID), 3)
@@ -0,0 +1,111 @@
+import json
+from unittest import mock
+
+import fakeredis
+from django.test import RequestFactory, TestCase, override_settings
+
+from audience.models import Audience
+from campaign.models import Campaign, CampaignStatus
+from campaign.services import control, events, progress, redis_service
+from campaign.views import campaign_events
+
+from .fake_redis import FakeRedisMixin
+
+
+def _parse(chunk: str):
+    """-> (event, data) for an SSE event, None for comments and the retry hint."""
+    lines = dict(line.split(": ", 1) for line in chunk.strip().split("\n") if not line.startswith(":"))
+    if "event" not in lines:
+        return None
+    return lines["event"], json.loads(lines["data"])
+
+
+class PublishTests(FakeRedisMixin, TestCase):
+
+    def test_events_go_to_the_campaign_channel(self):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(events.channel("c1"))
+        pubsub.get_message(timeout=0.1)
+        events.progress("c1", sent=3, failed=1, deferred=0)
+        events.progress("c1", sent=0, failed=0, deferred=0)   # nothing to say
+        control.publish("c1", CampaignStatus.Paused)
+        received = []
+        while (msg := pubsub.get_message(timeout=0.1)) is not None:
+            received.append(json.loads(msg["data"]))
+        self.assertEqual(received, [
+            {"type": "progress", "campaign": "c1", "sent": 3, "failed": 1, "deferred": 0},
+            {"type": "state", "campaign": "c1", "state": "paused"},
+        ])
+        self.assertEqual(redis_service.get_control_state("c1"), "paused")
+
+    def test_publish_failure_is_swallowed(self):
+        with mock.patch.object(self.redis, "publish", side_effect=ConnectionError("down")):
+            events.state("c1", CampaignStatus.Completed)
+
+
+@override_settings(SSE_HEARTBEAT_SECONDS=0.05)
+class EventStreamTests(FakeRedisMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # the stream's async client has to see what the sync side publishes
+        server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=server)
+        for patcher in (mock.patch.object(redis_service, "get_redis_connection", return_value=self.redis),
+                        mock.patch.object(events.aioredis, "from_url",
+                                          lambda url: fakeredis.FakeAsyncRedis(server=server))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        audience = Audience.objects.create(name="list")
+        self.sending = Campaign.objects.create(title="live", audience=audience, status=CampaignStatus.Sending)
+        self.draft = Campaign.objects.create(title="draft", audience=audience, emails_sent=0)
+
+    async def _next_event(self, stream):
+        for _ in range(50):
+            chunk = await anext(stream)
+            parsed = _parse(chunk.decode() if isinstance(chunk, bytes) else chunk)
+            if parsed:
+                return parsed
+        self.fail("no event")
+
+    async def test_snapshot_then_deltas_until_completed(self):
+        live = str(self.sending.id)
+        redis_service.init_state(live)
+        progress.start(live, 4)
+        progress.add_queued(live, 10)
+        control.publish(live, CampaignStatus.Sending)
+
+        request = RequestFactory().get("/api/campaigns/events/", {"ids": f"{live},{self.draft.id}"})
+        response = await campaign_events(request)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        try:
+            snapshots = {}
+            for _ in range(2):
+                kind, data = await self._next_event(stream)
+                self.assertEqual(kind, "snapshot")
+                snapshots[data["campaign"]] = data
+            self.assertEqual((snapshots[live]["state"], snapshots[live]["sent"]), ("sending", 4))
+            # the draft has nothing in Redis: its row answers
+            self.assertEqual(snapshots[str(self.draft.id)]["state"], CampaignStatus.Draft)
+
+            events.progress(live, sent=5, failed=0, deferred=1)
+            control.publish(live, CampaignStatus.Completed)
+            seen = []
+            while True:
+                kind, data = await self._next_event(stream)
+                seen.append((kind, data))
+                if kind == "state" and data["state"] == CampaignStatus.Completed:
+                    break
+            self.assertEqual(seen, [
+                ("progress", {"campaign": live, "sent": 5, "failed": 0, "deferred": 1}),
+                ("state", {"campaign": live, "state": "completed"}),
+            ])
+        finally:
+            await stream.aclose()
+
+    async def test_rejects_bad_ids(self):
+        response = await campaign_events(RequestFactory().get("/api/campaigns/events/", {"ids": "nope"}))
+        self.assertEqual(response.status_code, 400)
+        response = await campaign_events(RequestFactory().get("/api/campaigns/events/"))
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,114 @@
+import time
+import uuid
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from audience.models import Audience
+from campaign import tasks
+from campaign.models import Campaign, CampaignStatus
+from campaign.services import fair_share
+from campaign.services import redis_service as rs
+from campaign.services.fair_share import allocate
+
+from .fake_redis import FakeRedisMixin
+
+
+class AllocateTests(SimpleTestCase):
+
+    def test_equal_weights_split_evenly(self):
+        shares = allocate(12, {"a": (1, 100), "b": (1, 100), "c": (1, 100)}, floor_share=1, ceiling=16)
+        self.assertEqual(shares, {"a": 4, "b": 4, "c": 4})
+
+    def test_weights_are_proportional(self):
+        shares = allocate(12, {"hi": (3, 100), "lo": (1, 100)}, floor_share=1, ceiling=16)
+        self.assertEqual(shares, {"hi": 9, "lo": 3})
+
+    def test_unused_share_flows_to_the_others(self):
+        shares = allocate(12, {"small": (1, 2), "big": (1, 100)}, floor_share=1, ceiling=16)
+        self.assertEqual(shares, {"small": 2, "big": 10})
+
+    def test_ceiling_caps_every_campaign(self):
+        shares = allocate(48, {"a": (1, 100), "b": (1, 100)}, floor_share=1, ceiling=16)
+        self.assertEqual(shares, {"a": 16, "b": 16})
+
+    def test_floors_go_to_the_heaviest_first_when_short(self):
+        shares = allocate(2, {"a": (1, 5), "b": (5, 5), "c": (3, 5)}, floor_share=1, ceiling=16)
+        self.assertEqual(shares, {"a": 0, "b": 1, "c": 1})
+
+    def test_whole_chunks_never_exceed_the_budget(self):
+        demands = {str(i): (1 + i % 3, 10) for i in range(7)}
+        shares = allocate(10, demands, floor_share=1, ceiling=16)
+        self.assertLessEqual(sum(shares.values()), 10)
+        self.assertTrue(all(shares[c] <= demands[c][1] for c in demands))
+        self.assertTrue(all(shares[c] >= 1 for c in demands))
+
+    def test_no_demand_gets_nothing(self):
+        self.assertEqual(allocate(8, {"idle": (1, 0), "busy": (1, 20)}, floor_share=1, ceiling=16),
+                         {"idle": 0, "busy": 8})
+
+    def test_per_campaign_floor_and_ceiling(self):
+        demands = {"vip": (1, 100), "capped": (8, 100), "plain": (1, 100)}
+        shares = allocate(20, demands, floor_share=1, ceiling=16, limits={"vip": (6, None), "capped": (None, 3)})
+        self.assertEqual(shares["capped"], 3)
+        self.assertGreaterEqual(shares["vip"], 6)
+        self.assertEqual(sum(shares.values()), 20)
+
+
+SCHEDULER = {"cluster_inflight": 10, "floor": 2, "ceiling": 6, "interval": 5}
+
+
+@override_settings(SEND_SCHEDULER=SCHEDULER)
+class RebalanceTests(FakeRedisMixin, SimpleTestCase):
+
+    def _queue(self, cid, n):
+        rs.init_state(cid, [(uuid.uuid4(), f"u{i}@corp.io") for i in range(n)])
+
+    def test_writes_shares_with_a_ttl(self):
+        a, b = str(uuid.uuid4()), str(uuid.uuid4())
+        self._queue(a, 50)
+        self._queue(b, 50)
+        result = fair_share.rebalance([(a, 1), (b, 3)], default_window=8)
+        self.assertEqual({cid: r["share"] for cid, r in result.items()}, {a: 4, b: 6})
+        self.assertEqual(fair_share.current_share(a), 4)
+        self.assertTrue(0 < self.redis.ttl(rs.share_key(b)) <= 15)
+
+    def test_queued_work_gets_at_least_the_floor(self):
+        light, heavy = str(uuid.uuid4()), str(uuid.uuid4())
+        self._queue(light, 5)
+        self._queue(heavy, 500)
+        result = fair_share.rebalance([(light, 1), (heavy, 8)], default_window=8)
+        self.assertGreaterEqual(result[light]["share"], SCHEDULER["floor"])
+
+    def test_due_retries_count_as_queued_work(self):
+        cid = str(uuid.uuid4())
+        rs.init_state(cid)
+        self.redis.zadd(rs.retry_key(cid), {"other\nrecord": time.time() * 1000 - 1})
+        self.assertEqual(fair_share.rebalance([(cid, 1)], default_window=8)[cid]["share"], 6)
+        # a retry that isn't due yet is no work for now
+        self.redis.delete(rs.retry_key(cid))
+        self.redis.zadd(rs.retry_key(cid), {"other\nrecord": time.time() * 1000 + 60000})
+        self.assertEqual(fair_share.rebalance([(cid, 1)], default_window=8)[cid]["share"], 0)
+
+
+@override_settings(SEND_SCHEDULER=SCHEDULER)
+class RebalanceTaskTests(FakeRedisMixin, TestCase):
+
+    @mock.patch.object(tasks.dispatch_next_chunk, "delay")
+    def test_campaign_limits_override_the_settings(self, delay):
+        audience = Audience.objects.create(name="list")
+        ids = []
+        for title, lo, hi in (("vip", 5, None), ("capped", None, 1), ("plain", None, None)):
+            c = Campaign.objects.create(title=title, audience=audience, status=CampaignStatus.Sending,
+                                        share_floor=lo, share_ceiling=hi)
+            rs.init_state(str(c.id), [(uuid.uuid4(), f"u{i}@corp.io") for i in range(100)])
+            # an AIMD window that could use more than the ceiling
+            self.redis.hset(rs.window_key(str(c.id)), "inflight", 8)
+            ids.append(str(c.id))
+        shares = tasks.rebalance_send_shares.run()
+        vip, capped, plain = (shares[cid] for cid in ids)
+        self.assertGreaterEqual(vip, 5)
+        self.assertEqual(capped, 1)
+        self.assertEqual(vip + capped + plain, 10)
+        # every campaign got more room than it has in flight: its chain is woken
+        self.assertEqual(delay.call_count, 3)
@@ -0,0 +1,53 @@
+from django.test import SimpleTestCase, override_settings
+
+from campaign.services import redis_service as rs
+from campaign.services.email_service import is_throttling
+
+from .fake_redis import CID, LANES, SendStateMixin
+
+
+class ThrottlingTests(SimpleTestCase):
+
+    def test_only_throttling_replies_park(self):
+        self.assertTrue(is_throttling(421, "4.7.0 Too many connections"))
+        self.assertTrue(is_throttling(421, "Service not available"))
+        self.assertTrue(is_throttling(451, "4.7.1 Rate limited, try again later"))
+        # about one recipient: retried, but the lane stays open
+        self.assertFalse(is_throttling(452, "4.2.2 Mailbox full"))
+        self.assertFalse(is_throttling(450, "4.2.0 Greylisted, see http://postgrey"))
+        self.assertFalse(is_throttling(None, "Connection unexpectedly closed"))
+        self.assertFalse(is_throttling(550, "5.7.1 Message rejected as spam"))
+
+
+@override_settings(SEND_LANES=LANES, CHUNK_LEASE_SECONDS=600)
+class LaneBackoffTests(SendStateMixin, SimpleTestCase):
+
+    def test_parked_lane_reports_retry_in(self):
+        self._load(gmail=2)
+        self.redis.set(rs.lane_backoff_key("gmail"), 1, ex=30)
+        res = self._dispatch()
+        self.assertEqual(res["chunks"], [])
+        self.assertTrue(0 < res["retry_in"] <= 30)
+
+    def test_other_lanes_keep_going_while_one_is_parked(self):
+        self._load(gmail=2, other=2)
+        self.assertEqual(rs.park_lane("gmail"), 30)
+        self.assertEqual(set(rs.parked_lanes()), {"gmail"})
+        (lane, _, records), = self._dispatch()["chunks"]
+        self.assertEqual((lane, len(records)), ("other", 2))
+
+    def test_parked_domain_holds_only_its_records(self):
+        self._load(other=3)
+        (lane, lease, records), = self._dispatch()["chunks"]
+        rs.claim_records(CID, records, lane, lease)
+        self.assertEqual(rs.park_domain("corp.io"), 30)
+        self.assertEqual(rs.park_domain("corp.io"), 60)
+        self.assertEqual(set(rs.parked_domains(["corp.io", "other.io"])), {"corp.io"})
+        self.assertEqual(rs.parked_lanes(), {})
+        rs.hold_records(CID, lane, {records[0]: 0})
+        rs.ack_chunk(CID, lane, lease)
+        # held, not retried: no attempt is spent and the claim is released
+        self.assertEqual(self.redis.hlen(rs.retry_attempts_key(CID)), 0)
+        (_, _, again), = self._dispatch()["chunks"]
+        self.assertEqual(again, records[:1])
+        self.assertEqual(rs.claim_records(CID, again), again)
@@ -0,0 +1,31 @@
+from django.test import SimpleTestCase, override_settings
+
+from campaign.services import redis_service as rs
+
+from .fake_redis import CID, LANES, SendStateMixin
+
+
+@override_settings(SEND_LANES=LANES, CHUNK_LEASE_SECONDS=600)
+class LeaseTests(SendStateMixin, SimpleTestCase):
+    """Chunk leases: ack, and the reaper for chunks whose worker died."""
+
+    def test_ack_releases_slots_once(self):
+        self._load(other=3)
+        (lane, lease, _), = self._dispatch()["chunks"]
+        self.assertTrue(rs.ack_chunk(CID, lane, lease))
+        self.assertFalse(rs.ack_chunk(CID, lane, lease))
+        self.assertEqual(rs.get_inflight(CID), 0)
+        self.assertEqual(self.redis.hlen(rs.lease_data_key(CID)), 0)
+
+    def test_reap_requeues_a_chunk_its_worker_never_claimed(self):
+        self._load(other=3)
+        (lane, lease, records), = self._dispatch()["chunks"]
+        self._expire(lease)
+        self.assertEqual(rs.reap_expired(CID), 1)
+        self.assertEqual([r.decode() for r in self.redis.lrange(rs.lane_key(CID, lane), 0, -1)], records)
+
+    def test_reap_leaves_live_leases(self):
+        self._load(other=3)
+        self._dispatch()
+        self.assertEqual(rs.reap_expired(CID), 0)
+        self.assertEqual(rs.get_inflight(CID), 1)
@@ -0,0 +1,76 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from audience.models import Audience, Contact
+from campaign import tasks
+from campaign.models import Campaign, CampaignStatus, Delivery, DeliveryStatus
+from campaign.services import lanes, ledger, redis_service
+
+from .fake_redis import FakeRedisMixin
+
+
+class LedgerTests(TestCase):
+
+    def setUp(self):
+        audience = Audience.objects.create(name="list")
+        self.campaign = Campaign.objects.create(title="c", audience=audience)
+        self.cid = str(self.campaign.id)
+        self.contacts = [str(Contact.objects.create(audience=audience, email_address=f"u{i}@corp.io").id)
+                         for i in range(4)]
+
+    def _statuses(self):
+        return dict(Delivery.objects.filter(campaign=self.campaign).values_list("contact_id", "status"))
+
+    def test_mark_queued_leaves_existing_rows(self):
+        a, b, c, _ = self.contacts
+        ledger.record(self.cid, [(a, DeliveryStatus.Sent, 250)])
+        ledger.mark_queued(self.cid, [a, b, c])
+        statuses = {str(k): v for k, v in self._statuses().items()}
+        self.assertEqual(statuses, {a: DeliveryStatus.Sent, b: DeliveryStatus.Queued, c: DeliveryStatus.Queued})
+
+    def test_record_upserts(self):
+        a, b, c, _ = self.contacts
+        ledger.mark_queued(self.cid, [a, b])
+        ledger.record(self.cid, [(a, DeliveryStatus.Sent, 250), (b, DeliveryStatus.Deferred, 451),
+                                 (c, DeliveryStatus.Failed, 550)])
+        rows = {str(r.contact_id): (r.status, r.smtp_code) for r in Delivery.objects.filter(campaign=self.campaign)}
+        self.assertEqual(rows, {a: (DeliveryStatus.Sent, 250), b: (DeliveryStatus.Deferred, 451),
+                                c: (DeliveryStatus.Failed, 550)})
+        ledger.record(self.cid, [(b, DeliveryStatus.Sent, 250)])
+        self.assertEqual(Delivery.objects.get(campaign=self.campaign, contact_id=b).smtp_code, 250)
+        self.assertEqual(Delivery.objects.filter(campaign=self.campaign).count(), 3)
+        ledger.record(self.cid, [])
+
+    def test_drop_sent_and_counts(self):
+        a, b, c, d = self.contacts
+        ledger.mark_queued(self.cid, self.contacts)
+        ledger.record(self.cid, [(a, DeliveryStatus.Sent, 250), (b, DeliveryStatus.Sent, 250),
+                                 (c, DeliveryStatus.Failed, 550)])
+        recipients = [(cid, f"{cid}@corp.io") for cid in self.contacts]
+        self.assertEqual(ledger.drop_sent(self.cid, recipients), recipients[2:])
+        self.assertEqual(ledger.drop_sent(self.cid, []), [])
+        self.assertEqual(ledger.sent_count(self.cid), 2)
+        self.assertEqual(ledger.status_counts(self.cid), {"queued": 1, "sent": 2, "deferred": 0, "failed": 1})
+
+
+class ResumedKickoffTests(FakeRedisMixin, TestCase):
+
+    @mock.patch.object(tasks.rebalance_send_shares, "delay")
+    @mock.patch.object(tasks.dispatch_next_chunk, "delay")
+    def test_rerun_queues_only_the_unsent(self, *_):
+        audience = Audience.objects.create(name="list")
+        campaign = Campaign.objects.create(title="c", audience=audience, status=CampaignStatus.Sending)
+        contacts = [Contact.objects.create(audience=audience, email_address=f"u{i}@corp.io") for i in range(5)]
+        ledger.record(str(campaign.id), [(str(c.id), DeliveryStatus.Sent, 250) for c in contacts[:2]])
+
+        result = tasks.kickoff_campaign_send(str(campaign.id))
+        self.assertEqual(result, {"queued_recipients": 3, "already_sent": 2})
+        self.assertEqual(redis_service.queue_len(str(campaign.id)), 3)
+        records = self.redis.lrange(redis_service.lane_key(str(campaign.id), lanes.DEFAULT_LANE), 0, -1)
+        queued = {redis_service.unpack_recipient(r.decode())[0] for r in records}
+        self.assertEqual(queued, {str(c.id) for c in contacts[2:]})
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.emails_sent, 2)
+        self.assertEqual(campaign.estimated_recipients, 5)
+        self.assertEqual(ledger.status_counts(str(campaign.id)), {"queued": 3, "sent": 2, "deferred": 0, "failed": 0})
@@ -0,0 +1,177 @@
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from audience.models import Audience, Contact
+from campaign import tasks
+from campaign.models import Campaign, CampaignStatus
+from campaign.services import local_time, redis_service
+
+from .fake_redis import CID, LANES, SendStateMixin
+
+# a winter date, so the zones below have no DST surprises
+NINE_AM = datetime(2030, 1, 15, 9, 0, tzinfo=dt_timezone.utc)
+
+
+def _ms(dt: datetime) -> int:
+    return int(dt.timestamp() * 1000)
+
+
+class PlanTests(TestCase):
+
+    def setUp(self):
+        self.audience = Audience.objects.create(name="list")
+        self.campaign = Campaign.objects.create(title="local", audience=self.audience, scheduled_at=NINE_AM,
+                                                per_recipient_local_time=True)
+
+    def _contact(self, email, tz=None):
+        return Contact.objects.create(audience=self.audience, email_address=email,
+                                      location={"tz": tz} if tz is not None else {})
+
+    def test_groups_by_utc_offset(self):
+        ny = [self._contact(f"ny{i}@corp.io", "America/New_York") for i in range(2)]
+        tokyo = self._contact("tokyo@corp.io", "Asia/Tokyo")
+        plan = local_time.plan_for(self.campaign, Contact.objects.all())
+        self.assertEqual(plan.default_offset, 0)
+        self.assertEqual(plan.sizes, {-300: 2, 540: 1})
+        self.assertEqual(plan.zones, {-300: ["America/New_York"], 540: ["Asia/Tokyo"]})
+        # 9am in each zone
+        self.assertEqual(plan.release_ms(540), _ms(NINE_AM - timedelta(hours=9)))
+        self.assertEqual(plan.release_ms(-300), _ms(NINE_AM + timedelta(hours=5)))
+        buckets = dict(plan.annotate(Contact.objects.all()).values_list("id", "bucket"))
+        self.assertEqual(buckets, {ny[0].id: -300, ny[1].id: -300, tokyo.id: 540})
+
+    def test_missing_or_unknown_zone_uses_campaigns(self):
+        self.campaign.timezone_str = "Europe/Berlin"
+        self._contact("none@corp.io")
+        self._contact("bogus@corp.io", "Not/AZone")
+        self._contact("junk@corp.io", 42)
+        self._contact("cairo@corp.io", "Africa/Cairo")
+        plan = local_time.plan_for(self.campaign, Contact.objects.all())
+        self.assertEqual(plan.default_offset, 60)
+        self.assertEqual(plan.sizes, {60: 3, 120: 1})
+        self.assertEqual(plan.zones, {120: ["Africa/Cairo"]})
+        buckets = plan.annotate(Contact.objects.all()).values_list("email_address", "bucket")
+        self.assertEqual(dict(buckets), {"none@corp.io": 60, "bogus@corp.io": 60, "junk@corp.io": 60,
+                                         "cairo@corp.io": 120})
+
+    def test_unknown_campaign_zone_falls_back_to_utc(self):
+        self.campaign.timezone_str = "Mars/Olympus"
+        self._contact("none@corp.io")
+        plan = local_time.plan_for(self.campaign, Contact.objects.all())
+        self.assertEqual(plan.default_offset, 0)
+        self.assertEqual(plan.wall, NINE_AM.replace(tzinfo=None))
+        self.assertEqual(plan.sizes, {0: 1})
+
+    def test_kickoff_at_leads_local_time_sends(self):
+        self.assertEqual(local_time.kickoff_at(self.campaign), NINE_AM - local_time.KICKOFF_LEAD)
+        self.campaign.per_recipient_local_time = False
+        self.assertEqual(local_time.kickoff_at(self.campaign), NINE_AM)
+
+
+@override_settings(SEND_LANES=LANES)
+class StagingTests(SendStateMixin, TestCase):
+
+    def _stage(self, offset, release_ms, n=2):
+        recipients = [(str(uuid.uuid4()), f"u{offset}-{i}@gmail.com") for i in range(n)]
+        redis_service.stage_recipients(CID, recipients, 0, offset, release_ms)
+
+    def test_staged_buckets_stay_off_the_lanes_until_due(self):
+        now = int(time.time() * 1000)
+        redis_service.init_state(CID)
+        self._stage(540, now + 60_000)
+        self._stage(-300, now + 120_000, n=3)
+        self.assertEqual(redis_service.queue_len(CID), 0)
+        self.assertEqual(redis_service.local_pending(CID), 2)
+        self.assertEqual(redis_service.due_local_campaigns(now), [])
+
+        self.assertEqual(redis_service.release_due_buckets(CID, now), 0)
+        self.assertEqual(redis_service.queue_len(CID), 0)
+
+        self.assertEqual(redis_service.due_local_campaigns(now + 60_000), [CID])
+        self.assertEqual(redis_service.release_due_buckets(CID, now + 60_000), 1)
+        self.assertEqual(redis_service.lane_lengths(CID)["gmail"], 2)
+        self.assertEqual(redis_service.local_pending(CID), 1)
+        # the sweep is re-armed for the next offset
+        self.assertEqual(redis_service.due_local_campaigns(now + 60_000), [])
+        self.assertEqual(redis_service.due_local_campaigns(now + 120_000), [CID])
+
+        self.assertEqual(redis_service.release_due_buckets(CID, now + 120_000), 1)
+        self.assertEqual(redis_service.queue_len(CID), 5)
+        self.assertEqual(redis_service.local_pending(CID), 0)
+        self.assertEqual(redis_service.due_local_campaigns(now + 120_000), [])
+
+    @mock.patch.object(tasks.dispatch_next_chunk, "delay")
+    def test_release_task_moves_due_buckets(self, delay):
+        now = int(time.time() * 1000)
+        redis_service.init_state(CID)
+        self._stage(540, now - 1000)
+        self._stage(-300, now + 3_600_000)
+        self.assertEqual(tasks.release_local_time_buckets(), {"released": {CID: 1}})
+        delay.assert_called_once_with(CID)
+        self.assertEqual(redis_service.queue_len(CID), 2)
+        self.assertEqual(redis_service.local_pending(CID), 1)
+        # nothing else is due yet
+        self.assertEqual(tasks.release_local_time_buckets(), {"released": {}})
+
+    def test_finalize_waits_for_staged_buckets(self):
+        audience = Audience.objects.create(name="list")
+        c = Campaign.objects.create(id=CID, title="local", audience=audience, status=CampaignStatus.Sending)
+        redis_service.init_state(CID)
+        redis_service.finish_loading(CID)
+        self._stage(540, int(time.time() * 1000) + 3_600_000)
+        result = tasks.finalize_campaign_send(CID)
+        self.assertEqual(result["status"], "not-done")
+        self.assertEqual(result["remaining"], 1)
+        c.refresh_from_db()
+        self.assertEqual(c.status, CampaignStatus.Sending)
+
+
+@override_settings(SEND_LANES=LANES)
+class LocalKickoffTests(SendStateMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.audience = Audience.objects.create(name="list")
+
+    @mock.patch.object(tasks.rebalance_send_shares, "delay")
+    @mock.patch.object(tasks.dispatch_next_chunk, "delay")
+    def test_kickoff_queues_due_buckets_and_stages_the_rest(self, *_):
+        # 9am UTC is two hours away; it's already 9am on Kiritimati (UTC+14)
+        nine = timezone.now().replace(microsecond=0) + timedelta(hours=2)
+        c = Campaign.objects.create(title="local", audience=self.audience, status=CampaignStatus.Sending,
+                                    scheduled_at=nine, per_recipient_local_time=True)
+        Contact.objects.create(audience=self.audience, email_address="utc@gmail.com", location={"tz": "UTC"})
+        Contact.objects.create(audience=self.audience, email_address="kiri@gmail.com",
+                               location={"tz": "Pacific/Kiritimati"})
+        result = tasks.kickoff_campaign_send(str(c.id))
+        self.assertEqual(result["queued_recipients"], 2)
+        self.assertEqual(set(result["local_time_buckets"]), {"+840", "+0"})
+        self.assertEqual(redis_service.queue_len(str(c.id)), 1)
+        self.assertEqual(redis_service.local_pending(str(c.id)), 1)
+        self.assertEqual(tasks.finalize_campaign_send(str(c.id))["status"], "not-done")
+
+
+class LocalSweepTests(TestCase):
+
+    def setUp(self):
+        self.audience = Audience.objects.create(name="list")
+
+    def _scheduled(self, title, hours, local):
+        return Campaign.objects.create(title=title, audience=self.audience, status=CampaignStatus.Scheduled,
+                                       scheduled_at=timezone.now() + timedelta(hours=hours),
+                                       per_recipient_local_time=local, send_job_id=f"job-{title}")
+
+    @mock.patch.object(tasks, "_kick_off")
+    def test_local_time_sends_start_kickoff_lead_early(self, kick_off):
+        early = self._scheduled("local", 20, True)
+        self._scheduled("plain", 20, False)
+        self._scheduled("far", 30, True)
+        with self.captureOnCommitCallbacks(execute=True):
+            result = tasks.start_due_campaigns()
+        self.assertEqual(result["started"], [str(early.id)])
+        kick_off.assert_called_once_with([(early.id, "job-local")])
@@ -0,0 +1,73 @@
+from django.test import TestCase, override_settings
+from prometheus_client import REGISTRY
+from prometheus_client.parser import text_string_to_metric_families
+
+from audience.models import Audience
+from campaign.management.commands.bench_send_pipeline import run_campaign, seed_campaign
+from campaign.models import Campaign, CampaignStatus
+from campaign.services import redis_service
+
+from .fake_redis import FakeRedisMixin
+
+
+def _total(name: str, **labels) -> float:
+    """Sum of a sample over every label set matching `labels`."""
+    return sum(
+        sample.value
+        for family in REGISTRY.collect()
+        for sample in family.samples
+        if sample.name == name and all(sample.labels.get(k) == v for k, v in labels.items())
+    )
+
+
+@override_settings(METRICS_TOKEN="")
+class MetricsExportTests(FakeRedisMixin, TestCase):
+
+    N = 8
+
+    def _scrape(self) -> dict:
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        return {
+            sample.name: sample
+            for family in text_string_to_metric_families(response.content.decode())
+            for sample in family.samples
+        }
+
+    def test_send_counters_and_histograms(self):
+        # the registry is process-wide: compare against what earlier tests left
+        before = {
+            "sent": _total("campaign_messages_total", outcome="sent"),
+            "dispatched": _total("campaign_dispatched_chunks_total"),
+            "smtp": _total("campaign_smtp_send_seconds_count", engine="sync"),
+            "chunks": _total("campaign_chunk_seconds_count"),
+        }
+        run_campaign(seed_campaign(self.N), timeout=60)
+        self.assertEqual(_total("campaign_messages_total", outcome="sent") - before["sent"], self.N)
+        self.assertEqual(_total("campaign_smtp_send_seconds_count", engine="sync") - before["smtp"], self.N)
+        self.assertGreaterEqual(_total("campaign_dispatched_chunks_total") - before["dispatched"], 1)
+        self.assertGreaterEqual(_total("campaign_chunk_seconds_count") - before["chunks"], 1)
+
+        scraped = self._scrape()
+        for name in ("campaign_messages_total", "campaign_dispatched_chunks_total",
+                     "campaign_smtp_send_seconds_bucket", "campaign_smtp_send_seconds_sum",
+                     "campaign_chunk_seconds_bucket", "campaign_chunk_seconds_count"):
+            self.assertIn(name, scraped)
+
+    def test_queue_gauges_for_active_sends(self):
+        campaign = Campaign.objects.create(title="live", audience=Audience.objects.create(name="list"),
+                                           status=CampaignStatus.Sending)
+        cid = str(campaign.id)
+        redis_service.init_state(cid, [("00000000-0000-0000-0000-00000000000a", "a@corp.io"),
+                                       ("00000000-0000-0000-0000-00000000000b", "b@corp.io")])
+        scraped = self._scrape()
+        self.assertEqual(scraped["campaign_queue_depth"].labels, {"campaign": cid})
+        self.assertEqual(scraped["campaign_queue_depth"].value, 2)
+        self.assertEqual(scraped["campaign_retrying"].value, 0)
+        self.assertEqual(scraped["campaign_inflight_chunks"].value, 0)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,57 @@
+import uuid
+from email.utils import formatdate, make_msgid
+
+from django.conf import settings
+from django.core.mail.message import sanitize_address
+from django.test import SimpleTestCase
+
+from campaign.models import Campaign
+from campaign.services import email_service
+from campaign.services.mime_builder import PreparedCampaign
+
+
+class MimeBuilderTests(SimpleTestCase):
+    """The pre-encoded skeleton must produce exactly what EmailMultiAlternatives would."""
+
+    def _campaign(self, **fields):
+        values = dict(
+            id=uuid.uuid4(), title="t", subject_line="Hello there", from_name="Sender",
+            from_email="sender@example.com", to_name_format="{{ first_name }}",
+            compiled_html="<p>Hi {{ FNAME }}</p><a href=\"https://t.example/c/x?r={recipient_id}\">link</a>",
+            content_text="Hi {{ FNAME }}, see https://t.example/c/x?r={recipient_id}",
+        )
+        values.update(fields)
+        return Campaign(**values)
+
+    def _assert_identical(self, campaign, email, merge_fields):
+        template = email_service.get_campaign_template(campaign)
+        prepared = PreparedCampaign(campaign, template)
+        self.assertTrue(prepared.enabled)
+        contact_id = str(uuid.uuid4())
+        date, message_id = formatdate(), make_msgid(domain="example.com")
+        fast, to_addr = prepared.render(email, contact_id, merge_fields, date=date, message_id=message_id)
+
+        msg = email_service.build_email_message(campaign, email, contact_id, template, None, merge_fields)
+        msg.extra_headers.update({"Date": date, "Message-ID": message_id})
+        mime = msg.message()
+        mime.set_boundary(prepared.boundary)
+        self.assertEqual(fast, mime.as_bytes(linesep="\r\n"))
+        self.assertEqual(to_addr, sanitize_address(msg.to[0], msg.encoding or settings.DEFAULT_CHARSET))
+
+    def test_ascii_recipient(self):
+        self._assert_identical(self._campaign(), "ann@example.com", {"FNAME": "Ann"})
+
+    def test_non_ascii_values_switch_to_8bit(self):
+        self._assert_identical(self._campaign(), "jose@example.com", {"FNAME": "José"})
+
+    def test_missing_merge_fields(self):
+        self._assert_identical(self._campaign(), "nobody@example.com", None)
+
+    def test_reply_to(self):
+        self._assert_identical(self._campaign(reply_to="replies@example.com"), "ann@example.com", {"FNAME": "Ann"})
+
+    def test_values_that_change_the_encoding_fall_back(self):
+        template = email_service.get_campaign_template(self._campaign())
+        prepared = PreparedCampaign(self._campaign(), template)
+        self.assertIsNone(prepared.render("ann@example.com", str(uuid.uuid4()), {"FNAME": "two\nlines"}))
+        self.assertIsNone(prepared.render("ann@example.com", str(uuid.uuid4()), {"FNAME": "x" * 1200}))
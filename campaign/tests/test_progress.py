@@ -0,0 +1,104 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from audience.models import Audience
+from campaign import tasks
+from campaign.models import Campaign, CampaignStatus
+from campaign.services import progress, redis_service
+
+from .fake_redis import CID, LANES, SendStateMixin
+
+NOW_MS = 1_000_005_000
+
+
+@override_settings(SEND_LANES=LANES)
+@mock.patch.object(progress, "_now_ms", return_value=NOW_MS)
+class ProgressTests(SendStateMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        audience = Audience.objects.create(name="list")
+        self.campaign = Campaign.objects.create(id=CID, title="c", audience=audience, status=CampaignStatus.Sending)
+
+    def _start(self, already_sent=0, queued=0):
+        redis_service.init_state(CID)
+        progress.start(CID, already_sent)
+        progress.add_queued(CID, queued)
+
+    def test_record_and_flush(self, _):
+        self._start(already_sent=7, queued=100)
+        self.assertTrue(progress.record(CID, sent=30, failed=10, deferred=5))
+        self.assertEqual(progress.flush(CID), 37)
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.emails_sent, 37)
+        # nothing moved: no write
+        self.assertIsNone(progress.flush(CID))
+        progress.record(CID, sent=3, failed=0, deferred=0)
+        self.assertEqual(progress.flush(CID), 40)
+
+    def test_close_stops_recording(self, _):
+        self._start(queued=10)
+        progress.record(CID, sent=4, failed=0, deferred=0)
+        progress.close(CID)
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.emails_sent, 4)
+        self.assertLessEqual(self.redis.ttl(redis_service.progress_key(CID)), progress.CLOSED_TTL)
+        # the caller writes late chunks to the row itself
+        self.assertFalse(progress.record(CID, sent=1, failed=0, deferred=0))
+
+    def test_record_without_a_send(self, _):
+        self.assertFalse(progress.record(CID, sent=1, failed=0, deferred=0))
+        self.assertFalse(self.redis.exists(redis_service.progress_key(CID)))
+        self.assertIsNone(progress.flush(CID))
+
+    def test_snapshot(self, now_ms):
+        self._start(already_sent=7, queued=100)
+        # started 30s ago, 30 sent since: 1/s, 60 to go
+        self.redis.hset(redis_service.progress_key(CID), "started", NOW_MS - 30_000)
+        progress.record(CID, sent=30, failed=10, deferred=5)
+        self.redis.rpush(redis_service.lane_key(CID, "gmail"), "a", "b")
+        self.redis.rpush(redis_service.lane_key(CID, "other"), "c")
+        self.redis.zadd(redis_service.retry_key(CID), {"gmail\nr": 0})
+        self.redis.set(redis_service.inflight_key(CID), 2)
+        redis_service.set_control_state(CID, "sending")
+        self.assertEqual(progress.snapshot(CID), {
+            "state": "sending",
+            "sent": 37,
+            "failed": 10,
+            "deferred": 5,
+            "remaining": 60,
+            "queue_depth": 3,
+            "queue_by_lane": {"gmail": 2, "other": 1},
+            "retrying": 1,
+            "inflight_chunks": 2,
+            "rate_per_sec": 1.0,
+            "eta_seconds": 60,
+        })
+        # an hour later the window is empty: no rate, no ETA
+        now_ms.return_value = NOW_MS + 3_600_000
+        snap = progress.snapshot(CID)
+        self.assertEqual((snap["rate_per_sec"], snap["eta_seconds"]), (0.0, None))
+
+    def test_snapshot_unknown_send(self, _):
+        self.assertIsNone(progress.snapshot(CID))
+
+    def test_flush_task(self, _):
+        self._start(already_sent=2, queued=10)
+        progress.record(CID, sent=5, failed=0, deferred=0)
+        done = Campaign.objects.create(title="done", audience=self.campaign.audience, status=CampaignStatus.Completed)
+        self.assertEqual(tasks.flush_send_progress(), {"flushed": {CID: 7}})
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.emails_sent, 7)
+        done.refresh_from_db()
+        self.assertEqual(done.emails_sent, 0)
+        self.assertEqual(tasks.flush_send_progress(), {"flushed": {}})
+
+    def test_endpoint(self, _):
+        response = self.client.get(f"/api/campaigns/{CID}/progress/")
+        self.assertEqual(response.status_code, 404)
+        self._start(queued=3)
+        response = self.client.get(f"/api/campaigns/{CID}/progress/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["campaign"], CID)
+        self.assertEqual(response.json()["remaining"], 3)
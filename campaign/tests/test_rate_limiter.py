@@ -0,0 +1,60 @@
+from django.test import TestCase, override_settings
+
+from audience.models import Audience
+from campaign.models import Campaign
+from campaign.services import rate_limiter
+
+from .fake_redis import FakeRedisMixin
+
+# (key, tokens per second, burst)
+WIDE = ("ratelimit:wide", 100.0, 100.0)
+TIGHT = ("ratelimit:tight", 10.0, 3.0)
+
+
+class TokenBucketTests(FakeRedisMixin, TestCase):
+
+    def _tokens(self, key):
+        return float(self.redis.hget(key, "tokens"))
+
+    def _rewind(self, key, ms):
+        """Pretend the bucket was last touched `ms` earlier."""
+        self.redis.hset(key, "ts", int(self.redis.hget(key, "ts")) - ms)
+
+    def test_tightest_bucket_limits_the_grant(self):
+        self.assertEqual(rate_limiter.acquire([WIDE, TIGHT], 5), (3, 0.0))
+        # every bucket is debited the same amount
+        self.assertAlmostEqual(self._tokens(WIDE[0]), 97, delta=0.5)
+        self.assertAlmostEqual(self._tokens(TIGHT[0]), 0, delta=0.1)
+        self.assertGreater(self.redis.pttl(TIGHT[0]), 0)
+
+    def test_empty_bucket_returns_a_wait(self):
+        rate_limiter.acquire([WIDE, TIGHT], 3)
+        granted, wait = rate_limiter.acquire([WIDE, TIGHT], 5)
+        self.assertEqual(granted, 0)
+        # one token at 10/s
+        self.assertGreater(wait, 0.05)
+        self.assertLessEqual(wait, 0.1)
+        self.assertAlmostEqual(self._tokens(WIDE[0]), 97, delta=0.5)
+
+    def test_refill_over_time(self):
+        rate_limiter.acquire([TIGHT], 3)
+        self._rewind(TIGHT[0], 200)
+        self.assertEqual(rate_limiter.acquire([TIGHT], 5), (2, 0.0))
+        # a long pause refills only up to the burst
+        self._rewind(TIGHT[0], 60_000)
+        self.assertEqual(rate_limiter.acquire([TIGHT], 5), (3, 0.0))
+
+    def test_no_buckets_or_nothing_requested(self):
+        self.assertEqual(rate_limiter.acquire([], 7), (7, 0.0))
+        self.assertEqual(rate_limiter.acquire([TIGHT], 0), (0, 0.0))
+        self.assertFalse(self.redis.exists(TIGHT[0]))
+
+    @override_settings(SEND_RATE_GLOBAL=50, SEND_RATE_PER_CAMPAIGN=0, SEND_RATE_PER_SENDER_DOMAIN=20,
+                       SEND_RATE_BURST_SECONDS=2, SEND_LANES={}, SEND_LANE_DEFAULTS={"rate": 0})
+    def test_buckets_for_skips_disabled_limits(self):
+        campaign = Campaign.objects.create(title="c", audience=Audience.objects.create(name="list"),
+                                           from_email="news@Shop.io")
+        self.assertEqual(rate_limiter.buckets_for(campaign, "other"), [
+            ("ratelimit:global", 50.0, 100.0),
+            ("ratelimit:sender:shop.io", 20.0, 40.0),
+        ])
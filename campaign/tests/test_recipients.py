@@ -0,0 +1,42 @@
+from django.db.models import Value
+from django.test import TestCase
+
+from audience.models import Audience, Contact
+from campaign.models import Campaign
+from campaign.services import email_service
+
+
+class IterRecipientsTests(TestCase):
+
+    def setUp(self):
+        self.audience = Audience.objects.create(name="list")
+        self.campaign = Campaign(audience=self.audience, exclude_unsubscribed=True)
+
+    def _contacts(self, *addresses, status="subscribed"):
+        # bulk_create skips Contact.save(), so addresses keep their case like imported rows
+        Contact.objects.bulk_create([Contact(audience=self.audience, email_address=a, status=status)
+                                     for a in addresses])
+
+    def _batches(self, batch_size):
+        qs = email_service.recipient_qs_for(self.campaign)
+        return list(email_service.iter_recipients(qs, batch_size=batch_size))
+
+    def test_one_pair_per_address_across_pages(self):
+        self._contacts("b@x.io", "B@X.io", "a@x.io", "c@x.io", "b@x.IO", "C@x.io", "d@x.io")
+        for batch_size in (1, 2, 3, 100):
+            batches = self._batches(batch_size)
+            emails = [email for batch in batches for _, email in batch]
+            self.assertEqual(emails, ["a@x.io", "b@x.io", "c@x.io", "d@x.io"], batch_size)
+            self.assertTrue(all(len(batch) <= batch_size for batch in batches))
+
+    def test_skips_unsubscribed_and_blank(self):
+        self._contacts("a@x.io", "")
+        self._contacts("gone@x.io", status="unsubscribed")
+        emails = [email for batch in self._batches(10) for _, email in batch]
+        self.assertEqual(emails, ["a@x.io"])
+
+    def test_extra_column(self):
+        self._contacts("a@x.io")
+        qs = email_service.recipient_qs_for(self.campaign).annotate(bucket=Value(60))
+        (batch,) = list(email_service.iter_recipients(qs, extra="bucket"))
+        self.assertEqual(batch[0][1:], ("a@x.io", 60))
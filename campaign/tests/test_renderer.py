@@ -0,0 +1,29 @@
+from django.test import SimpleTestCase
+
+from campaign.services.renderer import CampaignTemplate, render, slot_names, split_template
+
+
+class RendererTests(SimpleTestCase):
+
+    def test_split_template_alternates_static_and_slots(self):
+        segments = split_template("Hi {{ FNAME }}, <a href='/c/x?r={recipient_id}'>go</a>{{first_name}}")
+        self.assertEqual(segments, ["Hi ", "fname", ", <a href='/c/x?r=", "recipient_id", "'>go</a>", "fname", ""])
+        self.assertEqual(slot_names(segments), {"fname", "recipient_id"})
+
+    def test_template_without_slots_is_one_segment(self):
+        self.assertEqual(split_template("plain {single} braces"), ["plain {single} braces"])
+        self.assertEqual(split_template(""), [""])
+
+    def test_render_fills_missing_slots_with_nothing(self):
+        self.assertEqual(render(split_template("{{ a }}-{{ b }}"), {"a": "1"}), "1-")
+
+    def test_html_values_are_escaped_text_values_are_not(self):
+        template = CampaignTemplate(split_template("<p>{{ FNAME }}</p>"), "{{ FNAME }}", "Hi {{ FNAME }}")
+        fields = {"FNAME": "<Tom & Jerry>"}
+        self.assertEqual(template.html_for("id", fields), "<p>&lt;Tom &amp; Jerry&gt;</p>")
+        self.assertEqual(template.text_for("id", fields), "Hi <Tom & Jerry>")
+        self.assertEqual(template.to_name_for(fields), "<Tom & Jerry>")
+
+    def test_needs_merge_fields(self):
+        self.assertFalse(CampaignTemplate(split_template("?r={recipient_id}"), "", "text").needs_merge_fields)
+        self.assertTrue(CampaignTemplate(split_template("x"), "{{ first_name }}", "text").needs_merge_fields)
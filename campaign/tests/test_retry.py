@@ -0,0 +1,59 @@
+from smtplib import SMTPRecipientsRefused, SMTPResponseException
+
+from django.test import SimpleTestCase, override_settings
+
+from campaign.services import redis_service as rs
+from campaign.services.email_service import BOUNCE, PERMANENT, TRANSIENT, classify, smtp_code
+
+from .fake_redis import CID, LANES, SendStateMixin
+
+
+class ClassifyTests(SimpleTestCase):
+
+    def test_no_reply_code_is_transient(self):
+        self.assertEqual(classify(None, "Connection unexpectedly closed"), TRANSIENT)
+
+    def test_4xx_is_transient(self):
+        for code, message in ((421, "4.7.0 Too many connections"), (450, "4.2.0 Greylisted"),
+                              (452, "4.2.2 Mailbox full")):
+            self.assertEqual(classify(code, message), TRANSIENT, code)
+
+    def test_mailbox_errors_bounce(self):
+        self.assertEqual(classify(550, "5.1.1 User unknown"), BOUNCE)
+        self.assertEqual(classify(550, "5.2.1 Mailbox disabled"), BOUNCE)
+        self.assertEqual(classify(553, "mailbox name not allowed"), BOUNCE)
+
+    def test_policy_rejections_are_permanent(self):
+        # a 550 about policy must not clean the contact
+        self.assertEqual(classify(550, "5.7.1 Message rejected as spam"), PERMANENT)
+        self.assertEqual(classify(554, "Transaction failed"), PERMANENT)
+        self.assertEqual(classify(535, "5.7.8 Authentication failed"), PERMANENT)
+
+    def test_smtp_code(self):
+        self.assertEqual(smtp_code(SMTPResponseException(451, b"later")), 451)
+        refused = SMTPRecipientsRefused({"a@x.io": (550, b"no"), "b@x.io": (452, b"full")})
+        self.assertEqual(smtp_code(refused), 452)
+        self.assertIsNone(smtp_code(OSError("reset")))
+
+
+@override_settings(SEND_LANES=LANES, CHUNK_LEASE_SECONDS=600)
+class RetryQueueTests(SendStateMixin, SimpleTestCase):
+
+    def test_retries_move_back_to_their_lane_when_due(self):
+        self._load(other=2)
+        (lane, lease, records), = self._dispatch()["chunks"]
+        rs.claim_records(CID, records, lane, lease)
+        with override_settings(SEND_RETRY={"base_seconds": 0, "max_seconds": 0, "max_retries": 1}):
+            scheduled, exhausted = rs.schedule_retries(CID, records[:1], lane)
+            self.assertEqual((scheduled, exhausted), (records[:1], []))
+            rs.ack_chunk(CID, lane, lease)
+            self.assertEqual(rs.retry_len(CID), 1)
+            (_, _, again), = self._dispatch()["chunks"]
+            self.assertEqual(again, records[:1])
+            self.assertEqual(rs.schedule_retries(CID, records[:1], lane), ([], records[:1]))
+
+    def test_backoff_doubles_with_equal_jitter_up_to_the_cap(self):
+        cfg = {"base_seconds": 10, "max_seconds": 60}
+        for attempt, full in ((1, 10), (2, 20), (3, 40), (4, 60), (9, 60)):
+            for _ in range(20):
+                self.assertTrue(full / 2 <= rs._backoff(attempt, cfg) <= full, attempt)
@@ -0,0 +1,44 @@
+import uuid
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from campaign import tasks
+from campaign.models import CampaignStatus
+from campaign.services import redis_service as rs
+from campaign.tests.fake_redis import FakeRedisMixin
+
+CID = "00000000-0000-0000-0000-000000000002"
+
+
+class SyncChunkTests(FakeRedisMixin, SimpleTestCase):
+    """_send_chunk_sync with the relay, rate limiter and control mirror stubbed out."""
+
+    def setUp(self):
+        super().setUp()
+        rs.init_state(CID, [(uuid.uuid4(), f"u{i}@corp.io") for i in range(4)])
+        rs.set_control_state(CID, CampaignStatus.Sending)
+        (self.lane, lease, self.records), = rs.dispatch_chunks(
+            CID, state=CampaignStatus.Sending, default_inflight=1, default_chunk=4)["chunks"]
+        rs.claim_records(CID, self.records, self.lane, lease)
+        for patcher in (mock.patch.object(tasks.rate_limiter, "acquire", return_value=(10, 0)),
+                        mock.patch.object(tasks.email_service, "safe_send", return_value=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _run(self, states):
+        lease = mock.Mock(lost=False)
+        lease.beat.return_value = True
+        with mock.patch.object(tasks.control, "current_state", side_effect=states):
+            return tasks._send_chunk_sync(CID, self.records, self.lane, None, mock.Mock(), {},
+                                          None, mock.Mock(), lease)
+
+    def test_pause_counts_only_attempted_records(self):
+        report = self._run([CampaignStatus.Sending, CampaignStatus.Sending, CampaignStatus.Paused])
+        self.assertEqual((report.sent, report.processed), (2, 2))
+        queued = [r.decode() for r in self.redis.lrange(rs.lane_key(CID, self.lane), 0, -1)]
+        self.assertEqual(queued, self.records[2:])
+
+    def test_full_chunk(self):
+        report = self._run([CampaignStatus.Sending] * 4)
+        self.assertEqual((report.sent, report.processed), (4, 4))
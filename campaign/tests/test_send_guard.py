@@ -0,0 +1,45 @@
+from django.test import SimpleTestCase, override_settings
+
+from campaign.services import redis_service as rs
+
+from .fake_redis import CID, LANES, SendStateMixin
+
+
+@override_settings(SEND_LANES=LANES, CHUNK_LEASE_SECONDS=600)
+class SendGuardTests(SendStateMixin, SimpleTestCase):
+    """Per-recipient claims and sent marks, and lease renewal by a live worker."""
+
+    def test_claim_skips_records_already_held(self):
+        self._load(other=4)
+        (lane, lease, records), = self._dispatch()["chunks"]
+        self.assertEqual(rs.claim_records(CID, records, lane, lease), records)
+        self.assertEqual(rs.claim_records(CID, records, lane), [])
+        rs.release_records(CID, records[:1])
+        self.assertEqual(rs.claim_records(CID, records), records[:1])
+
+    def test_reap_requeues_only_unsent_records(self):
+        self._load(other=5)
+        (lane, lease, records), = self._dispatch()["chunks"]
+        claimed = rs.claim_records(CID, records, lane, lease)
+        rs.mark_sent(CID, claimed[:2])
+        rs.push_back_front(CID, claimed[4:], lane)    # handed back on pause
+        self._expire(lease)
+        self.assertEqual(rs.reap_expired(CID), 1)
+        queued = [r.decode() for r in self.redis.lrange(rs.lane_key(CID, lane), 0, -1)]
+        self.assertEqual(sorted(queued), sorted(claimed[2:]))
+        self.assertEqual(rs.get_inflight(CID), 0)
+        # the requeued records can be claimed again, the delivered ones can't
+        self.assertEqual(sorted(rs.claim_records(CID, claimed)), sorted(claimed[2:]))
+
+    def test_lease_keeper_renews_and_notices_loss(self):
+        self._load(other=2)
+        (lane, lease, records), = self._dispatch()["chunks"]
+        keeper = rs.LeaseKeeper(CID, lease)
+        self._expire(lease)
+        keeper.due = 0
+        self.assertTrue(keeper.beat())
+        self.assertGreater(self.redis.zscore(rs.leases_key(CID), lease), 0)
+        rs.reap_expired(CID, lease)
+        keeper.due = 0
+        self.assertFalse(keeper.beat())
+        self.assertTrue(keeper.lost)
@@ -0,0 +1,46 @@
+import json
+
+from django.test import TestCase
+
+from campaign.management.commands.bench_send_pipeline import run_campaign, seed_campaign
+from campaign.models import CampaignStatus, DeliveryStatus
+
+from .fake_redis import FakeRedisMixin
+
+
+class SendPipelineTests(FakeRedisMixin, TestCase):
+    """
+    A whole campaign (kickoff -> dispatch -> chunks) through the benchmark's
+    in-process queue and the local SMTP sink, the way `manage.py
+    bench_send_pipeline` measures it.
+    """
+
+    N = 60
+
+    def _run(self, engine: str) -> dict:
+        campaign = seed_campaign(self.N)
+        report = run_campaign(campaign, engine=engine, timeout=60)
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, CampaignStatus.Completed)
+        self.assertEqual(campaign.emails_sent, self.N)
+        statuses = list(campaign.deliveries.values_list("status", flat=True))
+        self.assertEqual(statuses, [DeliveryStatus.Sent] * self.N)
+        self.assertEqual(report["sink"]["messages"], self.N)
+        return report
+
+    def _assert_metrics(self, report: dict) -> None:
+        report = json.loads(json.dumps(report))
+        self.assertGreater(report["msgs_per_sec"], 0)
+        self.assertLessEqual(report["latency_ms"]["p50"], report["latency_ms"]["p99"])
+        self.assertGreater(report["latency_ms"]["p50"], 0)
+        self.assertGreater(report["sql_queries_per_msg"], 0)
+        self.assertGreater(report["redis_roundtrips_per_msg"], 0)
+
+    def test_sync_engine(self):
+        report = self._run("sync")
+        self._assert_metrics(report)
+        self.assertGreaterEqual(report["tasks"]["send_campaign_chunk"], 1)
+        self.assertEqual(report["tasks"]["kickoff_campaign_send"], 1)
+
+    def test_async_engine(self):
+        self._assert_metrics(self._run("async"))
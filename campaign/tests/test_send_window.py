@@ -0,0 +1,78 @@
+from django.test import TestCase, override_settings
+
+from campaign.services import redis_service, send_window
+from campaign.services.send_window import ChunkReport
+
+from .fake_redis import CID, FakeRedisMixin
+
+WINDOW = {
+    "initial_inflight": 3, "min_inflight": 1, "max_inflight": 16,
+    "initial_chunk": 30, "min_chunk": 10, "max_chunk": 200,
+    "inflight_step": 1, "chunk_step": 5,
+    "decrease": 0.5,
+    "latency_target_ms": 2000,
+    "error_rate_max": 0.2,
+}
+
+
+@override_settings(SEND_WINDOW=WINDOW, SEND_ENGINE="sync")
+class AimdTests(FakeRedisMixin, TestCase):
+
+    def _seed(self, inflight, chunk, latency_ms=100):
+        self.redis.hset(redis_service.window_key(CID),
+                        mapping={"inflight": inflight, "chunk_size": chunk, "latency_ms": latency_ms})
+
+    def test_increase(self):
+        sizes = send_window.record(CID, ChunkReport(sent=10, smtp_seconds=1.0))
+        # +1/w on the window, +5/w on the chunk
+        self.assertEqual(sizes, {"max_inflight": 3, "chunk_size": 31})
+        self.assertEqual(send_window.current(CID), {
+            "max_inflight": 3, "chunk_size": 31, "latency_ms": 100.0, "mode": "increase",
+            "sent": 10, "failed": 0, "deferred": 0,
+        })
+        for _ in range(3):
+            sizes = send_window.record(CID, ChunkReport(sent=10, smtp_seconds=1.0))
+        self.assertEqual(sizes["max_inflight"], 4)
+        self.assertGreater(self.redis.ttl(redis_service.window_key(CID)), 0)
+
+    def test_deferral_halves_both(self):
+        self._seed(8, 40)
+        sizes = send_window.record(CID, ChunkReport(sent=9, deferred=1, smtp_seconds=1.0))
+        self.assertEqual(sizes, {"max_inflight": 4, "chunk_size": 20})
+        self.assertEqual(send_window.current(CID)["mode"], "decrease")
+
+    def test_error_rate(self):
+        self._seed(8, 40)
+        # 10% failed: still growing
+        send_window.record(CID, ChunkReport(sent=9, failed=1, smtp_seconds=1.0))
+        self.assertEqual(send_window.current(CID)["mode"], "increase")
+        # 30% failed: cut
+        sizes = send_window.record(CID, ChunkReport(sent=7, failed=3, smtp_seconds=1.0))
+        self.assertEqual(sizes, {"max_inflight": 4, "chunk_size": 20})
+        self.assertEqual(send_window.current(CID)["failed"], 4)
+
+    def test_slow_relay_steps_the_window_down(self):
+        self._seed(5, 30, latency_ms=3000)
+        sizes = send_window.record(CID, ChunkReport(sent=1, smtp_seconds=3.0))
+        self.assertEqual(sizes, {"max_inflight": 4, "chunk_size": 30})
+        current = send_window.current(CID)
+        self.assertEqual((current["mode"], current["latency_ms"]), ("slow", 3000.0))
+        # the EWMA pulls back under the target after a few fast chunks
+        for _ in range(4):
+            send_window.record(CID, ChunkReport(sent=1, smtp_seconds=0.1))
+        self.assertEqual(send_window.current(CID)["mode"], "increase")
+
+    def test_clamps(self):
+        self._seed(15.99, 199.8)
+        self.assertEqual(send_window.record(CID, ChunkReport(sent=10, smtp_seconds=1.0)),
+                         {"max_inflight": 16, "chunk_size": 200})
+        self._seed(1, 10)
+        self.assertEqual(send_window.record(CID, ChunkReport(deferred=5)), {"max_inflight": 1, "chunk_size": 10})
+        self._seed(1, 10, latency_ms=5000)
+        self.assertEqual(send_window.record(CID, ChunkReport(sent=1, smtp_seconds=5.0)),
+                         {"max_inflight": 1, "chunk_size": 10})
+
+    def test_empty_report_changes_nothing(self):
+        self.assertEqual(send_window.record(CID, ChunkReport()), {"max_inflight": 3, "chunk_size": 30})
+        self.assertFalse(self.redis.exists(redis_service.window_key(CID)))
+        self.assertEqual(send_window.current(CID)["mode"], "initial")
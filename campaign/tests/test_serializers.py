@@ -0,0 +1,19 @@
+from django.test import TestCase
+
+from audience.models import Audience
+from campaign.models import Campaign
+from campaign.serializers import CampaignSerializer
+
+
+class CampaignSerializerTests(TestCase):
+
+    def test_compiled_segments_stay_internal(self):
+        audience = Audience.objects.create(name="list")
+        campaign = Campaign.objects.create(title="c", audience=audience, compiled_segments=["<p>", 0, "</p>"])
+        self.assertNotIn("compiled_segments", CampaignSerializer(campaign).data)
+        serializer = CampaignSerializer(campaign, data={"compiled_segments": ["spoofed"]}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        self.assertNotIn("compiled_segments", serializer.validated_data)
+        response = self.client.get("/api/campaigns/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("compiled_segments", response.content.decode())
@@ -0,0 +1,45 @@
+from django.core.mail import EmailMessage
+from django.test import SimpleTestCase, override_settings
+
+from campaign.services import email_service, exceptions, smtp_pool
+from campaign.smtp_sink import SMTPSink
+
+
+class SMTPPoolTests(SimpleTestCase):
+    """The per-process pool against the local SMTP sink."""
+
+    def setUp(self):
+        self.sink = SMTPSink().start()
+        self.addCleanup(self.sink.stop)
+        settings = override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1", EMAIL_PORT=self.sink.port, EMAIL_USE_TLS=False, EMAIL_USE_SSL=False,
+            EMAIL_HOST_USER="", EMAIL_HOST_PASSWORD="", EMAIL_TIMEOUT=5,
+            SMTP_POOL_MAX_MESSAGES_PER_CONNECTION=2,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        smtp_pool.reset_pool()
+        self.addCleanup(smtp_pool.reset_pool)
+
+    def _send(self, conn, n: int) -> bool:
+        msg = EmailMessage("test", "body", "me@example.com", [f"u{n}@example.com"], connection=conn)
+        return email_service.safe_send(msg, f"u{n}@example.com")
+
+    def test_recycles_at_the_message_cap(self):
+        with smtp_pool.connection() as conn:
+            for n in range(5):
+                self._send(conn, n)
+        self.assertEqual(self.sink.stats.messages, 5)
+        # one session per two messages, none opened per message
+        self.assertEqual(self.sink.stats.connections, 3)
+
+    def test_reconnect_failure_fails_the_next_send(self):
+        with smtp_pool.connection() as conn:
+            self._send(conn, 0)
+            self.sink.stop()
+            # the cap is hit: the session is closed, and the dead relay isn't dialled yet
+            self._send(conn, 1)
+            with self.assertRaises(exceptions.SendFailed):
+                self._send(conn, 2)
+        self.assertEqual(smtp_pool.get_pool().size, 1)
@@ -0,0 +1,100 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from campaign.services import redis_service, stage_timing
+
+from .fake_redis import CID, FakeRedisMixin
+
+ON = {"enabled": True, "sample_rate": 0.0}
+
+
+def _timer(clock, laps):
+    """A StageTimer whose start, laps and wall() read successive values of `clock`."""
+    with mock.patch.object(stage_timing.time, "perf_counter", side_effect=clock):
+        t = stage_timing.StageTimer()
+        for stage in laps:
+            t.lap(stage)
+        wall = t.wall()
+    return t, wall
+
+
+class StageTimerTests(TestCase):
+
+    def test_off_hands_out_the_no_op(self):
+        self.assertIs(stage_timing.timer(), stage_timing.NO_TIMER)
+        with override_settings(SEND_PROFILING=ON):
+            self.assertIsInstance(stage_timing.timer(), stage_timing.StageTimer)
+
+    def test_laps_charge_the_time_since_the_last_one(self):
+        t, wall = _timer(iter([0.0, 0.5, 0.75, 1.75, 2.0]), ["claim", "smtp", "smtp"])
+        self.assertEqual(t.totals, {"claim": 0.5, "smtp": 1.25})
+        self.assertEqual(wall, 2.0)
+
+    @override_settings(SEND_PROFILING={"enabled": True, "sample_rate": 0.25})
+    def test_sampling(self):
+        with mock.patch.object(stage_timing.random, "random", return_value=0.5):
+            self.assertIsNone(stage_timing.start_profile())
+        with mock.patch.object(stage_timing.random, "random", return_value=0.1):
+            profiler = stage_timing.start_profile()
+        self.assertIsNotNone(profiler)
+        profiler.disable()
+        with override_settings(SEND_PROFILING={"enabled": False, "sample_rate": 1.0}):
+            self.assertIsNone(stage_timing.start_profile())
+
+
+@override_settings(SEND_PROFILING=ON)
+class SummaryTests(FakeRedisMixin, TestCase):
+
+    def _chunk(self, smtp, build, tail, messages):
+        clock = iter([0.0, build, build + smtp, build + smtp + tail])
+        t, _ = _timer(clock, ["build", "smtp"])
+        with mock.patch.object(stage_timing.time, "perf_counter", return_value=build + smtp + tail):
+            stage_timing.finish(CID, "other", t, messages)
+
+    def test_summary_averages_every_chunk(self):
+        self._chunk(smtp=0.8, build=0.1, tail=0.1, messages=10)
+        self._chunk(smtp=1.2, build=0.1, tail=0.3, messages=10)
+        summary = stage_timing.summary(CID)
+        self.assertEqual((summary["enabled"], summary["chunks"], summary["messages"]), (True, 2, 20))
+        self.assertEqual(summary["wall_ms"], 2600.0)
+        self.assertEqual([s["stage"] for s in summary["stages"]], ["build", "smtp", "other"])
+        smtp = summary["stages"][1]
+        self.assertEqual(smtp, {"stage": "smtp", "total_ms": 2000.0, "per_chunk_ms": 1000.0,
+                                "per_message_ms": 100.0, "share": round(2000 / 2600, 3)})
+        # time outside any lap
+        self.assertEqual(summary["stages"][2]["total_ms"], 400.0)
+        self.assertEqual(summary["profiles"], [])
+        self.assertGreater(self.redis.ttl(redis_service.stages_key(CID)), 0)
+
+    def test_nothing_recorded(self):
+        summary = stage_timing.summary(CID)
+        self.assertEqual((summary["chunks"], summary["wall_ms"]), (0, 0.0))
+        self.assertEqual(summary["stages"], [{"stage": "other", "total_ms": 0.0, "per_chunk_ms": 0.0,
+                                              "per_message_ms": 0.0, "share": 0.0}])
+
+    def test_disabled_timer_writes_nothing(self):
+        stage_timing.finish(CID, "other", stage_timing.NO_TIMER, 10)
+        self.assertFalse(self.redis.exists(redis_service.stages_key(CID)))
+
+    def test_sampled_profile_is_kept(self):
+        with tempfile.TemporaryDirectory() as dump_dir, \
+                override_settings(SEND_PROFILING={**ON, "sample_rate": 1.0, "dump_dir": dump_dir, "keep": 2}):
+            for _ in range(3):
+                profiler = stage_timing.start_profile()
+                sum(range(1000))
+                stage_timing.finish(CID, "gmail", stage_timing.StageTimer(), 5, profiler)
+            profiles = stage_timing.summary(CID)["profiles"]
+            self.assertEqual(len(profiles), 2)
+            self.assertEqual((profiles[0]["lane"], profiles[0]["messages"]), ("gmail", 5))
+            self.assertTrue(profiles[0]["top"])
+            self.assertTrue(os.path.exists(profiles[0]["path"]))
+
+    def test_redis_failure_never_fails_the_chunk(self):
+        t = stage_timing.StageTimer()
+        t.lap("smtp")
+        with mock.patch.object(type(self.redis.pipeline()), "execute", side_effect=ConnectionError("down")):
+            stage_timing.finish(CID, "other", t, 1)
+        self.assertFalse(self.redis.exists(redis_service.stages_key(CID)))
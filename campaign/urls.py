@@ -1,6 +1,10 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import CampaignViewSet
+from .views import CampaignViewSet, campaign_events
 
 router = DefaultRouter()
 router.register(r"campaigns", CampaignViewSet, basename="campaign")
-urlpatterns = router.urls
\ No newline at end of file
+# ahead of the router so "events" is not taken for a campaign id
+urlpatterns = [
+    path("campaigns/events/", campaign_events, name="campaign-events"),
+] + router.urls
@@ -1,9 +1,14 @@
 from typing import Dict, Optional
+import logging
+import uuid
 
+from asgiref.sync import sync_to_async
 from django.db import transaction, DatabaseError
 from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 
@@ -12,9 +17,10 @@ from .models import Campaign, CampaignStatus
 from .serializers import CampaignSerializer
 from .tasks import kickoff_campaign_send
 from .services import campaigns as services
-from .services import exceptions
+from .services import events, exceptions, ledger, metrics, progress, stage_timing
 from rest_framework import status as http
 
+logger = logging.getLogger(__name__)
 
 
 
@@ -86,8 +92,18 @@ class CampaignViewSet(viewsets.ModelViewSet):
                 {"detail": "Campaign is currently being modified. Try again."},
                 status=status.HTTP_423_LOCKED,  # 423 Locked
             )
-        except Exception as e:
-            print(e)
+        except APIException:
+            # e.g. invalid fields in the update: DRF answers with the errors
+            raise
+        except Exception:
+            logger.exception("could not send campaign %s", pk)
+            return Response({"detail": "Could not start sending."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if result["scheduled_for"]:
+            # started by the scheduled-send sweeper once it is due
+            return Response(
+                {"detail": "Sending scheduled.", "task_id": result["task_id"], "scheduled_for": result["scheduled_for"]},
+                status=status.HTTP_202_ACCEPTED,
+            )
         return Response(
             {"detail": "Sending started.", "task_id": str(result["task_id"])},
             status=status.HTTP_202_ACCEPTED,
@@ -98,8 +114,11 @@ class CampaignViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         to_email = serializer.validated_data.get("test_email")
-        result = services.send_test_email(campaign_id=pk, test_email=to_email)
-        return Response({"detail": "Test email sent.", **result}, status=status.HTTP_200_OK)
+        try:
+            result = services.send_test_email(campaign_id=pk, test_email=to_email)
+        except Campaign.DoesNotExist:
+            return Response({"detail": "Not found."}, status=http.HTTP_404_NOT_FOUND)
+        return Response({"detail": "Test email queued.", **result}, status=status.HTTP_202_ACCEPTED)
     
     @action(detail=True, methods=["post"])
     def pause(self, request, pk=None):
@@ -108,6 +127,8 @@ class CampaignViewSet(viewsets.ModelViewSet):
             return Response(data, status=http.HTTP_200_OK)
         except Campaign.DoesNotExist:
             return Response({"detail": "Not found."}, status=http.HTTP_404_NOT_FOUND)
+        except exceptions.InvalidState as e:
+            return Response({"detail": str(e)}, status=http.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=["post"])
     def resume(self, request, pk=None):
@@ -116,3 +137,87 @@ class CampaignViewSet(viewsets.ModelViewSet):
             return Response(data, status=http.HTTP_200_OK)
         except Campaign.DoesNotExist:
             return Response({"detail": "Not found."}, status=http.HTTP_404_NOT_FOUND)
+        except exceptions.InvalidState as e:
+            return Response({"detail": str(e)}, status=http.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=["post"])
+    def cancel(self, request, pk=None):
+        try:
+            data = services.cancel_campaign(pk)
+            return Response(data, status=http.HTTP_200_OK)
+        except Campaign.DoesNotExist:
+            return Response({"detail": "Not found."}, status=http.HTTP_404_NOT_FOUND)
+
+    @action(detail=True, methods=["get"])
+    def progress(self, request, pk=None):
+        # polled by the UI while a send runs: Redis only, no DB query
+        snapshot = progress.snapshot(pk)
+        if snapshot is None:
+            return Response({"detail": "Not found."}, status=http.HTTP_404_NOT_FOUND)
+        return Response({"campaign": pk, **snapshot}, status=http.HTTP_200_OK)
+
+    @action(detail=True, methods=["get"])
+    def stages(self, request, pk=None):
+        # where chunk time went (SEND_PROFILING); empty while profiling is off
+        campaign = self.get_object()
+        return Response({"campaign": str(campaign.id), **stage_timing.summary(str(campaign.id))}, status=http.HTTP_200_OK)
+
+    @action(detail=True, methods=["get"])
+    def deliveries(self, request, pk=None):
+        campaign = self.get_object()
+        return Response({"campaign": str(campaign.id), **ledger.status_counts(campaign.id)}, status=http.HTTP_200_OK)
+
+
+SSE_MAX_CAMPAIGNS = 50
+
+async def campaign_events(request):
+    """
+    GET /api/campaigns/events/?ids=<id>,<id>...  (text/event-stream, needs the ASGI server)
+    One snapshot event per campaign, then progress/clicks/state deltas as
+    they are published; a comment line every SSE_HEARTBEAT_SECONDS keeps
+    proxies from closing the connection. One stream serves a whole page.
+    """
+    try:
+        ids = [str(uuid.UUID(v)) for v in request.GET.get("ids", "").split(",") if v.strip()]
+    except ValueError:
+        return HttpResponseBadRequest("ids must be campaign UUIDs")
+    if not ids or len(ids) > SSE_MAX_CAMPAIGNS:
+        return HttpResponseBadRequest(f"between 1 and {SSE_MAX_CAMPAIGNS} ids")
+
+    async def stream():
+        # subscribed before the snapshot so nothing published in between is lost
+        async with events.EventFeed(ids) as feed:
+            yield "retry: 3000\n\n"
+            rows = Campaign.objects.filter(id__in=ids).values("id", "status", "emails_sent", "click_count", "unique_click_count")
+            async for row in rows:
+                # nothing in Redis for a campaign that never sent (or long finished): the row has it all
+                live = await sync_to_async(progress.snapshot)(str(row["id"])) or {}
+                yield events.sse("snapshot", {
+                    "campaign": str(row["id"]),
+                    "state": live.get("state") or row["status"],
+                    "sent": max(live.get("sent", 0), row["emails_sent"]),
+                    "failed": live.get("failed", 0), "deferred": live.get("deferred", 0),
+                    "rate_per_sec": live.get("rate_per_sec", 0.0), "eta_seconds": live.get("eta_seconds"),
+                    "clicks": row["click_count"], "unique_clicks": row["unique_click_count"],
+                })
+            while True:
+                event = await feed.next()
+                yield ": ping\n\n" if event is None else events.sse(event.pop("type"), event)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"   # nginx: don't buffer the stream
+    return response
+
+
+def metrics_export(request):
+    """
+    GET /metrics  Prometheus exposition for the web process(es) plus the
+    Redis queue gauges; Celery workers serve their own on WORKER_METRICS_PORT.
+    With METRICS_TOKEN set the scraper must send it as a bearer token.
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token and request.META.get("HTTP_AUTHORIZATION") != f"Bearer {token}":
+        return HttpResponse(status=http.HTTP_403_FORBIDDEN)
+    body, content_type = metrics.render()
+    return HttpResponse(body, content_type=content_type)
@@ -14,3 +14,12 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+# Run under an ASGI server (uvicorn core.asgi:application) so the campaign
+# event stream (/api/campaigns/events/) can hold many idle connections on one
+# event loop. runserver used to serve /static/ in development; do the same here.
+from django.conf import settings  # noqa: E402  (needs the app registry loaded above)
+
+if str(settings.DEBUG).lower() in {"true", "1", "yes"}:
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+    application = ASGIStaticFilesHandler(application)
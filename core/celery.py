@@ -1,6 +1,7 @@
 import os
 
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown
 from django.conf import settings
 
 
@@ -18,4 +19,23 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 app.conf.enable_utc = True
-app.conf.timezone = settings.TIME_ZONE
\ No newline at end of file
+app.conf.timezone = settings.TIME_ZONE
+
+
+@worker_init.connect
+def serve_metrics(**kwargs):
+    # the parent process serves what its prefork children wrote to PROMETHEUS_MULTIPROC_DIR
+    from prometheus_client import start_http_server
+    from campaign.services import metrics
+    if metrics.worker_port():
+        start_http_server(metrics.worker_port(), registry=metrics.registry(with_queues=False))
+
+
+@worker_process_shutdown.connect
+def close_smtp_pool(pid=None, **kwargs):
+    from campaign.services import async_sender, metrics, smtp_pool
+    smtp_pool.reset_pool()
+    async_sender.reset_engine()
+    if metrics.multiprocess_enabled():
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid or os.getpid())
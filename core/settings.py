@@ -268,6 +268,34 @@ CELERY_TASK_ACKS_LATE = True           # safer if a worker dies mid-task
 CELERY_BROKER_URL = "redis://redis:6379/0"
 CELERY_RESULT_BACKEND = "redis://redis:6379/2"  # optional if you want statuses
 CELERY_TIMEZONE = "Africa/Cairo"
+# One queue (and worker pool, see docker-compose.yml) per kind of work, so
+# kickoffs, click ingestion and test mail never wait behind thousands of
+# bulk chunks. Anything unrouted lands on "control".
+CELERY_TASK_DEFAULT_QUEUE = "control"
+CELERY_TASK_ROUTES = {
+    "campaign.tasks.send_campaign_chunk": {"queue": "bulk"},
+    "campaign.tasks.deliver_test_email": {"queue": "transactional"},
+    "tracking.tasks.record_click_event": {"queue": "clicks"},
+    "campaign.tasks.kickoff_campaign_send": {"queue": "control"},
+    "campaign.tasks.dispatch_next_chunk": {"queue": "control"},
+    "campaign.tasks.reap_expired_chunks": {"queue": "control"},
+    "campaign.tasks.rebalance_send_shares": {"queue": "control"},
+    "campaign.tasks.finalize_campaign_send": {"queue": "control"},
+    "campaign.tasks.flush_send_progress": {"queue": "control"},
+    "campaign.tasks.start_due_campaigns": {"queue": "control"},
+    "campaign.tasks.release_local_time_buckets": {"queue": "control"},
+}
+CELERY_BEAT_SCHEDULE = {
+    "reap-expired-chunks": {"task": "campaign.tasks.reap_expired_chunks", "schedule": 60.0},
+    "rebalance-send-shares": {"task": "campaign.tasks.rebalance_send_shares",
+                              "schedule": config("SEND_SCHEDULER_INTERVAL", 5, cast=float)},
+    "flush-send-progress": {"task": "campaign.tasks.flush_send_progress",
+                            "schedule": config("SEND_PROGRESS_FLUSH_SECONDS", 5, cast=float)},
+    "start-due-campaigns": {"task": "campaign.tasks.start_due_campaigns",
+                            "schedule": config("SCHEDULED_SEND_SWEEP_SECONDS", 10, cast=float)},
+    "release-local-time-buckets": {"task": "campaign.tasks.release_local_time_buckets",
+                                   "schedule": config("LOCAL_TIME_RELEASE_SECONDS", 30, cast=float)},
+}
 
 
 TRACKING_BASE_URL = config("TRACKING_BASE_URL", "http://localhost:8000")
@@ -275,3 +303,92 @@ TRACKING_LINK_CACHE_TTL = config("TRACKING_LINK_CACHE_TTL", 86400, cast=int)
 TRACKING_DEDUPE_TTL = config("TRACKING_DEDUPE_TTL", 5, cast=int)  
 TRACKING_BOT_UA = tuple(config("TRACKING_BOT_UA", default="").split(","))
 
+
+# Sending: per-worker SMTP connection pool
+SMTP_POOL_MAX_CONNECTIONS = config("SMTP_POOL_MAX_CONNECTIONS", 4, cast=int)
+SMTP_POOL_MAX_MESSAGES_PER_CONNECTION = config("SMTP_POOL_MAX_MESSAGES_PER_CONNECTION", 500, cast=int)
+SMTP_POOL_MAX_IDLE_SECONDS = config("SMTP_POOL_MAX_IDLE_SECONDS", 60, cast=int)
+
+# Sending: cluster-wide token buckets (messages/sec, 0 = unlimited)
+SEND_RATE_GLOBAL = config("SEND_RATE_GLOBAL", 16.0, cast=float)
+SEND_RATE_PER_CAMPAIGN = config("SEND_RATE_PER_CAMPAIGN", 5.0, cast=float)
+SEND_RATE_PER_SENDER_DOMAIN = config("SEND_RATE_PER_SENDER_DOMAIN", 0.0, cast=float)
+SEND_RATE_BURST_SECONDS = config("SEND_RATE_BURST_SECONDS", 1.0, cast=float)
+
+# Sending: per-provider lanes. Each lane has its own in-flight cap (chunks per
+# campaign), rate (msgs/sec cluster-wide, 0 = unlimited) and throttling backoff
+# (421 / 4.7.x replies park the lane). Anything not listed goes to the "other"
+# lane (SEND_LANE_DEFAULTS), which parks only the throttling recipient domain.
+SEND_LANE_DEFAULTS = {"max_inflight": 3, "rate": 0, "backoff_base": 30, "backoff_max": 900}
+SEND_LANES = {
+    "gmail": {"domains": ["gmail.com", "googlemail.com"], "max_inflight": 2, "rate": 0},
+    "outlook": {"domains": ["outlook.com", "hotmail.com", "live.com", "msn.com"], "max_inflight": 2, "rate": 0},
+    "yahoo": {"domains": ["yahoo.com", "ymail.com", "rocketmail.com", "aol.com"], "max_inflight": 2, "rate": 0},
+}
+
+# Sending: a leased chunk not acked or renewed within this many seconds is requeued by
+# reap_expired_chunks; live chunks renew it every third of this from the send loop
+CHUNK_LEASE_SECONDS = config("CHUNK_LEASE_SECONDS", 600, cast=int)
+
+# Sending: transient failures (4xx, dropped sessions) are retried after
+# base_seconds * 2^(attempt-1), capped at max_seconds, with jitter; after
+# max_retries retries the recipient is recorded as failed. Each dispatch moves at most
+# `batch` due retries back onto their lanes.
+SEND_RETRY = {"base_seconds": 60, "max_seconds": 3600, "max_retries": 5, "batch": 200}
+
+# Live dashboards: campaign SSE stream (campaign.services.events). Pub/sub runs
+# on the cache Redis unless EVENTS_REDIS_URL points elsewhere.
+EVENTS_REDIS_URL = config("EVENTS_REDIS_URL", "")
+SSE_HEARTBEAT_SECONDS = config("SSE_HEARTBEAT_SECONDS", 15, cast=float)
+
+# Prometheus (campaign.services.metrics). The web app serves /metrics; each
+# Celery worker serves its own on WORKER_METRICS_PORT (0 = off). Processes
+# that fork (prefork pool, several uvicorn workers) need PROMETHEUS_MULTIPROC_DIR
+# in the environment, one empty directory per container.
+METRICS_TOKEN = config("METRICS_TOKEN", "")
+WORKER_METRICS_PORT = config("WORKER_METRICS_PORT", 0, cast=int)
+
+# Sending: cluster-wide budget of chunks in flight, split across the sending
+# campaigns by priority weight (weighted max-min fair share, see
+# campaign.services.fair_share). Each campaign gets at least `floor` and at
+# most `ceiling` chunks, and never more than its own AIMD window; a campaign's
+# share_floor / share_ceiling override these for it.
+SEND_SCHEDULER = {
+    "cluster_inflight": config("SEND_CLUSTER_INFLIGHT", 48, cast=int),
+    "floor": 1, "ceiling": 16,
+    "interval": config("SEND_SCHEDULER_INTERVAL", 5, cast=float),
+}
+
+# Sending: per-stage timing of every chunk plus cProfile for a sample of them
+# (campaign.services.stage_timing); read it at /api/campaigns/<id>/stages/.
+SEND_PROFILING = {
+    "enabled": config("SEND_PROFILING", False, cast=bool),
+    "sample_rate": config("SEND_PROFILING_SAMPLE_RATE", 0.01, cast=float),
+    "dump_dir": config("SEND_PROFILING_DUMP_DIR", ""),
+    "keep": 20,
+}
+
+# Scheduled sends: every SCHEDULED_SEND_SWEEP_SECONDS the beat sweeper starts
+# due campaigns, `batch` rows per transaction and at most `max_batches` per run.
+SCHEDULED_SEND_SWEEP = {"batch": 200, "max_batches": 50}
+
+# Sending: how stale a worker's view of pause/cancel may get (Redis mirror refresh)
+CAMPAIGN_CONTROL_REFRESH_SECONDS = config("CAMPAIGN_CONTROL_REFRESH_SECONDS", 0.5, cast=float)
+
+# Sending: "sync" = one pooled smtplib connection per chunk, "async" = many
+# asyncio SMTP sessions per worker process (campaign.services.async_sender)
+SEND_ENGINE = config("SEND_ENGINE", "sync")
+ASYNC_SEND_CONCURRENCY = config("ASYNC_SEND_CONCURRENCY", 20, cast=int)
+ASYNC_SEND_CHUNK_SIZE = config("ASYNC_SEND_CHUNK_SIZE", 200, cast=int)
+
+# Sending: adaptive in-flight window / chunk size (AIMD), see campaign.services.send_window.
+# Grows by inflight_step / chunk_step per window of healthy chunks, multiplied by
+# `decrease` on a deferral or when more than error_rate_max of a chunk failed.
+SEND_WINDOW = {
+    "initial_inflight": 3, "min_inflight": 1, "max_inflight": 16,
+    "initial_chunk": 30, "min_chunk": 10, "max_chunk": 200,
+    "inflight_step": 1, "chunk_step": 5,
+    "decrease": 0.5,
+    "latency_target_ms": 2000,
+    "error_rate_max": 0.2,
+}
@@ -20,6 +20,7 @@ from django.views.generic import TemplateView
 from accounts.views import index
 from django.conf import settings
 from tracking.views import click_redirect
+from campaign.views import metrics_export
 
 
 
@@ -31,6 +32,7 @@ urlpatterns = [
     path("api/", include(("audience.urls", "audience"), namespace="audience")),
     path("api/", include(("campaign.urls", "campaign"), namespace="campaign")),
     path("c/<str:token>", click_redirect, name="click_redirect"),
+    path("metrics", metrics_export, name="metrics"),
 
 ]
 
@@ -3,6 +3,7 @@ from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 from django.utils import timezone
 from .models import CampaignLink
+from campaign.services.renderer import split_template
 import markdown
 
 
@@ -45,7 +46,8 @@ def fingerprint_url_list(urls: list[str]) -> str:
 def compile_links_for_campaign(*, campaign, tracking_base: str) -> dict:
     """
     Parses campaign.content_html, upserts CampaignLink rows,
-    replaces hrefs with tracking URLs, saves compiled_html/compiled_at/fingerprint.
+    replaces hrefs with tracking URLs, saves compiled_html/compiled_at/fingerprint
+    and the pre-split compiled_segments used at send time.
     Returns {links, links_count, compiled_html}.
     """
     html = campaign.content_html or ""
@@ -76,9 +78,10 @@ def compile_links_for_campaign(*, campaign, tracking_base: str) -> dict:
         a["href"] = tracking_url  # keep other attributes intact
 
     campaign.compiled_html = str(soup)
+    campaign.compiled_segments = split_template(campaign.compiled_html)
     campaign.compiled_at = timezone.now()
     campaign.linkset_fingerprint = fingerprint_url_list(list(seen.keys()))
-    campaign.save(update_fields=["compiled_html", "compiled_at", "linkset_fingerprint"])
+    campaign.save(update_fields=["compiled_html", "compiled_segments", "compiled_at", "linkset_fingerprint"])
 
     return {
         "links": [{"original_url": u, "token": t} for u, t in seen.items()],
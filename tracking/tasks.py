@@ -3,6 +3,7 @@ import hashlib
 from datetime import datetime
 from django.utils import timezone as djtz
 from campaign.models import Campaign
+from campaign.services import events, metrics
 from celery import shared_task
 from django.db import IntegrityError, transaction
 from .models import ClickEvent
@@ -45,6 +46,8 @@ def record_click_event(
 
     if occurred_dt.tzinfo is None:
         occurred_dt = djtz.make_aware(occurred_dt)
+    # how far the clicks queue is behind the redirects
+    metrics.click_ingest_lag.observe(max(0.0, (djtz.now() - occurred_dt).total_seconds()))
 
     idem = _idempotency_key(recipient_id, link_id, occurred_dt.isoformat())
     print(f"Idem key: {idem}")
@@ -116,6 +119,8 @@ def record_click_event(
     except IntegrityError:
         # Duplicate (same recipient+link within bucket); ignore
         return
+    # live dashboards (campaign SSE stream) get the delta once it is committed
+    events.clicks(campaign_id, unique=created_cr)
 
 
 
@@ -4,6 +4,7 @@ from django.utils import timezone
 from django.core.cache import cache
 from .models import CampaignLink
 from .tasks import record_click_event
+from campaign.services import metrics
 from django.conf import settings
 
 # ---- Config (override in settings.py if you like) ----
@@ -27,6 +28,7 @@ def _is_probable_bot(request):
     ual = ua.lower()
     return any(s in ual for s in TRACKING_BOT_UA)
 
+@metrics.click_redirect_seconds.time()
 def click_redirect(request, token: str):
     cache_key = f"link:{token}"
     payload = cache.get(cache_key)